@@ -1,24 +1,65 @@
 from fastapi import FastAPI, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from pydantic import BaseModel, conint, confloat
 from typing import Optional, List
+import asyncio
 import duckdb
+import httpx
+import logging
+import os
+import threading
 import uuid
+import json
 import starvote
-from libreco.algorithms import PinSAGE
+from libreco.algorithms import PinSage
 from libreco.data import DatasetPure
+import numpy as np
 import pandas as pd
 import time
 import random
 from datetime import datetime, timedelta
+from session_recommendation_metrics import RequestTrace, profile_slow_requests, record_cache, registry
+from session_recommendation_retrain import ModelStore
+from session_recommendation_sampling import NegativeSampler, dense_codes
+from session_recommendation_shared import (
+    EmbeddingModel, Snapshot, StatePublisher, StateReader, export_model_embeddings, read_current_version
+)
+from session_recommendation_warm import WarmState
+
+logger = logging.getLogger(__name__)
 
 app = FastAPI()
 
+DB_PATH = os.environ.get('RECOMMENDATIONS_DB', 'recommendations.db')
+MAX_BATCH_ENTRIES = 1000
+MODEL_TTL_SECONDS = int(os.environ.get('RECOMMENDATIONS_MODEL_TTL', 3600))
+
+# Deployment role: 'single' (one process owns the database), 'writer' (owns
+# the database and publishes snapshots) or 'reader' (serves from the latest
+# published snapshot, read-only)
+ROLE = os.environ.get('RECOMMENDATIONS_ROLE', 'single')
+STATE_DIR = os.environ.get('RECOMMENDATIONS_STATE_DIR', 'state')
+WRITER_URL = os.environ.get('RECOMMENDATIONS_WRITER_URL')
+PUBLISH_INTERVAL = float(os.environ.get('RECOMMENDATIONS_PUBLISH_INTERVAL', 30))
+# Readers' database copy is O(database), so it is refreshed far less often
+# than the arrays and embeddings published every PUBLISH_INTERVAL
+DATABASE_COPY_INTERVAL = float(os.environ.get('RECOMMENDATIONS_DATABASE_COPY_INTERVAL', 600))
+PUBLISHED_MODEL_KEY = 'published'
+NEGATIVE_SAMPLING_ALPHA = float(os.environ.get('RECOMMENDATIONS_NEGATIVE_ALPHA', 0.75))
+NEGATIVE_SAMPLING_SEED = 0
+# Versioned model directory; when set, requests serve its last accepted
+# version and the writer (or single process) refreshes it every
+# RETRAIN_INTERVAL seconds, fine-tuning on new interactions
+MODEL_STORE = os.environ.get('RECOMMENDATIONS_MODEL_STORE')
+RETRAIN_INTERVAL = float(os.environ.get('RECOMMENDATIONS_RETRAIN_INTERVAL', 3600))
+
 # ======================
 # DATABASE INITIALIZATION
 # ======================
 
-def initialize_database():
-    conn = duckdb.connect('recommendations.db')
+def initialize_database(path=DB_PATH):
+    conn = duckdb.connect(path)
     
     # Create tables
     conn.execute("""
@@ -48,9 +89,32 @@ def initialize_database():
         userid UUID,
         itemid UUID,
         rating INTEGER,
-        timestamp BIGINT
+        timestamp BIGINT,
+        ingest_seq BIGINT
     )""")
 
+    # Databases created before ingest_seq existed
+    conn.execute("""
+    ALTER TABLE interactions ADD COLUMN IF NOT EXISTS ingest_seq BIGINT
+    """)
+
+    # The database assigns ingest_seq on every insert, whoever the writer
+    # is (the API, ETL jobs, fixtures); rows from before it did are
+    # backfilled so replay past a snapshot's watermark picks them up
+    start = conn.execute("""
+    SELECT COALESCE(MAX(ingest_seq), 0) + 1 FROM interactions
+    """).fetchone()[0]
+    conn.execute(f"""
+    CREATE SEQUENCE IF NOT EXISTS interactions_ingest_seq START {int(start)}
+    """)
+    conn.execute("""
+    ALTER TABLE interactions ALTER COLUMN ingest_seq SET DEFAULT nextval('interactions_ingest_seq')
+    """)
+    conn.execute("""
+    UPDATE interactions SET ingest_seq = nextval('interactions_ingest_seq')
+    WHERE ingest_seq IS NULL
+    """)
+
     # Insert default pipeline
     conn.execute("""
     INSERT OR IGNORE INTO pipelines VALUES (
@@ -61,7 +125,138 @@ def initialize_database():
     
     conn.close()
 
-initialize_database()
+# Derived in-memory state (aggregates, genre index, trend buckets, seen items,
+# model embeddings), restored from the latest snapshot in STATE_DIR on startup
+warm_state = None
+readiness = {"ready": False}
+WARM_SNAPSHOT_INTERVAL = float(os.environ.get('RECOMMENDATIONS_SNAPSHOT_INTERVAL', 300))
+
+# Multi-process state: the writer's publisher and a reader's snapshot view
+state_publisher = None
+state_reader = None
+ingested_since_publish = 0
+database_copied_at = 0.0
+
+@app.on_event("startup")
+async def load_state():
+    global warm_state, state_publisher, state_reader
+    started = time.perf_counter()
+    if ROLE == 'reader':
+        state_reader = StateReader(STATE_DIR, on_swap=swap_snapshot)
+        snapshot = state_reader.current()
+        readiness.update(ready=True, version=snapshot.version, replayed=0,
+                         startup_seconds=time.perf_counter() - started)
+        return
+
+    initialize_database()
+    version = read_current_version(STATE_DIR)
+    with duckdb.connect(DB_PATH) as conn:
+        if version:
+            # Memory-map the last snapshot and replay only what came after it
+            warm_state = WarmState.from_snapshot(Snapshot(STATE_DIR, version))
+            replayed = warm_state.replay(conn)
+        else:
+            warm_state = WarmState.from_database(conn)
+            replayed = 0
+
+    state_publisher = StatePublisher(STATE_DIR)
+    readiness.update(ready=True, version=version, replayed=replayed,
+                     startup_seconds=time.perf_counter() - started)
+    logger.info("Ready in %.2fs from snapshot version %d (%d interactions replayed)",
+                readiness["startup_seconds"], version, replayed)
+
+    if MODEL_STORE:
+        asyncio.create_task(retrain_periodically(RETRAIN_INTERVAL))
+    if ROLE == 'writer':
+        await publish_state()
+        asyncio.create_task(publish_periodically(PUBLISH_INTERVAL))
+    else:
+        asyncio.create_task(publish_periodically(WARM_SNAPSHOT_INTERVAL))
+
+@app.on_event("shutdown")
+async def save_state():
+    if state_publisher is not None and ingested_since_publish:
+        await publish_state()
+
+def connect():
+    if ROLE == 'reader':
+        return state_reader.current().connect()
+    return duckdb.connect(DB_PATH)
+
+def swap_snapshot(snapshot):
+    global warm_state
+    warm_state = WarmState.from_snapshot(snapshot)
+
+async def publish_periodically(interval):
+    global ingested_since_publish
+    while True:
+        await asyncio.sleep(interval)
+        # Picks up rows other writers (ETL jobs, fixtures) added since the
+        # last pass, so they reach the state without waiting for an API insert
+        with duckdb.connect(DB_PATH) as conn:
+            ingested_since_publish += warm_state.replay(conn)
+        if ingested_since_publish:
+            await publish_state()
+
+async def publish_state():
+    global ingested_since_publish
+    ingested_since_publish = 0
+    # Capture in-memory state on the event loop, do the I/O and training off it
+    arrays = warm_state.to_arrays()
+    metadata = warm_state.metadata()
+    item_ids = list(warm_state.seen.item_ids)
+    await run_in_threadpool(write_snapshot, arrays, metadata, item_ids)
+
+async def retrain_periodically(interval):
+    # Runs at startup, so a fresh store gets its first version, then on the
+    # interval; requests only ever load the version it accepted
+    while True:
+        await run_in_threadpool(refresh_model_store)
+        await asyncio.sleep(interval)
+
+def refresh_model_store():
+    conn = duckdb.connect(DB_PATH)
+    try:
+        _, meta = ModelStore(MODEL_STORE).refresh(conn, seed=NEGATIVE_SAMPLING_SEED)
+        logger.info("Model store at %s (%s, watermark %d)", meta['version'], meta['kind'], meta['watermark'])
+    except Exception:
+        logger.exception("Model store refresh failed")
+    finally:
+        conn.close()
+
+def write_snapshot(arrays, metadata, item_ids):
+    global database_copied_at
+    # Readers need embeddings, so the writer refreshes its model before
+    # publishing; a single process only saves a model it already has
+    conn = duckdb.connect(DB_PATH)
+    try:
+        model, fitted_at = None, None
+        if ROLE == 'writer':
+            # Whatever prepare_model serves, including embeddings restored
+            # from the last snapshot, which never enter model_cache
+            model = RecommendationSystem(conn).prepare_model(PUBLISHED_MODEL_KEY, item_ids=item_ids)
+            cached = model_cache.get(PUBLISHED_MODEL_KEY)
+            fitted_at = cached[1] if cached is not None and cached[0] is model else warm_state.model_fitted_at
+        elif model_cache:
+            model, fitted_at = max(model_cache.values(), key=lambda entry: entry[1])
+        elif warm_state.model is not None:
+            model, fitted_at = warm_state.model, warm_state.model_fitted_at
+        if model is not None:
+            arrays.update(export_model_embeddings(model))
+            metadata['model_fitted_at'] = fitted_at
+    except Exception:
+        logger.exception("Saving snapshot without model embeddings")
+    finally:
+        conn.close()
+    copy_database = ROLE == 'writer' and time.time() - database_copied_at >= DATABASE_COPY_INTERVAL
+    version = state_publisher.publish(
+        db_path=DB_PATH if copy_database else None,
+        arrays=arrays,
+        metadata=metadata
+    )
+    if copy_database:
+        database_copied_at = time.time()
+    logger.info("Published state version %d", version)
 
 # ======================
 # DATA MODELS
@@ -82,6 +277,30 @@ class RecommendationRequest(BaseModel):
 class TrendsRequest(RecommendationRequest):
     time_period: Optional[conint(ge=3600, le=1209600)] = 604800
 
+class BatchRecommendationEntry(BaseModel):
+    userid: uuid.UUID
+    itemid: Optional[uuid.UUID] = None
+    k: Optional[conint(ge=1, le=100)] = 20
+
+class BatchRecommendationRequest(BaseModel):
+    pipelineid: uuid.UUID
+    entries: List[BatchRecommendationEntry]
+    retriever_strategy: Optional[str] = 'default'
+    ranker_strategy: Optional[str] = 'default'
+    exploration_factor: Optional[confloat(ge=0, le=1)] = 0.1
+    promoted_items: Optional[List[uuid.UUID]] = None
+    excluded_items: Optional[List[uuid.UUID]] = None
+    detailed_output: Optional[bool] = False
+
+class InteractionEvent(BaseModel):
+    userid: uuid.UUID
+    itemid: uuid.UUID
+    rating: Optional[conint(ge=0, le=5)] = None
+    timestamp: Optional[int] = None
+
+class InteractionBatch(BaseModel):
+    interactions: List[InteractionEvent]
+
 class RandomRecommendationRequest(BaseModel):
     pipelineid: uuid.UUID
     userid: uuid.UUID
@@ -94,10 +313,33 @@ class RandomRecommendationRequest(BaseModel):
 # CORE RECOMMENDATION ENGINE
 # ======================
 
+# Fitted models shared across requests, keyed like RecommendationSystem.models
+model_cache = {}
+# (version, model, loaded_at) of the model store's CURRENT version
+stored_model = None
+stored_model_lock = threading.Lock()
+
+def load_stored_model():
+    # Loads CURRENT once per version and never trains. It is served through
+    # its exported embeddings, the same predict() readers use
+    global stored_model
+    store = ModelStore(MODEL_STORE)
+    current = store.current()
+    if current is None:
+        record_cache('model', False)
+        raise HTTPException(status_code=503, detail="No accepted model version yet")
+    with stored_model_lock:
+        hit = stored_model is not None and stored_model[0] == current['version']
+        record_cache('model', hit)
+        if not hit:
+            model = EmbeddingModel.from_model(store.load(current['version']))
+            stored_model = (current['version'], model, time.time())
+        return stored_model[1], stored_model[2]
+
 class RecommendationSystem:
-    def __init__(self, conn):
+    def __init__(self, conn, models=None):
         self.conn = conn
-        self.models = {}
+        self.models = model_cache if models is None else models
         
     def get_pipeline_config(self, pipelineid):
         config = self.conn.execute(f"""
@@ -110,29 +352,73 @@ class RecommendationSystem:
             raise HTTPException(status_code=404, detail="Pipeline not found")
         return config
 
-    def prepare_model(self, userid):
-        if userid not in self.models:
-            interactions = self.conn.execute("""
-                SELECT userid, itemid, rating
-                FROM interactions
-            """).fetchdf()
-
-            dataset = DatasetPure.build_negative_samples(
-                data=interactions,
-                num_neg=1
-            )
-
-            model = PinSAGE(
+    def prepare_model(self, userid, item_ids=None):
+        # With a model store, writers and single processes serve its CURRENT
+        # version only; readers serve the embeddings the writer published
+        if MODEL_STORE and ROLE != 'reader':
+            model, loaded_at = load_stored_model()
+            self.models[userid] = (model, loaded_at)
+            return model
+
+        # Embeddings restored from a snapshot serve until they go stale;
+        # readers never train and always use them
+        snapshot_model = warm_state.model if warm_state is not None else None
+        if snapshot_model is not None and (
+            ROLE == 'reader' or time.time() - (warm_state.model_fitted_at or 0) < MODEL_TTL_SECONDS
+        ):
+            record_cache('model', True)
+            return snapshot_model
+        if ROLE == 'reader':
+            record_cache('model', False)
+            raise HTTPException(status_code=503, detail="No model embeddings published yet")
+
+        cached = self.models.get(userid)
+        hit = cached is not None and time.time() - cached[1] < MODEL_TTL_SECONDS
+        record_cache('model', hit)
+        if not hit:
+            train_data, data_info = DatasetPure.build_trainset(self.training_frame(item_ids))
+
+            model = PinSage(
                 task="ranking",
-                data_info=dataset.data_info,
+                data_info=data_info,
+                loss_type="cross_entropy",
                 embed_size=64,
                 n_epochs=10,
                 num_walks=10,
-                walk_length=5
+                sample_walk_len=5
             )
-            model.fit(dataset)
-            self.models[userid] = model
-        return self.models[userid]
+            model.fit(train_data, neg_sampling=False)
+            self.models[userid] = (model, time.time())
+        return self.models[userid][0]
+
+    def training_frame(self, item_ids=None):
+        # Positives plus one sampled negative each from the shared sampler:
+        # popularity^alpha over the warm item ids, never an item the user rated.
+        # Off the event loop, callers pass item ids captured on it; items not
+        # in them get codes local to this frame, so warm_state is only read
+        item_ids = list(warm_state.seen.item_ids if item_ids is None else item_ids)
+        item_index = {item: code for code, item in enumerate(item_ids)}
+        interactions = self.conn.execute("""
+            SELECT userid::VARCHAR AS userid, itemid::VARCHAR AS itemid
+            FROM interactions
+        """).fetchdf()
+        users, user_codes = dense_codes(interactions['userid'].to_numpy())
+        item_codes = np.fromiter(
+            (item_index.setdefault(item, len(item_index)) for item in interactions['itemid']),
+            dtype=np.int64, count=len(interactions)
+        )
+        sampler = NegativeSampler(user_codes, item_codes, len(item_index), alpha=NEGATIVE_SAMPLING_ALPHA)
+        groups, items = sampler.sample(user_codes, num_neg=1, seed=NEGATIVE_SAMPLING_SEED)
+        item_ids = np.array(list(item_index), dtype=object)
+        return pd.concat([
+            pd.DataFrame({'user': interactions['userid'], 'item': interactions['itemid'], 'label': 1}),
+            pd.DataFrame({'user': users[groups], 'item': item_ids[items], 'label': 0})
+        ], ignore_index=True)
+
+    def prepare_batch_model(self, userids):
+        # Training data does not depend on the requesting user, so the model
+        # prepared for the first one serves the whole batch
+        return self.prepare_model(userids[0])
 
 # ======================
 # API ENDPOINTS
@@ -140,94 +426,234 @@ class RecommendationSystem:
 
 @app.post("/recommendations")
 async def get_recommendations(request: RecommendationRequest):
-    conn = duckdb.connect('recommendations.db')
+    trace = RequestTrace('recommendations')
+    with profile_slow_requests('/recommendations'):
+        conn = connect()
+        try:
+            system = RecommendationSystem(conn)
+            with trace.stage('config'):
+                config = system.get_pipeline_config(request.pipelineid)
+
+            # Validate strategies match pipeline configuration
+            if request.retriever_strategy != config[0]:
+                raise HTTPException(status_code=400, detail="Invalid retriever strategy for pipeline")
+            if request.ranker_strategy != config[1]:
+                raise HTTPException(status_code=400, detail="Invalid ranker strategy for pipeline")
+
+            # Generate base recommendations
+            base_recs = generate_hybrid_recommendations(
+                conn=conn,
+                system=system,
+                request=request,
+                trace=trace
+            )
+
+            # Apply exploration strategy
+            with trace.stage('exploration'):
+                final_recs = apply_exploration_strategy(
+                    recommendations=base_recs,
+                    exploration_factor=request.exploration_factor
+                )
+
+            # Apply promotions and exclusions
+            with trace.stage('promotions'):
+                final_recs = apply_promotions_exclusions(
+                    recommendations=final_recs,
+                    promoted=request.promoted_items,
+                    excluded=request.excluded_items,
+                    k=request.k
+                )
+
+            with trace.stage('format'):
+                output = format_recommendation_output(
+                    conn=conn,
+                    items=final_recs,
+                    detailed=request.detailed_output
+                )
+            if request.detailed_output:
+                output['timings_ms'] = trace.timings_ms()
+            return output
+        finally:
+            conn.close()
+            trace.finish()
+
+@app.post("/batch-recommendations")
+async def get_batch_recommendations(request: BatchRecommendationRequest):
+    if not request.entries:
+        raise HTTPException(status_code=400, detail="Batch must contain at least one entry")
+    if len(request.entries) > MAX_BATCH_ENTRIES:
+        raise HTTPException(status_code=400, detail=f"Batch exceeds {MAX_BATCH_ENTRIES} entries")
+
+    trace = RequestTrace('batch-recommendations')
+    with profile_slow_requests('/batch-recommendations'):
+        conn = connect()
+        try:
+            system = RecommendationSystem(conn)
+            with trace.stage('config'):
+                config = system.get_pipeline_config(request.pipelineid)
+
+            if request.retriever_strategy != config[0]:
+                raise HTTPException(status_code=400, detail="Invalid retriever strategy for pipeline")
+            if request.ranker_strategy != config[1]:
+                raise HTTPException(status_code=400, detail="Invalid ranker strategy for pipeline")
+
+            batch_recs = generate_batch_hybrid_recommendations(
+                conn=conn,
+                system=system,
+                request=request,
+                trace=trace
+            )
+        except BaseException:
+            conn.close()
+            trace.finish()
+            raise
+
+    # Each entry is scored, finished and written as its line is produced;
+    # the connection stays open until the last line
+    def stream():
+        details = {}
+        try:
+            for entry, base_recs in zip(request.entries, batch_recs):
+                with trace.stage('exploration'):
+                    final_recs = apply_exploration_strategy(
+                        recommendations=base_recs,
+                        exploration_factor=request.exploration_factor
+                    )
+                with trace.stage('promotions'):
+                    final_recs = apply_promotions_exclusions(
+                        recommendations=final_recs,
+                        promoted=request.promoted_items,
+                        excluded=request.excluded_items,
+                        k=entry.k
+                    )
+                with trace.stage('format'):
+                    details.update(fetch_item_details(
+                        conn=conn,
+                        items=[item for item in final_recs if str(item) not in details],
+                        detailed=request.detailed_output
+                    ))
+                line = {
+                    "userid": str(entry.userid),
+                    "itemid": str(entry.itemid) if entry.itemid else None,
+                    "results": [details[str(item)] for item in final_recs if str(item) in details]
+                }
+                if request.detailed_output:
+                    line["timings_ms"] = trace.timings_ms()
+                yield json.dumps(line, default=str) + "\n"
+        finally:
+            conn.close()
+            trace.finish()
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+@app.post("/interactions")
+async def record_interactions(request: InteractionBatch):
+    global ingested_since_publish
+    if ROLE == 'reader':
+        # Writes are serialised through the writer process
+        if not WRITER_URL:
+            raise HTTPException(status_code=503, detail="No writer configured for this reader")
+        async with httpx.AsyncClient(base_url=WRITER_URL) as client:
+            response = await client.post("/interactions", content=request.json(),
+                                         headers={"Content-Type": "application/json"})
+        return JSONResponse(response.json(), status_code=response.status_code)
+
+    if not request.interactions:
+        return {"recorded": 0}
+
+    now = int(time.time())
+    rows = pd.DataFrame({
+        'interactionid': [str(uuid.uuid4()) for _ in request.interactions],
+        'userid': [str(event.userid) for event in request.interactions],
+        'itemid': [str(event.itemid) for event in request.interactions],
+        'rating': [event.rating for event in request.interactions],
+        'timestamp': [event.timestamp or now for event in request.interactions]
+    })
+
+    conn = duckdb.connect(DB_PATH)
     try:
-        system = RecommendationSystem(conn)
-        config = system.get_pipeline_config(request.pipelineid)
-        
-        # Validate strategies match pipeline configuration
-        if request.retriever_strategy != config[0]:
-            raise HTTPException(status_code=400, detail="Invalid retriever strategy for pipeline")
-        if request.ranker_strategy != config[1]:
-            raise HTTPException(status_code=400, detail="Invalid ranker strategy for pipeline")
-
-        # Generate base recommendations
-        base_recs = generate_hybrid_recommendations(
-            conn=conn,
-            system=system,
-            request=request
-        )
+        conn.register('new_interactions', rows)
+        # ingest_seq comes from the database sequence: snapshots record the
+        # last one they include
+        conn.execute("""
+            INSERT INTO interactions (interactionid, userid, itemid, rating, timestamp)
+            SELECT interactionid::UUID, userid::UUID, itemid::UUID, rating, timestamp
+            FROM new_interactions
+        """)
+        # Applies these rows together with any other writer's rows before
+        # them, rather than moving the watermark past those
+        ingested_since_publish += warm_state.replay(conn, catalogue=False)
+    finally:
+        conn.close()
 
-        # Apply exploration strategy
-        final_recs = apply_exploration_strategy(
-            recommendations=base_recs,
-            exploration_factor=request.exploration_factor
-        )
+    return {"recorded": len(rows)}
 
-        # Apply promotions and exclusions
-        final_recs = apply_promotions_exclusions(
-            recommendations=final_recs,
-            promoted=request.promoted_items,
-            excluded=request.excluded_items,
-            k=request.k
-        )
+@app.get("/ready")
+async def get_readiness():
+    if not readiness["ready"]:
+        return JSONResponse(readiness, status_code=503)
+    return readiness
 
-        return format_recommendation_output(
-            conn=conn,
-            items=final_recs,
-            detailed=request.detailed_output
-        )
-    finally:
-        conn.close()
+@app.get("/metrics")
+async def get_metrics():
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
 
 @app.post("/trends")
 async def get_trends(request: TrendsRequest):
-    conn = duckdb.connect('recommendations.db')
+    trace = RequestTrace('trends')
+    conn = connect()
     try:
         # Calculate time window
         end_time = datetime.now()
         start_time = end_time - timedelta(seconds=request.time_period)
         
-        # Get trending items
-        trends = conn.execute(f"""
-            SELECT itemid, COUNT(*) as interaction_count
-            FROM interactions
-            WHERE timestamp BETWEEN {int(start_time.timestamp())} AND {int(end_time.timestamp())}
-            GROUP BY itemid
-            ORDER BY interaction_count DESC
-            LIMIT {request.k}
-        """).fetchdf()
+        # Get trending items from the hourly trend buckets
+        with trace.stage('trends'):
+            trends = warm_state.trends(
+                start=int(start_time.timestamp()),
+                end=int(end_time.timestamp()),
+                k=request.k
+            )
 
-        item_ids = [uuid.UUID(item) for item in trends['itemid'].tolist()]
+        item_ids = [item for item, _ in trends]
+        trace.candidates('trends', len(item_ids))
         
         # Apply promotions and exclusions
-        final_trends = apply_promotions_exclusions(
-            recommendations=item_ids,
-            promoted=request.promoted_items,
-            excluded=request.excluded_items,
-            k=request.k
-        )
+        with trace.stage('promotions'):
+            final_trends = apply_promotions_exclusions(
+                recommendations=item_ids,
+                promoted=request.promoted_items,
+                excluded=request.excluded_items,
+                k=request.k
+            )
 
-        return format_recommendation_output(
-            conn=conn,
-            items=final_trends,
-            detailed=request.detailed_output
-        )
+        with trace.stage('format'):
+            output = format_recommendation_output(
+                conn=conn,
+                items=final_trends,
+                detailed=request.detailed_output
+            )
+        if request.detailed_output:
+            output['timings_ms'] = trace.timings_ms()
+        return output
     finally:
         conn.close()
+        trace.finish()
 
 @app.post("/random-recommendations")
 async def get_random_recommendations(request: RandomRecommendationRequest):
-    conn = duckdb.connect('recommendations.db')
+    trace = RequestTrace('random-recommendations')
+    conn = connect()
     try:
         # Get all valid items
-        all_items = conn.execute("""
-            SELECT itemid FROM items
-            WHERE itemid NOT IN (SELECT unnest($excluded))
-        """, params={'excluded': request.excluded_items or []}).fetchdf()
+        with trace.stage('candidates'):
+            all_items = conn.execute("""
+                SELECT itemid FROM items
+                WHERE itemid NOT IN (SELECT unnest($excluded)::UUID)
+            """, parameters={'excluded': [str(item) for item in request.excluded_items or []]}).fetchdf()
         
         # Convert to UUID list
-        item_pool = [uuid.UUID(item) for item in all_items['itemid'].tolist()]
+        item_pool = [uuid.UUID(str(item)) for item in all_items['itemid'].tolist()]
         
         # Add promoted items
         final_items = (request.promoted_items or []) + [
@@ -238,63 +664,160 @@ async def get_random_recommendations(request: RandomRecommendationRequest):
         # Select random subset
         random_recs = random.sample(final_items, min(request.k, len(final_items)))
         
-        return format_recommendation_output(
-            conn=conn,
-            items=random_recs,
-            detailed=request.detailed_output
-        )
+        with trace.stage('format'):
+            output = format_recommendation_output(
+                conn=conn,
+                items=random_recs,
+                detailed=request.detailed_output
+            )
+        if request.detailed_output:
+            output['timings_ms'] = trace.timings_ms()
+        return output
     finally:
         conn.close()
+        trace.finish()
 
 # ======================
 # HELPER FUNCTIONS
 # ======================
 
-def generate_hybrid_recommendations(conn, system, request):
+def generate_hybrid_recommendations(conn, system, request, trace=None):
+    trace = trace or RequestTrace('recommendations')
+
     # Collaborative Filtering Scores
-    cf_scores = conn.execute(f"""
-        SELECT itemid, AVG(rating) * 20 AS score
-        FROM interactions
-        WHERE userid != '{request.userid}'
-        GROUP BY itemid
-    """).fetchdf().set_index('itemid')['score'].to_dict()
+    with trace.stage('cf'):
+        own_sum, own_count = warm_state.own_ratings(conn, request.userid)
+        cf_scores = warm_state.collaborative_scores(own_sum, own_count)
+    trace.candidates('cf', len(cf_scores))
 
     # Content-Based Scores
-    if request.itemid:
-        genre = conn.execute(f"""
-            SELECT genre FROM items 
-            WHERE itemid = '{request.itemid}'
-        """).fetchone()[0]
-    else:
-        genre = conn.execute(f"""
-            SELECT genre FROM interactions i
-            JOIN items USING (itemid)
-            WHERE userid = '{request.userid}'
-            GROUP BY genre ORDER BY COUNT(*) DESC
-            LIMIT 1
-        """).fetchone()[0]
-
-    cb_scores = conn.execute(f"""
-        SELECT itemid, CASE WHEN genre = '{genre}' THEN 100 ELSE 0 END AS score
-        FROM items
-    """).fetchdf().set_index('itemid')['score'].to_dict()
+    with trace.stage('cb'):
+        cb_scores = score_content(conn, request)
+    trace.candidates('cb', len(cb_scores))
 
     # PinSAGE Scores
-    model = system.prepare_model(request.userid)
-    pinsage_scores = {
-        uuid.UUID(item): score * 100 
-        for item, score in model.predict(userid=request.userid, n=100)
-    }
+    with trace.stage('predict'):
+        model = system.prepare_model(request.userid)
+        pinsage_scores = {
+            uuid.UUID(item): score * 100
+            for item, score in model.predict(userid=request.userid, n=100)
+        }
+    trace.candidates('pinsage', len(pinsage_scores))
+
+    # Drop already-seen and excluded items before the election so every seat
+    # goes to an eligible item
+    with trace.stage('filter'):
+        ballots = remove_ineligible_items(
+            ballots=[cf_scores, cb_scores, pinsage_scores],
+            userid=request.userid,
+            excluded=request.excluded_items
+        )
+    trace.candidates('eligible', len({item for ballot in ballots for item in ballot}))
 
     # Combine scores using STAR voting
-    election = starvote.election(
-        method=starvote.allocated,
-        ballots=[cf_scores, cb_scores, pinsage_scores],
-        seats=request.k
-    )
-    
+    with trace.stage('election'):
+        election = starvote.election(
+            method=starvote.allocated,
+            ballots=ballots,
+            seats=request.k
+        )
+
     return election
 
+def score_content(conn, request):
+    if request.itemid:
+        genre = warm_state.genre_code(request.itemid)
+        if genre < 0:
+            raise HTTPException(status_code=404, detail=f"Item {request.itemid} not found")
+    else:
+        genre = warm_state.top_genre_code(request.userid)
+
+    return warm_state.content_scores(genre)
+
+def generate_batch_hybrid_recommendations(conn, system, request, trace=None):
+    # Lookups that can fail (unknown items, no model) run before anything is
+    # returned; the generator then scores each entry as it is consumed
+    trace = trace or RequestTrace('batch-recommendations')
+    entries = request.entries
+    userids = list(dict.fromkeys(str(entry.userid) for entry in entries))
+
+    # Collaborative Filtering Scores: AVG(rating) over all other users. Every
+    # user shares the global aggregates and carries sparse deltas for only
+    # the items they rated themselves
+    with trace.stage('cf'):
+        own = conn.execute("""
+            SELECT userid::VARCHAR, itemid::VARCHAR, SUM(rating), COUNT(rating)
+            FROM interactions
+            WHERE userid IN (SELECT unnest($userids)::UUID)
+            GROUP BY userid, itemid
+        """, parameters={'userids': userids}).fetchall()
+        global_scores = warm_state.collaborative_scores(0, 0)
+        own_ratings = {}
+        for userid, itemid, total, n in own:
+            idx = warm_state.seen.item_index.get(itemid)
+            if idx is not None and idx < len(warm_state.rating_count):
+                own_ratings.setdefault(userid, []).append((idx, total or 0, n))
+
+    # Content-Based Scores: context genre per entry, from the item when given,
+    # otherwise from each user's most frequent genre
+    with trace.stage('cb'):
+        entry_genres = []
+        for entry in entries:
+            if entry.itemid:
+                genre = warm_state.genre_code(entry.itemid)
+                if genre < 0:
+                    raise HTTPException(status_code=404, detail=f"Item {entry.itemid} not found")
+            else:
+                genre = warm_state.top_genre_code(entry.userid)
+            entry_genres.append(genre)
+
+    with trace.stage('predict'):
+        model = system.prepare_batch_model(userids)
+
+    def collaborative_scores(userid):
+        scores = dict(global_scores)
+        for idx, total, n in own_ratings.get(userid, ()):
+            other_count = warm_state.rating_count[idx] - n
+            if other_count > 0:
+                scores[warm_state.item_uuids[idx]] = (warm_state.rating_sum[idx] - total) / other_count * 20
+            else:
+                scores.pop(warm_state.item_uuids[idx], None)
+        return scores
+
+    # Combine scores using STAR voting, one election per entry
+    def elections():
+        content_by_genre = {}
+        pinsage_by_user = {}
+        for entry, genre in zip(entries, entry_genres):
+            userid = str(entry.userid)
+            with trace.stage('cf'):
+                cf_scores = collaborative_scores(userid)
+            with trace.stage('cb'):
+                if genre not in content_by_genre:
+                    content_by_genre[genre] = warm_state.content_scores(genre)
+            # PinSAGE Scores
+            with trace.stage('predict'):
+                if userid not in pinsage_by_user:
+                    pinsage_by_user[userid] = {
+                        uuid.UUID(item): score * 100
+                        for item, score in model.predict(userid=userid, n=100)
+                    }
+            with trace.stage('filter'):
+                ballots = remove_ineligible_items(
+                    ballots=[cf_scores, content_by_genre[genre], pinsage_by_user[userid]],
+                    userid=entry.userid,
+                    excluded=request.excluded_items
+                )
+            trace.candidates('eligible', len({item for ballot in ballots for item in ballot}))
+            with trace.stage('election'):
+                yield starvote.election(
+                    method=starvote.allocated,
+                    ballots=ballots,
+                    seats=entry.k
+                )
+
+    return elections()
+
 def apply_exploration_strategy(recommendations, exploration_factor):
     if exploration_factor == 0:
         return recommendations
@@ -305,27 +828,42 @@ def apply_exploration_strategy(recommendations, exploration_factor):
     
     return recommendations[:-explore_count] + explore_items
 
+def remove_ineligible_items(ballots, userid, excluded):
+    candidates = list({item for ballot in ballots for item in ballot})
+    eligible = set(warm_state.seen.filter(
+        candidates=candidates,
+        userid=userid,
+        excluded=excluded
+    ))
+    return [
+        {item: score for item, score in ballot.items() if item in eligible}
+        for ballot in ballots
+    ]
+
 def apply_promotions_exclusions(recommendations, promoted, excluded, k):
-    promoted = promoted or []
-    excluded = excluded or []
-    
-    # Filter excluded items
-    filtered = [item for item in recommendations if item not in excluded]
-    
-    # Add promoted items to top
-    promoted_filtered = [item for item in promoted if item not in excluded]
-    combined = promoted_filtered + [item for item in filtered if item not in promoted_filtered]
-    
-    return combined[:k]
+    # Excluded items are dropped and promoted ones moved to the top in one
+    # vectorized pass over dense item ids
+    return warm_state.seen.filter(
+        candidates=recommendations,
+        excluded=excluded,
+        promoted=promoted,
+        k=k
+    )
 
 def format_recommendation_output(conn, items, detailed=False):
     if not items:
         return {"results": []}
 
-    items_str = [f"'{item}'" for item in items]
-    
-    query = """
-        SELECT 
+    details = fetch_item_details(conn, items, detailed)
+
+    return {"results": [details[str(item)] for item in items if str(item) in details]}
+
+def fetch_item_details(conn, items, detailed=False):
+    if not items:
+        return {}
+
+    result = conn.execute("""
+        SELECT
             i.itemid,
             i.title,
             i.genre,
@@ -336,18 +874,12 @@ def format_recommendation_output(conn, items, detailed=False):
     """ if detailed else "") + """
         FROM items i
         LEFT JOIN interactions r USING (itemid)
-        WHERE i.itemid IN ({items})
+        WHERE i.itemid IN (SELECT unnest($items)::UUID)
         GROUP BY i.itemid, i.title, i.genre
-        ORDER BY MAX(array_position(ARRAY[{ordered_ids}]::UUID[], i.itemid))
-    """.format(
-        items=','.join(items_str),
-        ordered_ids=','.join(items_str)
-    )
-
-    result = conn.execute(query).fetchdf()
+    """, parameters={'items': [str(item) for item in items]}).fetchdf()
     result['itemid'] = result['itemid'].astype(str)
-    
-    return {"results": result.to_dict(orient='records')}
+
+    return {record['itemid']: record for record in result.to_dict(orient='records')}
 
 # ======================
 # MAIN EXECUTION
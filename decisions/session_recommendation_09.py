@@ -173,14 +173,14 @@ import pandas as pd
 
 conn = duckdb.connect("godot_sessions.db")  
 
-# Fetch session sequences (user = session, item sequence)  
-session_sequences = conn.execute("""  
-  SELECT  
-    session_id,  
-    ARRAY_AGG(item_id ORDER BY event_order) AS items  
-  FROM session_items  
-  GROUP BY 1  
-""").fetchdf()  
+# Every prefix -> next-item pair (13-item context, sessions of 3+ items),  
+# built in DuckDB by session_recommendation_sequences.py  
+from session_recommendation_sequences import iter_pair_batches  
+
+train_df = pd.concat(  
+    batch.to_pandas() for batch in iter_pair_batches(conn, context=13)  
+).rename(columns={"session_id": "user", "next_item": "item", "history": "hist_items"})  
+train_df["label"] = 1  
 
 # Get item features  
 item_features = conn.execute("""  
@@ -190,20 +190,6 @@ item_features = conn.execute("""
     image_embedding  
   FROM assets  
 """).fetchdf()  
-
-# Format for LibRecommender  
-train_data = []  
-for _, row in session_sequences.iterrows():  
-    items = row["items"]  
-    if len(items) > 1:  
-        # Use all but last item as history, last as target  
-        train_data.append({  
-            "user": row["session_id"],  
-            "item": items[-1],  
-            "label": 1,  
-            "hist_items": items[:-1]  
-        })  
-train_df = pd.DataFrame(train_data)  
 ```  
 
 #### **Step 2: Train Two-Tower Model**  
@@ -1,6 +1,10 @@
 import duckdb
-import pandas as pd
 from libreco.algorithms import PinSageDGL
+from session_recommendation_feed import (
+    ITEM_EMBEDDING_DIM, USER_EMBEDDING_DIM, batch_features, iter_training_batches
+)
+
+EPOCHS = 10
 
 # Initialize DuckDB
 con = duckdb.connect(':memory:')
@@ -13,31 +17,31 @@ con.execute("CALL load_asset_data('assets.parquet')")
 con.execute("CALL load_interaction_data('interactions.csv')")
 con.execute("CALL normalize_edges()")
 
-# Prepare training data
-df = con.execute("""
-    SELECT 
-      user_id,
-      item_id,
-      features,
-      target
-    FROM pinsage_features
-""").df()
-
 # Initialize PinSageDGL
 model = PinSageDGL(
     task="ranking",
     data_info=data_info,
     paradigm="u2i",
-    embed_size=len(features[0]),  # Auto-detect from concatenated embeddings
+    embed_size=USER_EMBEDDING_DIM + ITEM_EMBEDDING_DIM,
     num_layers=3,
     num_neighbors=15,
     loss_type="max_margin",
-    sampler="random"
+    sampler="random",
+    n_epochs=1
 )
 
-# Train model
-model.fit(
-    df[['user_id', 'item_id', 'features']],
-    df['target'],
-    eval_data=(eval_features, eval_targets)
-)
+# Train model on observed edges plus sampled negatives, streamed from
+# DuckDB as Arrow record batches so memory is bounded by batch_size. Each
+# fit call is one pass over its batch, so an epoch is one pass over the
+# stream; every epoch draws fresh negatives
+for epoch in range(EPOCHS):
+    for batch in iter_training_batches(con, batch_size=65536, negatives_per_edge=4, seed=epoch):
+        model.fit(
+            {
+                'user_id': batch['user_id'],
+                'item_id': batch['item_id'],
+                'features': batch_features(batch)
+            },
+            batch['target'],
+            eval_data=(eval_features, eval_targets)
+        )
@@ -35,6 +35,17 @@ CREATE OR REPLACE TABLE users (
   session_patterns JSON
 );
 
+-- Hash of the inputs each embedding column was last computed from, so the
+-- embedding pipeline (session_recommendation_embeddings.py) skips assets
+-- whose inputs and encoder are unchanged
+CREATE OR REPLACE TABLE asset_embedding_hashes (
+  asset_id UUID,
+  embedding_column VARCHAR,
+  content_hash VARCHAR,
+  computed_at TIMESTAMP,
+  PRIMARY KEY (asset_id, embedding_column)
+);
+
 -- ======================
 -- Interaction Tables
 -- ======================
@@ -47,14 +58,26 @@ CREATE OR REPLACE TABLE sessions (
   modified_assets UUID[]
 );
 
+-- added_at is when the row was loaded, so point-in-time snapshots pick up
+-- assets added to sessions that started earlier
 CREATE OR REPLACE TABLE session_assets (
   session_id UUID,
   asset_id UUID,
   usage_count INT,
   node_paths VARCHAR[],
+  added_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
   PRIMARY KEY (session_id, asset_id)
 );
 
+-- Ordered editor events of each session, written in batches by the live
+-- session store (session_recommendation_live.py)
+CREATE OR REPLACE TABLE session_items (
+  session_id UUID,
+  item_id UUID,
+  event_order INTEGER,
+  timestamp TIMESTAMP
+);
+
 -- ======================
 -- Graph Structure Tables
 -- ======================
@@ -76,10 +99,61 @@ CREATE OR REPLACE TABLE user_item_edges (
   PRIMARY KEY (user_id, asset_id, interaction_type)
 );
 
+-- User-asset edge deltas waiting for apply_user_item_edges(): written by
+-- load_interaction_data for each batch and by any other edge producer,
+-- cleared once applied
+CREATE OR REPLACE TABLE user_item_edge_deltas (
+  user_id UUID,
+  asset_id UUID,
+  interaction_type VARCHAR,
+  weight FLOAT,
+  last_interacted TIMESTAMP
+);
+
+-- Raw edge weights are never rewritten. Per-source totals are kept beside
+-- them and updated with every upsert, so a normalised weight is one lookup.
+CREATE OR REPLACE TABLE item_graph_weight_sums (
+  source UUID PRIMARY KEY,
+  total_weight DOUBLE
+);
+
+CREATE OR REPLACE TABLE user_item_weight_sums (
+  user_id UUID PRIMARY KEY,
+  total_weight DOUBLE
+);
+
+-- Cached normalised edges, refreshed by normalize_edges() for the sources
+-- listed in the dirty tables only
+CREATE OR REPLACE TABLE item_graph_normalized (
+  source UUID,
+  target UUID,
+  normalized_weight DOUBLE,
+  cooccurrence_type VARCHAR,
+  PRIMARY KEY (source, target, cooccurrence_type)
+);
+
+CREATE OR REPLACE TABLE user_item_edges_normalized (
+  user_id UUID,
+  asset_id UUID,
+  interaction_type VARCHAR,
+  normalized_weight DOUBLE,
+  PRIMARY KEY (user_id, asset_id, interaction_type)
+);
+
+CREATE OR REPLACE TABLE dirty_graph_sources (
+  source UUID PRIMARY KEY
+);
+
+CREATE OR REPLACE TABLE dirty_edge_users (
+  user_id UUID PRIMARY KEY
+);
+
 -- ======================
 -- Materialized Views
 -- ======================
 
+-- Live view; training runs read a point-in-time snapshot of it built by
+-- session_recommendation_features.py instead
 CREATE OR REPLACE VIEW training_features AS
 SELECT
   u.id AS user_id,
@@ -106,13 +180,24 @@ JOIN sessions s ON u.id = s.user_id
 JOIN session_assets sa ON s.id = sa.session_id
 JOIN assets a ON sa.asset_id = a.id;
 
+-- Always current; reads the stored sums instead of a window over the graph
 CREATE OR REPLACE VIEW normalized_item_graph AS
-SELECT 
-  source,
-  target,
-  weight / SUM(weight) OVER (PARTITION BY source) AS normalized_weight,
-  cooccurrence_type
-FROM item_graph;
+SELECT
+  g.source,
+  g.target,
+  g.weight / s.total_weight AS normalized_weight,
+  g.cooccurrence_type
+FROM item_graph g
+JOIN item_graph_weight_sums s USING (source);
+
+CREATE OR REPLACE VIEW normalized_user_item_edges AS
+SELECT
+  e.user_id,
+  e.asset_id,
+  e.interaction_type,
+  e.weight / s.total_weight AS normalized_weight
+FROM user_item_edges e
+JOIN user_item_weight_sums s USING (user_id);
 
 -- ======================
 -- Indexes
@@ -127,9 +212,11 @@ WITH (
   ef_construction = 200
 );
 
--- Range index for temporal queries
-CREATE INDEX session_time_idx ON sessions 
-USING BTREE(start_time);
+-- DuckDB has no BTREE indexes; its ART indexes serve point lookups only.
+-- Time-range filters on start_time are pruned by row-group min/max
+-- statistics, and historical sessions live in day-partitioned Parquet
+-- (session_recommendation_partitions.py), where a window query opens only
+-- the partitions it overlaps.
 
 -- ======================
 -- Data Loading Procedures
@@ -141,15 +228,53 @@ BEGIN
   WITH (FORMAT PARQUET, AUTO_DETECT TRUE);
 END;
 
-CREATE OR REPLACE PROCEDURE load_interaction_data(path VARCHAR) AS
+-- Upserts staged user-item edge deltas (user_item_edge_deltas) into
+-- user_item_edges, maintains the per-user totals and clears the staging table
+CREATE OR REPLACE PROCEDURE apply_user_item_edges() AS
 BEGIN
-  -- Load session-relationship data
-  INSERT INTO session_assets
+  CREATE OR REPLACE TEMP TABLE user_item_delta AS
   SELECT
-    session_id::UUID,
-    asset_id::UUID,
-    usage_count::INT,
-    string_split(node_paths, ';') 
+    user_id,
+    asset_id,
+    interaction_type,
+    SUM(weight) AS weight,
+    MAX(last_interacted) AS last_interacted
+  FROM user_item_edge_deltas
+  GROUP BY 1, 2, 3;
+
+  INSERT INTO user_item_edges
+  SELECT user_id, asset_id, interaction_type, weight, last_interacted
+  FROM user_item_delta
+  ON CONFLICT (user_id, asset_id, interaction_type)
+  DO UPDATE SET
+    weight = weight + EXCLUDED.weight,
+    last_interacted = GREATEST(last_interacted, EXCLUDED.last_interacted);
+
+  INSERT INTO user_item_weight_sums
+  SELECT user_id, SUM(weight)
+  FROM user_item_delta
+  GROUP BY user_id
+  ON CONFLICT (user_id)
+  DO UPDATE SET total_weight = total_weight + EXCLUDED.total_weight;
+
+  INSERT OR IGNORE INTO dirty_edge_users
+  SELECT DISTINCT user_id FROM user_item_delta;
+
+  DELETE FROM user_item_edge_deltas;
+END;
+
+CREATE OR REPLACE PROCEDURE load_interaction_data(
+  path VARCHAR,
+  max_pairs_per_asset INT DEFAULT 50
+) AS
+BEGIN
+  -- Stage the batch, keeping only (session, asset) rows not loaded before
+  CREATE OR REPLACE TEMP TABLE new_session_assets AS
+  SELECT DISTINCT ON (src.session_id, src.asset_id)
+    src.session_id::UUID AS session_id,
+    src.asset_id::UUID AS asset_id,
+    src.usage_count::INT AS usage_count,
+    string_split(src.node_paths, ';') AS node_paths
   FROM read_csv(
     path,
     delim='|',
@@ -160,85 +285,186 @@ BEGIN
       'usage_count': 'INT',
       'node_paths': 'VARCHAR'
     }
-  );
-  
-  -- Update co-occurrence graph
-  INSERT INTO item_graph
+  ) src
+  ANTI JOIN session_assets sa
+    ON sa.session_id = src.session_id::UUID
+    AND sa.asset_id = src.asset_id::UUID;
+
+  INSERT INTO session_assets (session_id, asset_id, usage_count, node_paths)
+  SELECT session_id, asset_id, usage_count, node_paths FROM new_session_assets;
+
+  -- Each new (session, asset) row is a use of the asset by the session's
+  -- user, weighted by its usage count; sessions not loaded yet contribute
+  -- no user edge
+  INSERT INTO user_item_edge_deltas
+  SELECT
+    s.user_id,
+    n.asset_id,
+    'session' AS interaction_type,
+    COALESCE(n.usage_count, 1) AS weight,
+    s.start_time + COALESCE(s.duration, INTERVAL 0 SECOND) AS last_interacted
+  FROM new_session_assets n
+  JOIN sessions s ON s.id = n.session_id
+  WHERE s.user_id IS NOT NULL;
+
+  -- Co-occurrence deltas for the batch only: every new asset pairs with the
+  -- other assets of its session, old or new, and each pair is listed once.
+  -- The cap applies to both endpoints: every asset keeps at most
+  -- max_pairs_per_asset pairs per session, picked by a stable hash of the
+  -- pair, and a pair survives only if both endpoints keep it. Very large
+  -- sessions cost O(batch * cap) instead of O(session^2), and whether a
+  -- new/new pair is kept does not depend on which side it is seen from.
+  CREATE OR REPLACE TEMP TABLE item_graph_delta AS
+  WITH session_members AS (
+    SELECT
+      sa.session_id,
+      sa.asset_id,
+      n.asset_id IS NOT NULL AS is_new
+    FROM session_assets sa
+    LEFT JOIN new_session_assets n
+      ON n.session_id = sa.session_id
+      AND n.asset_id = sa.asset_id
+    WHERE sa.session_id IN (SELECT DISTINCT session_id FROM new_session_assets)
+  ),
+  candidate_pairs AS (
+    SELECT DISTINCT
+      n.session_id,
+      LEAST(n.asset_id, m.asset_id) AS source,
+      GREATEST(n.asset_id, m.asset_id) AS target
+    FROM session_members n
+    JOIN session_members m
+      ON m.session_id = n.session_id
+      AND m.asset_id <> n.asset_id
+    WHERE n.is_new
+  ),
+  endpoints AS (
+    SELECT session_id, source, target, source AS asset_id FROM candidate_pairs
+    UNION ALL
+    SELECT session_id, source, target, target AS asset_id FROM candidate_pairs
+  ),
+  capped_endpoints AS (
+    SELECT session_id, source, target
+    FROM endpoints
+    QUALIFY ROW_NUMBER() OVER (
+      PARTITION BY session_id, asset_id
+      ORDER BY hash(source, target), source, target
+    ) <= max_pairs_per_asset
+  ),
+  capped_pairs AS (
+    SELECT session_id, source, target
+    FROM capped_endpoints
+    GROUP BY 1, 2, 3
+    HAVING COUNT(*) = 2
+  )
   SELECT
-    a.asset_id AS source,
-    b.asset_id AS target,
+    source,
+    target,
     COUNT(*) AS weight,
     'session' AS cooccurrence_type
-  FROM session_assets a
-  JOIN session_assets b 
-    ON a.session_id = b.session_id
-    AND a.asset_id < b.asset_id
+  FROM capped_pairs
   GROUP BY 1, 2;
+
+  -- Upsert summed weights into the co-occurrence graph
+  INSERT INTO item_graph
+  SELECT source, target, weight, cooccurrence_type
+  FROM item_graph_delta
+  ON CONFLICT (source, target, cooccurrence_type)
+  DO UPDATE SET weight = weight + EXCLUDED.weight;
+
+  -- Keep per-source totals in step with the upsert
+  INSERT INTO item_graph_weight_sums
+  SELECT source, SUM(weight)
+  FROM item_graph_delta
+  GROUP BY source
+  ON CONFLICT (source)
+  DO UPDATE SET total_weight = total_weight + EXCLUDED.total_weight;
+
+  INSERT OR IGNORE INTO dirty_graph_sources
+  SELECT DISTINCT source FROM item_graph_delta;
+
+  CALL apply_user_item_edges();
 END;
 
 -- ======================
 -- Graph Maintenance
 -- ======================
 
+-- Refreshes the cached normalised edges of changed sources only. Raw weights
+-- are left untouched, so calling it again without new loads changes nothing.
 CREATE OR REPLACE PROCEDURE normalize_edges() AS
 BEGIN
-  -- Normalize item graph weights
-  UPDATE item_graph
-  SET weight = sub.normalized_weight
-  FROM (
-    SELECT 
-      source,
-      target,
-      weight / SUM(weight) OVER (PARTITION BY source) AS normalized_weight
-    FROM item_graph
-  ) sub
-  WHERE item_graph.source = sub.source
-    AND item_graph.target = sub.target;
-  
-  -- Normalize user-item edges
-  UPDATE user_item_edges
-  SET weight = sub.normalized_weight
-  FROM (
-    SELECT 
-      user_id,
-      asset_id,
-      weight / SUM(weight) OVER (PARTITION BY user_id) AS normalized_weight
-    FROM user_item_edges
-  ) sub
-  WHERE user_item_edges.user_id = sub.user_id
-    AND user_item_edges.asset_id = sub.asset_id;
+  DELETE FROM item_graph_normalized
+  WHERE source IN (SELECT source FROM dirty_graph_sources);
+
+  INSERT INTO item_graph_normalized
+  SELECT source, target, normalized_weight, cooccurrence_type
+  FROM normalized_item_graph
+  WHERE source IN (SELECT source FROM dirty_graph_sources);
+
+  DELETE FROM dirty_graph_sources;
+
+  DELETE FROM user_item_edges_normalized
+  WHERE user_id IN (SELECT user_id FROM dirty_edge_users);
+
+  INSERT INTO user_item_edges_normalized
+  SELECT user_id, asset_id, interaction_type, normalized_weight
+  FROM normalized_user_item_edges
+  WHERE user_id IN (SELECT user_id FROM dirty_edge_users);
+
+  DELETE FROM dirty_edge_users;
 END;
 
 -- ======================
--- PinSageDGL Feature View
+-- PinSageDGL Training Feed
 -- ======================
 
-CREATE OR REPLACE VIEW pinsage_features AS
+-- Negatives for the training feed, written by the shared sampler in
+-- session_recommendation_sampling.py before each read of the feed
+CREATE OR REPLACE TABLE pinsage_negatives (
+  user_id UUID,
+  asset_id UUID
+);
+
+-- Observed user-asset edges plus the sampled negatives, instead of every
+-- user crossed with every asset. Embeddings stay in fixed-size array columns
+-- so the reader can hand them to NumPy without copying; read it with
+-- fetch_record_batch.
+CREATE OR REPLACE VIEW pinsage_training_feed AS
+WITH positives AS (
+  SELECT
+    user_id,
+    asset_id,
+    SUM(normalized_weight) AS target
+  FROM user_item_edges_normalized
+  GROUP BY 1, 2
+),
+negatives AS (
+  SELECT user_id, asset_id, 0.0::DOUBLE AS target
+  FROM pinsage_negatives
+),
+edges AS (
+  SELECT * FROM positives
+  UNION ALL
+  SELECT * FROM negatives
+)
 SELECT
-  u.id AS user_id,
-  a.id AS item_id,
+  e.user_id,
+  e.asset_id AS item_id,
   -- User metadata
-  map(
-    ['godot_version', 'gpu_vendor', 'os_family'],
-    [u.godot_version, u.gpu_vendor, u.os_family]
-  ) AS user_sparse,
-  -- Asset metadata
-  map(
-    ['node_types', 'script_languages', 'shaders'],
-    [a.node_types, a.script_languages, a.shaders]
-  ) AS item_sparse,
-  -- Combined embeddings
+  u.godot_version,
+  u.gpu_vendor,
+  u.os_family,
+  -- Embeddings, kept as fixed-size arrays
+  u.behavior_embedding AS user_embedding,
   array_cat(
-    u.behavior_embedding,
-    array_cat(
-      a.structural_embedding,
-      a.text_embedding
-    )
-  ) AS features,
-  -- Interaction weight
-  COALESCE(ue.weight, 0.0) AS target
-FROM users u
-CROSS JOIN assets a
-LEFT JOIN user_item_edges ue
-  ON u.id = ue.user_id
-  AND a.id = ue.asset_id;
+    a.structural_embedding,
+    a.text_embedding
+  )::FLOAT[448] AS item_embedding,
+  -- Interaction weight, normalised per user; 0 for sampled negatives
+  e.target
+FROM edges e
+JOIN users u ON u.id = e.user_id
+JOIN assets a ON a.id = e.asset_id
+WHERE u.behavior_embedding IS NOT NULL
+  AND a.structural_embedding IS NOT NULL
+  AND a.text_embedding IS NOT NULL;
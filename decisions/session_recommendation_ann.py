@@ -0,0 +1,372 @@
+import argparse
+import json
+import os
+import sys
+import time
+import numpy as np
+
+# Asset embedding columns of session_recommendation_10.sql and their widths
+MODALITIES = {
+    'structural_embedding': 64,
+    'text_embedding': 384,
+    'mesh_embedding': 256,
+    'image_embedding': 512,
+    'audio_embedding': 128
+}
+
+# Catalogues up to this size are searched exactly; past it an IVF index pays off
+EXACT_THRESHOLD = 20000
+QUERY_CHUNK = 256
+
+# ======================
+# VECTOR STORAGE
+# ======================
+# Vectors are L2-normalised on the way in, so cosine similarity is a dot
+# product. Rows live in a capacity-doubling buffer so incremental inserts
+# are amortised O(1); a loaded index stays memory-mapped until its first add.
+
+def normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+class _Rows:
+    def __init__(self, dim, ids=None, vectors=None, labels=None):
+        self.dim = dim
+        self.ids = np.empty(0, dtype=object) if ids is None else np.asarray(ids, dtype=object)
+        self.buffer = np.empty((0, dim), dtype=np.float32) if vectors is None else vectors
+        self.labels = np.full(len(self.ids), None, dtype=object) if labels is None else np.asarray(labels, dtype=object)
+        self.size = len(self.ids)
+        self.row_of = {item: row for row, item in enumerate(self.ids.tolist())}
+
+    @property
+    def vectors(self):
+        return self.buffer[:self.size]
+
+    def append(self, ids, vectors, labels=None):
+        vectors = normalize(vectors)
+        needed = self.size + len(vectors)
+        if needed > len(self.buffer) or not self.buffer.flags.writeable:
+            grown = np.empty((max(needed, 2 * len(self.buffer), 1024), self.dim), dtype=np.float32)
+            grown[:self.size] = self.buffer[:self.size]
+            self.buffer = grown
+        self.buffer[self.size:needed] = vectors
+        start = self.size
+        self.ids = np.concatenate([self.ids, np.asarray(ids, dtype=object)])
+        self.labels = np.concatenate([
+            self.labels, np.full(len(vectors), None, dtype=object) if labels is None else np.asarray(labels, dtype=object)
+        ])
+        self.row_of.update((item, start + n) for n, item in enumerate(ids))
+        self.size = needed
+        return np.arange(start, needed)
+
+    def rows(self, ids):
+        return np.array([self.row_of[item] for item in ids if item in self.row_of], dtype=np.int64)
+
+# ======================
+# FILTERING AND TOP-K
+# ======================
+
+def top_k(scores, k):
+    k = min(k, len(scores))
+    if k == 0:
+        return np.empty(0, dtype=np.int64)
+    top = np.argpartition(-scores, k - 1)[:k]
+    top = top[np.argsort(-scores[top], kind='stable')]
+    return top[np.isfinite(scores[top])]
+
+def _allowed_mask(rows, label, allowed_ids):
+    # Row mask shared by the whole batch; None means every row is allowed
+    mask = None
+    if label is not None:
+        mask = rows.labels[:rows.size] == label
+    if allowed_ids is not None:
+        allowed = np.zeros(rows.size, dtype=bool)
+        allowed[rows.rows(allowed_ids)] = True
+        mask = allowed if mask is None else mask & allowed
+    return mask
+
+def _exclusions(rows, exclude, n_queries):
+    # Per-query id collections to leave out, e.g. items already seen
+    if exclude is None:
+        return [None] * n_queries
+    return [rows.rows(ids) if ids is not None and len(ids) else None for ids in exclude]
+
+# ======================
+# EXACT INDEX
+# ======================
+
+class ExactIndex:
+    kind = 'exact'
+
+    def __init__(self, dim, ids=None, vectors=None, labels=None):
+        self.rows = _Rows(dim, ids, vectors, labels)
+
+    def __len__(self):
+        return self.rows.size
+
+    def add(self, ids, vectors, labels=None):
+        self.rows.append(ids, vectors, labels)
+
+    def search(self, queries, k=10, exclude=None, label=None, allowed_ids=None):
+        queries = normalize(np.atleast_2d(queries))
+        mask = _allowed_mask(self.rows, label, allowed_ids)
+        excluded = _exclusions(self.rows, exclude, len(queries))
+        vectors = self.rows.vectors
+        results = []
+        for start in range(0, len(queries), QUERY_CHUNK):
+            scores = queries[start:start + QUERY_CHUNK] @ vectors.T
+            if mask is not None:
+                scores[:, ~mask] = -np.inf
+            for offset, row_scores in enumerate(scores):
+                drop = excluded[start + offset]
+                if drop is not None:
+                    row_scores[drop] = -np.inf
+                top = top_k(row_scores, k)
+                results.append((self.rows.ids[top], row_scores[top]))
+        return results
+
+    def arrays(self):
+        return {'vectors': self.rows.vectors}
+
+# ======================
+# IVF INDEX
+# ======================
+# Spherical k-means splits the catalogue into nlist cells; a query scores
+# only the rows of its nprobe closest cells. Inverted lists are kept as a
+# CSR layout (order, offsets) rebuilt lazily after inserts.
+
+def spherical_kmeans(vectors, nlist, iterations=15, sample=None, seed=0):
+    rng = np.random.default_rng(seed)
+    sample = sample or 256 * nlist
+    if len(vectors) > sample:
+        vectors = vectors[np.sort(rng.choice(len(vectors), sample, replace=False))]
+    centroids = vectors[rng.choice(len(vectors), nlist, replace=False)].copy()
+    for _ in range(iterations):
+        assignments = assign_cells(vectors, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, vectors)
+        empty = np.bincount(assignments, minlength=nlist) == 0
+        # Empty cells are re-seeded from random rows
+        sums[empty] = vectors[rng.choice(len(vectors), int(empty.sum()))]
+        centroids = normalize(sums)
+    return centroids
+
+def assign_cells(vectors, centroids, chunk=65536):
+    return np.concatenate([
+        np.argmax(vectors[start:start + chunk] @ centroids.T, axis=1)
+        for start in range(0, len(vectors), chunk)
+    ]) if len(vectors) else np.empty(0, dtype=np.int64)
+
+class IVFIndex:
+    kind = 'ivf'
+
+    def __init__(self, dim, centroids, ids=None, vectors=None, labels=None, assignments=None, nprobe=8):
+        self.rows = _Rows(dim, ids, vectors, labels)
+        self.centroids = centroids
+        self.nprobe = nprobe
+        if assignments is None:
+            assignments = assign_cells(self.rows.vectors, centroids)
+        self.assignments = np.asarray(assignments, dtype=np.int64)
+        self.order = None
+        self.offsets = None
+
+    def __len__(self):
+        return self.rows.size
+
+    @classmethod
+    def build(cls, dim, ids, vectors, labels=None, nlist=None, nprobe=8, seed=0):
+        vectors = normalize(vectors)
+        nlist = nlist or max(1, int(np.sqrt(len(vectors))))
+        centroids = spherical_kmeans(vectors, nlist, seed=seed)
+        return cls(dim, centroids, ids, vectors, labels, nprobe=nprobe)
+
+    def add(self, ids, vectors, labels=None):
+        rows = self.rows.append(ids, vectors, labels)
+        self.assignments = np.concatenate([self.assignments, assign_cells(self.rows.vectors[rows], self.centroids)])
+        self.order = None
+
+    def inverted_lists(self):
+        if self.order is None:
+            self.order = np.argsort(self.assignments, kind='stable')
+            counts = np.bincount(self.assignments, minlength=len(self.centroids))
+            self.offsets = np.concatenate([[0], np.cumsum(counts)])
+        return self.order, self.offsets
+
+    def search(self, queries, k=10, exclude=None, label=None, allowed_ids=None, nprobe=None):
+        queries = normalize(np.atleast_2d(queries))
+        nprobe = min(nprobe or self.nprobe, len(self.centroids))
+        mask = _allowed_mask(self.rows, label, allowed_ids)
+        excluded = _exclusions(self.rows, exclude, len(queries))
+        order, offsets = self.inverted_lists()
+        vectors = self.rows.vectors
+
+        cell_scores = queries @ self.centroids.T
+        probes = np.argpartition(-cell_scores, nprobe - 1, axis=1)[:, :nprobe]
+        results = []
+        for query, cells, drop in zip(queries, probes, excluded):
+            candidates = np.concatenate([order[offsets[c]:offsets[c + 1]] for c in cells])
+            if mask is not None:
+                candidates = candidates[mask[candidates]]
+            if drop is not None:
+                candidates = candidates[~np.isin(candidates, drop)]
+            scores = vectors[candidates] @ query
+            top = top_k(scores, k)
+            results.append((self.rows.ids[candidates[top]], scores[top]))
+        return results
+
+    def arrays(self):
+        return {'vectors': self.rows.vectors, 'centroids': self.centroids, 'assignments': self.assignments}
+
+def build_index(dim, ids, vectors, labels=None, exact_threshold=EXACT_THRESHOLD, **options):
+    if len(ids) <= exact_threshold:
+        index = ExactIndex(dim)
+        index.add(ids, vectors, labels)
+        return index
+    return IVFIndex.build(dim, ids, vectors, labels, **options)
+
+# ======================
+# PERSISTENCE
+# ======================
+# One directory per modality, one .npy per array (memory-mapped on load),
+# the same layout as the published serving snapshots.
+
+def save_index(index, path):
+    os.makedirs(path, exist_ok=True)
+    arrays = dict(index.arrays(), ids=index.rows.ids.astype(str), labels=index.rows.labels.astype(str))
+    for name, array in arrays.items():
+        np.save(os.path.join(path, f"{name}.npy"), np.ascontiguousarray(array))
+    meta = {'kind': index.kind, 'dim': index.rows.dim, 'nprobe': getattr(index, 'nprobe', None)}
+    with open(os.path.join(path, 'index.json'), 'w') as f:
+        json.dump(meta, f)
+
+def load_index(path):
+    with open(os.path.join(path, 'index.json')) as f:
+        meta = json.load(f)
+    array = lambda name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode='r')
+    ids = array('ids').astype(object)
+    labels = array('labels').astype(object)
+    labels[labels == 'None'] = None
+    if meta['kind'] == 'exact':
+        return ExactIndex(meta['dim'], ids, array('vectors'), labels)
+    return IVFIndex(
+        meta['dim'], np.array(array('centroids')), ids, array('vectors'), labels,
+        assignments=np.array(array('assignments')), nprobe=meta['nprobe']
+    )
+
+# ======================
+# MULTI-MODAL INDEX
+# ======================
+
+class MultiModalIndex:
+    def __init__(self, indexes=None):
+        self.indexes = dict(indexes or {})
+
+    def __getitem__(self, modality):
+        return self.indexes[modality]
+
+    @classmethod
+    def from_database(cls, conn, modalities=MODALITIES, labels=None, **options):
+        # labels optionally maps asset id -> filter label (e.g. genre)
+        indexes = {}
+        for modality, dim in modalities.items():
+            table = conn.execute(f"""
+                SELECT id::VARCHAR AS id, {modality} AS embedding
+                FROM assets
+                WHERE {modality} IS NOT NULL
+            """).fetch_arrow_table()
+            if not table.num_rows:
+                continue
+            ids = table['id'].to_pylist()
+            vectors = table['embedding'].combine_chunks().flatten().to_numpy().reshape(-1, dim)
+            row_labels = None if labels is None else [labels.get(item) for item in ids]
+            indexes[modality] = build_index(dim, ids, vectors, row_labels, **options)
+        return cls(indexes)
+
+    def add(self, modality, ids, vectors, labels=None):
+        if modality not in self.indexes:
+            self.indexes[modality] = ExactIndex(MODALITIES[modality])
+        self.indexes[modality].add(ids, vectors, labels)
+
+    def search(self, modality, queries, k=10, **filters):
+        return self.indexes[modality].search(queries, k, **filters)
+
+    def save(self, root):
+        for modality, index in self.indexes.items():
+            save_index(index, os.path.join(root, modality))
+
+    @classmethod
+    def load(cls, root):
+        return cls({
+            modality: load_index(os.path.join(root, modality))
+            for modality in MODALITIES
+            if os.path.exists(os.path.join(root, modality, 'index.json'))
+        })
+
+# ======================
+# RECALL VS LATENCY
+# ======================
+
+def benchmark(index, queries, k=10, nprobes=(1, 2, 4, 8, 16, 32)):
+    exact = ExactIndex(index.rows.dim, index.rows.ids, index.rows.vectors)
+    start = time.perf_counter()
+    truth = exact.search(queries, k)
+    exact_ms = (time.perf_counter() - start) * 1000 / len(queries)
+    report = [{'index': 'exact', 'nprobe': None, 'recall': 1.0, 'ms_per_query': exact_ms}]
+    if not isinstance(index, IVFIndex):
+        return report
+    for nprobe in nprobes:
+        if nprobe > len(index.centroids):
+            break
+        start = time.perf_counter()
+        found = index.search(queries, k, nprobe=nprobe)
+        elapsed = (time.perf_counter() - start) * 1000 / len(queries)
+        hits = sum(len(set(got.tolist()) & set(want.tolist())) for (got, _), (want, _) in zip(found, truth))
+        total = sum(len(want) for want, _ in truth)
+        report.append({'index': 'ivf', 'nprobe': nprobe, 'recall': hits / max(total, 1), 'ms_per_query': elapsed})
+    return report
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build per-modality ANN indexes and report recall vs latency")
+    parser.add_argument('--db', default=None, help="DuckDB database with an assets table")
+    parser.add_argument('--synthetic', type=int, default=0, help="Benchmark N random vectors instead")
+    parser.add_argument('--modalities', nargs='+', default=list(MODALITIES))
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--nlist', type=int, default=None)
+    parser.add_argument('--exact-threshold', type=int, default=EXACT_THRESHOLD)
+    parser.add_argument('--save', default=None, help="Directory to persist the indexes to")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    rng = np.random.default_rng(args.seed)
+    options = {'exact_threshold': args.exact_threshold, 'nlist': args.nlist, 'seed': args.seed}
+    modalities = {name: MODALITIES[name] for name in args.modalities}
+    if args.synthetic:
+        index = MultiModalIndex({
+            name: build_index(dim, [str(n) for n in range(args.synthetic)],
+                              rng.standard_normal((args.synthetic, dim), dtype=np.float32), **options)
+            for name, dim in modalities.items()
+        })
+    else:
+        import duckdb
+        conn = duckdb.connect(args.db, read_only=True)
+        try:
+            index = MultiModalIndex.from_database(conn, modalities, **options)
+        finally:
+            conn.close()
+
+    for modality, modality_index in index.indexes.items():
+        vectors = modality_index.rows.vectors
+        queries = vectors[rng.choice(len(vectors), min(args.queries, len(vectors)), replace=False)]
+        queries = queries + rng.normal(0, 0.05, queries.shape).astype(np.float32)
+        for row in benchmark(modality_index, queries, args.k):
+            print(json.dumps(dict(row, modality=modality, items=len(modality_index))))
+
+    if args.save:
+        index.save(args.save)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
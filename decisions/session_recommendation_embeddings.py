@@ -0,0 +1,258 @@
+import argparse
+import hashlib
+import json
+import os
+import re
+import sys
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+import duckdb
+import numpy as np
+import pyarrow as pa
+
+MAX_TEXT_CHARS = 20000
+DEFAULT_MAX_CHARS_PER_BATCH = 200000
+DEFAULT_MAX_BATCH = 64
+READ_CHUNK = 4096
+
+# ======================
+# ENCODERS
+# ======================
+# An encoder turns a list of texts into an (n, dim) float32 matrix. The
+# hashing encoder is local and deterministic (crc32, not Python's salted
+# hash), so it runs anywhere without downloading a model; model-backed
+# encoders plug in through ENCODERS.
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9_]+")
+
+class HashingEncoder:
+    version = 1
+
+    def __init__(self, dim, ngrams=2):
+        self.dim = dim
+        self.ngrams = ngrams
+
+    def features(self, text):
+        tokens = TOKEN_PATTERN.findall(text.lower())
+        grams = list(tokens)
+        for n in range(2, self.ngrams + 1):
+            grams.extend(' '.join(tokens[i:i + n]) for i in range(len(tokens) - n + 1))
+        return grams
+
+    def encode(self, texts):
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            grams = self.features(text)
+            if not grams:
+                continue
+            hashes = np.fromiter((zlib.crc32(g.encode()) for g in grams), dtype=np.uint32, count=len(grams))
+            # Signed feature hashing with sublinear term frequency
+            signs = np.where(hashes & 0x80000000, -1.0, 1.0)
+            np.add.at(vectors[row], hashes % self.dim, signs)
+            np.copyto(vectors[row], np.sign(vectors[row]) * np.log1p(np.abs(vectors[row])))
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+class SentenceTransformerEncoder:
+    version = 1
+
+    def __init__(self, dim, model='sentence-transformers/all-MiniLM-L6-v2'):
+        from sentence_transformers import SentenceTransformer
+        self.dim = dim
+        self.model_name = model
+        self.model = SentenceTransformer(model, device='cpu')
+
+    def encode(self, texts):
+        vectors = self.model.encode(texts, batch_size=len(texts), normalize_embeddings=True)
+        if vectors.shape[1] != self.dim:
+            raise ValueError(f"{self.model_name} produces {vectors.shape[1]} dims, column needs {self.dim}")
+        return vectors.astype(np.float32)
+
+ENCODERS = {
+    'hashing': HashingEncoder,
+    'sentence-transformers': SentenceTransformerEncoder
+}
+
+# Embedding column -> (SQL expression for its input text, width)
+EMBEDDING_INPUTS = {
+    'text_embedding': (
+        "concat_ws(chr(10), display_name, replace(slug, '-', ' '), scene_text)", 384
+    ),
+    'structural_embedding': (
+        "concat_ws(chr(10), node_types::VARCHAR, script_languages::VARCHAR, array_to_string(shaders, ' '))", 64
+    )
+}
+
+# ======================
+# CONTENT HASHING
+# ======================
+
+def encoder_identity(kind, dim, options):
+    # Changing the encoder, its options or its version invalidates every hash
+    return f"{kind}-v{ENCODERS[kind].version}-{dim}-{json.dumps(options, sort_keys=True)}"
+
+def content_hash(encoder_name, text):
+    digest = hashlib.sha256(encoder_name.encode())
+    digest.update(b'\x1f')
+    digest.update(text.encode())
+    return digest.hexdigest()
+
+def changed_rows(conn, column, encoder_name):
+    # Streams (id, text, hash) for assets whose input hash differs from the
+    # one recorded when the column was last computed
+    expression, _ = EMBEDDING_INPUTS[column]
+    reader = conn.execute(f"""
+        SELECT a.id::VARCHAR AS id, COALESCE({expression}, '') AS text, h.content_hash
+        FROM assets a
+        LEFT JOIN asset_embedding_hashes h
+          ON h.asset_id = a.id
+          AND h.embedding_column = $column
+    """, parameters={'column': column}).fetch_record_batch(READ_CHUNK)
+    for batch in reader:
+        data = batch.to_pydict()
+        ids, texts, hashes = [], [], []
+        for item, text, previous in zip(data['id'], data['text'], data['content_hash']):
+            text = text[:MAX_TEXT_CHARS]
+            current = content_hash(encoder_name, text)
+            if current != previous:
+                ids.append(item)
+                texts.append(text)
+                hashes.append(current)
+        yield len(data['id']), ids, texts, hashes
+
+# ======================
+# LENGTH-BUCKETED BATCHING
+# ======================
+# Sorting by length keeps similar-length inputs together, so padded model
+# batches waste little; a batch closes at max_batch inputs or max_chars.
+
+def length_batches(texts, max_chars=DEFAULT_MAX_CHARS_PER_BATCH, max_batch=DEFAULT_MAX_BATCH):
+    order = np.argsort([len(text) for text in texts], kind='stable')
+    batch, size = [], 0
+    for idx in order:
+        length = max(len(texts[idx]), 1)
+        if batch and (len(batch) >= max_batch or size + length > max_chars):
+            yield batch
+            batch, size = [], 0
+        batch.append(int(idx))
+        size += length
+    if batch:
+        yield batch
+
+# ======================
+# PROCESS POOL
+# ======================
+
+_worker_encoder = None
+
+def _init_worker(encoder_kind, dim, options):
+    global _worker_encoder
+    _worker_encoder = ENCODERS[encoder_kind](dim, **options)
+
+def _encode_batch(indices, texts):
+    return indices, _worker_encoder.encode(texts)
+
+def encode_all(texts, pool, max_chars, max_batch):
+    vectors = None
+    futures = [
+        pool.submit(_encode_batch, batch, [texts[idx] for idx in batch])
+        for batch in length_batches(texts, max_chars, max_batch)
+    ]
+    for future in futures:
+        indices, encoded = future.result()
+        if vectors is None:
+            vectors = np.empty((len(texts), encoded.shape[1]), dtype=np.float32)
+        vectors[indices] = encoded
+    return vectors
+
+# ======================
+# ARROW WRITE-BACK
+# ======================
+
+def write_embeddings(conn, column, ids, vectors, hashes):
+    dim = vectors.shape[1]
+    updates = pa.table({
+        'id': pa.array(ids),
+        'embedding': pa.FixedSizeListArray.from_arrays(pa.array(vectors.ravel(), type=pa.float32()), dim),
+        'content_hash': pa.array(hashes)
+    })
+    conn.register('embedding_updates', updates)
+    try:
+        conn.execute("BEGIN TRANSACTION")
+        conn.execute(f"""
+            UPDATE assets
+            SET {column} = u.embedding::FLOAT[{dim}]
+            FROM embedding_updates u
+            WHERE assets.id = u.id::UUID
+        """)
+        conn.execute("""
+            INSERT INTO asset_embedding_hashes
+            SELECT id::UUID, $column, content_hash, CURRENT_TIMESTAMP
+            FROM embedding_updates
+            ON CONFLICT (asset_id, embedding_column)
+            DO UPDATE SET content_hash = EXCLUDED.content_hash, computed_at = EXCLUDED.computed_at
+        """, parameters={'column': column})
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    finally:
+        conn.unregister('embedding_updates')
+
+# ======================
+# PIPELINE
+# ======================
+
+def run_pipeline(db_path, columns=tuple(EMBEDDING_INPUTS), encoder='hashing', encoder_options=None,
+                 processes=None, max_chars=DEFAULT_MAX_CHARS_PER_BATCH, max_batch=DEFAULT_MAX_BATCH):
+    conn = duckdb.connect(db_path)
+    report = {}
+    try:
+        for column in columns:
+            _, dim = EMBEDDING_INPUTS[column]
+            name = encoder_identity(encoder, dim, encoder_options or {})
+            stats = {'scanned': 0, 'encoded': 0, 'seconds': 0.0}
+            start = time.perf_counter()
+            reader = conn.cursor()
+            with ProcessPoolExecutor(
+                processes or os.cpu_count(),
+                initializer=_init_worker,
+                initargs=(encoder, dim, encoder_options or {})
+            ) as pool:
+                for scanned, ids, texts, hashes in changed_rows(reader, column, name):
+                    stats['scanned'] += scanned
+                    if not ids:
+                        continue
+                    vectors = encode_all(texts, pool, max_chars, max_batch)
+                    write_embeddings(conn, column, ids, vectors, hashes)
+                    stats['encoded'] += len(ids)
+            reader.close()
+            stats['skipped'] = stats['scanned'] - stats['encoded']
+            stats['seconds'] = time.perf_counter() - start
+            report[column] = stats
+    finally:
+        conn.close()
+    return report
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compute asset embedding columns, skipping unchanged assets")
+    parser.add_argument('--db', required=True)
+    parser.add_argument('--columns', nargs='+', default=list(EMBEDDING_INPUTS))
+    parser.add_argument('--encoder', choices=sorted(ENCODERS), default='hashing')
+    parser.add_argument('--encoder-options', default='{}', help="JSON keyword arguments for the encoder")
+    parser.add_argument('--processes', type=int, default=None)
+    parser.add_argument('--max-chars', type=int, default=DEFAULT_MAX_CHARS_PER_BATCH)
+    parser.add_argument('--max-batch', type=int, default=DEFAULT_MAX_BATCH)
+    args = parser.parse_args(argv)
+
+    report = run_pipeline(
+        args.db, args.columns, args.encoder, json.loads(args.encoder_options),
+        args.processes, args.max_chars, args.max_batch
+    )
+    print(json.dumps(report, indent=2))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
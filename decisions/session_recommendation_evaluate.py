@@ -0,0 +1,348 @@
+import argparse
+import datetime
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+import duckdb
+import numpy as np
+from session_recommendation_ann import build_index
+from session_recommendation_sequences import CONTEXT_WINDOWS, MIN_SESSION_ITEMS, iter_pair_batches
+
+CUTOFFS = (5, 10, 20)
+EVAL_BATCH = 512
+MAX_CONTEXT = CONTEXT_WINDOWS[-1]
+
+# ======================
+# PROTOCOL
+# ======================
+# session_recommendation_01.md: sessions with fewer than three items are
+# dropped; at every position the last item seen is the query and the next
+# item is the ground truth. Pairs come from the sequence exporter over the
+# held-out sessions, each with up to MAX_CONTEXT items of history, and a
+# recommender returns k item ids per history.
+
+def heldout_source(table='session_items', since=None, fraction=None):
+    # Held-out sessions: those starting at or after `since`, or a stable
+    # hash-selected fraction of all sessions
+    if since is not None:
+        return f"""(
+            SELECT * FROM {table}
+            WHERE session_id IN (
+              SELECT session_id FROM {table}
+              GROUP BY session_id
+              HAVING MIN(timestamp) >= TIMESTAMP '{since.isoformat(sep=' ')}'
+            )
+        )"""
+    if fraction is not None:
+        return f"(SELECT * FROM {table} WHERE hash(session_id) % 10000 < {int(fraction * 10000)})"
+    return table
+
+def rank_metrics(recommended, truth, cutoffs=CUTOFFS):
+    # recommended: (n, k) object array of item ids (None padded); truth: (n,)
+    hits = recommended == truth[:, None]
+    ranks = np.where(hits.any(axis=1), hits.argmax(axis=1), recommended.shape[1])
+    metrics = {}
+    for cutoff in cutoffs:
+        found = ranks < cutoff
+        metrics[f"recall@{cutoff}"] = found.astype(np.float64)
+        metrics[f"mrr@{cutoff}"] = np.where(found, 1.0 / (ranks + 1), 0.0)
+    return metrics
+
+def _padded(recommendations, k):
+    table = np.full((len(recommendations), k), None, dtype=object)
+    for row, items in enumerate(recommendations):
+        items = list(items)[:k]
+        table[row, :len(items)] = items
+    return table
+
+# ======================
+# ADAPTERS
+# ======================
+# An adapter answers recommend(histories, k) -> one list of item ids per
+# history (oldest item first) for a whole batch. Adapters are built inside
+# each worker process from a (kind, options) spec, so only paths cross
+# process boundaries.
+
+class EmbeddingAdapter:
+    # Item-to-item: nearest neighbours of the query item's embedding
+    def __init__(self, item_ids, vectors):
+        self.index = build_index(vectors.shape[1], list(item_ids), vectors)
+        self.row_of = {item: row for row, item in enumerate(item_ids)}
+        self.vectors = vectors
+
+    def recommend(self, histories, k):
+        results = [[] for _ in histories]
+        known = [n for n, history in enumerate(histories) if history[-1] in self.row_of]
+        if not known:
+            return results
+        queries = self.vectors[[self.row_of[histories[n][-1]] for n in known]]
+        found = self.index.search(queries, k, exclude=[histories[n] for n in known])
+        for n, (ids, _) in zip(known, found):
+            results[n] = ids.tolist()
+        return results
+
+def pinsage_adapter(data_path, model_path, model_name='pinsage'):
+    from libreco.algorithms import PinSage
+    from libreco.data import DataInfo
+
+    data_info = DataInfo.load(data_path, model_name=model_name)
+    model = PinSage.load(model_path, model_name=model_name, data_info=data_info, manual=True)
+    vectors = np.asarray(model.item_embeds_np[:data_info.n_items], dtype=np.float32)
+    item_ids = [str(data_info.id2item[code]) for code in range(data_info.n_items)]
+    return EmbeddingAdapter(item_ids, vectors)
+
+def embeddings_adapter(path):
+    # .npz with item_ids and vectors
+    with np.load(path) as arrays:
+        return EmbeddingAdapter([str(item) for item in arrays['item_ids']], arrays['vectors'].astype(np.float32))
+
+class GraphAdapter:
+    # Co-occurrence: heaviest item_graph neighbours of the query item, or
+    # random walks from the whole context when walks=True
+    def __init__(self, graph, walks=False, seed=0):
+        self.graph = graph
+        self.walks = walks
+        self.seed = seed
+
+    def recommend(self, histories, k):
+        if self.walks:
+            ranked = self.graph.recommend_batch(histories, k, seed=self.seed)
+            return [[item for item, _ in ranking] for ranking in ranked]
+        if not len(self.graph.indices):
+            return [[] for _ in histories]
+        # The first k + len(history) edges of each query item cover k unseen
+        # neighbours; rows are sliced and filtered for the whole batch at once
+        codes = np.array([self.graph.item_index.get(history[-1], -1) for history in histories], dtype=np.int64)
+        width = k + max(len(history) for history in histories)
+        starts = np.where(codes >= 0, self.graph.indptr[np.maximum(codes, 0)], 0)
+        ends = np.where(codes >= 0, self.graph.indptr[np.maximum(codes, 0) + 1], 0)
+        positions = starts[:, None] + np.arange(width)
+        valid = positions < ends[:, None]
+        targets = self.graph.indices[np.minimum(positions, len(self.graph.indices) - 1)]
+        seen = np.full((len(histories), width - k), -1, dtype=np.int64)
+        for row, history in enumerate(histories):
+            seen[row, :len(history)] = [self.graph.item_index.get(item, -1) for item in history]
+        valid &= ~(targets[:, :, None] == seen[:, None, :]).any(axis=2)
+        return [[self.graph.item_ids[t] for t in row[keep][:k]] for row, keep in zip(targets, valid)]
+
+def graph_adapter(path, walks=False, seed=0):
+    from session_recommendation_graph import CSRGraph
+    return GraphAdapter(CSRGraph.load(path), walks, seed)
+
+class HybridAdapter:
+    def __init__(self, scorer):
+        self.scorer = scorer
+
+    def recommend(self, histories, k):
+        return [[item for item, _ in ranking] for ranking in self.scorer.recommend_batch(histories, k)]
+
+def hybrid_adapter(db_path, graph_path=None, ann_candidates=None):
+    from session_recommendation_ann import MultiModalIndex
+    from session_recommendation_graph import CSRGraph
+    from session_recommendation_hybrid import ANN_CANDIDATES, MODALITY_WEIGHTS, HybridSessionScorer
+    from session_recommendation_live import ItemVectors
+
+    conn = duckdb.connect(db_path, read_only=True)
+    try:
+        items = ItemVectors.from_database(conn, tuple(MODALITY_WEIGHTS))
+        index = MultiModalIndex.from_database(conn, {modality: items.layout[modality] for modality in MODALITY_WEIGHTS})
+        graph = CSRGraph.load(graph_path) if graph_path else CSRGraph.from_database(conn, items.item_ids)
+    finally:
+        conn.close()
+    return HybridAdapter(HybridSessionScorer(items, index, graph, ann_candidates=ann_candidates or ANN_CANDIDATES))
+
+class TransformerAdapter:
+    # Histories of one session are mostly prefixes of each other, so each
+    # longest history is encoded once and every shorter one that is its
+    # prefix reads its query from that pass
+    def __init__(self, model):
+        from session_recommendation_transformer import TiedEmbeddingIndex
+        self.model = model
+        self.index = TiedEmbeddingIndex(model.item_ids, model.w['item_embeddings'])
+
+    def queries(self, histories):
+        sequences = {}
+        for n, history in enumerate(histories):
+            codes = [self.model.item_index[item] for item in history if item in self.model.item_index]
+            if codes:
+                sequences.setdefault(tuple(codes[-self.model.max_length:]), []).append(n)
+        queries = {}
+        for sequence in sorted(sequences, key=len, reverse=True):
+            if sequence in queries:
+                continue
+            outputs, _ = self.model.encode(sequence, every_position=True)
+            for length in range(1, len(sequence) + 1):
+                prefix = sequence[:length]
+                if prefix in sequences and prefix not in queries:
+                    queries[prefix] = outputs[length - 1]
+        rows = {n: queries[sequence] for sequence, members in sequences.items() for n in members}
+        return sorted(rows), rows
+
+    def recommend(self, histories, k):
+        results = [[] for _ in histories]
+        known, rows = self.queries(histories)
+        if not known:
+            return results
+        found = self.index.search(np.stack([rows[n] for n in known]), k, exclude=[histories[n] for n in known])
+        for n, (ids, _) in zip(known, found):
+            results[n] = ids.tolist()
+        return results
+
+def transformer_adapter(weights):
+    from session_recommendation_transformer import SessionTransformer
+    return TransformerAdapter(SessionTransformer.load(weights))
+
+ADAPTERS = {
+    'pinsage': pinsage_adapter,
+    'embeddings': embeddings_adapter,
+    'graph': graph_adapter,
+    'hybrid': hybrid_adapter,
+    'transformer': transformer_adapter
+}
+
+# ======================
+# PROCESS POOL
+# ======================
+
+_worker_adapter = None
+
+def _init_worker(kind, options):
+    global _worker_adapter
+    _worker_adapter = ADAPTERS[kind](**options)
+
+def _evaluate_batch(histories, truth, k, cutoffs):
+    start = time.perf_counter()
+    recommended = _padded(_worker_adapter.recommend(histories, k), k)
+    seconds = time.perf_counter() - start
+    metrics = rank_metrics(recommended, np.asarray(truth, dtype=object), cutoffs)
+    return {name: float(values.sum()) for name, values in metrics.items()}, len(histories), seconds
+
+def _batches(conn, source, context, batch_size):
+    for batch in iter_pair_batches(conn, source, context, MIN_SESSION_ITEMS, batch_size):
+        data = batch.select(['history', 'next_item']).to_pydict()
+        histories = [[str(item) for item in history] for history in data['history']]
+        yield histories, [str(item) for item in data['next_item']]
+
+def evaluate(db_path, kind, options, source='session_items', context=MAX_CONTEXT, cutoffs=CUTOFFS,
+             processes=None, batch_size=EVAL_BATCH, limit=None):
+    k = max(cutoffs)
+    processes = processes or os.cpu_count()
+    totals = {}
+    latencies = []
+    pairs = 0
+    start = time.perf_counter()
+    conn = duckdb.connect(db_path, read_only=True)
+    try:
+        with ProcessPoolExecutor(processes, initializer=_init_worker, initargs=(kind, options)) as pool:
+            pending = []
+            for histories, truth in _batches(conn, source, context, batch_size):
+                if limit is not None:
+                    if pairs >= limit:
+                        break
+                    histories, truth = histories[:limit - pairs], truth[:limit - pairs]
+                pairs += len(truth)
+                pending.append(pool.submit(_evaluate_batch, histories, truth, k, cutoffs))
+                # Keep a bounded number of batches in flight
+                if len(pending) >= 2 * processes:
+                    _collect(pending.pop(0), totals, latencies)
+            for future in pending:
+                _collect(future, totals, latencies)
+    finally:
+        conn.close()
+
+    # Adapters answer a whole batch in one call, so latency is measured per
+    # batch; the per-query figure is batch time amortised over its queries
+    batch_ms = np.asarray([ms for ms, _ in latencies])
+    queries = sum(count for _, count in latencies)
+    return {
+        'adapter': kind,
+        'options': options,
+        'source': source,
+        'context': context,
+        'pairs': pairs,
+        'metrics': {name: value / max(pairs, 1) for name, value in sorted(totals.items())},
+        'batch_size': batch_size,
+        'batch_latency_ms': {
+            'mean': float(batch_ms.mean()) if len(batch_ms) else None,
+            'p50': float(np.percentile(batch_ms, 50)) if len(batch_ms) else None,
+            'p95': float(np.percentile(batch_ms, 95)) if len(batch_ms) else None
+        },
+        'amortized_ms_per_query': float(batch_ms.sum() / queries) if queries else None,
+        'seconds': time.perf_counter() - start,
+        'evaluated_at': datetime.datetime.now().isoformat()
+    }
+
+def _collect(future, totals, latencies):
+    sums, count, seconds = future.result()
+    for name, value in sums.items():
+        totals[name] = totals.get(name, 0.0) + value
+    latencies.append((seconds * 1000, count))
+
+# ======================
+# RESULTS
+# ======================
+
+def write_result(result, directory, name=None):
+    os.makedirs(directory, exist_ok=True)
+    name = name or f"{result['adapter']}-{datetime.datetime.now():%Y%m%dT%H%M%S}"
+    path = os.path.join(directory, f"{name}.json")
+    with open(path, 'w') as f:
+        json.dump(dict(result, name=name), f, indent=2)
+    return path
+
+def compare(directory):
+    runs = []
+    for entry in sorted(os.listdir(directory)):
+        if entry.endswith('.json'):
+            with open(os.path.join(directory, entry)) as f:
+                runs.append(json.load(f))
+    return [
+        dict({'name': run['name'], 'pairs': run['pairs'], 'ms_per_query': run['amortized_ms_per_query']}, **run['metrics'])
+        for run in sorted(runs, key=lambda run: run['evaluated_at'])
+    ]
+
+# ======================
+# MAIN EXECUTION
+# ======================
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Recall@K / MRR@K evaluation of session recommenders")
+    parser.add_argument('--results', default='evaluation_results')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run = commands.add_parser('run', help="Evaluate one recommender on held-out sessions")
+    run.add_argument('--db', required=True)
+    run.add_argument('--adapter', choices=sorted(ADAPTERS), required=True)
+    run.add_argument('--options', default='{}', help="JSON keyword arguments for the adapter")
+    run.add_argument('--since', default=None, help="Held-out sessions start at or after this ISO timestamp")
+    run.add_argument('--fraction', type=float, default=None, help="Or: hash-selected fraction of sessions")
+    run.add_argument('--context', type=int, default=MAX_CONTEXT)
+    run.add_argument('--cutoffs', type=int, nargs='+', default=list(CUTOFFS))
+    run.add_argument('--processes', type=int, default=None)
+    run.add_argument('--batch-size', type=int, default=EVAL_BATCH)
+    run.add_argument('--limit', type=int, default=None)
+    run.add_argument('--name', default=None)
+
+    commands.add_parser('compare', help="Print stored results side by side")
+
+    args = parser.parse_args(argv)
+    if args.command == 'compare':
+        for row in compare(args.results):
+            print(json.dumps(row))
+        return 0
+
+    since = datetime.datetime.fromisoformat(args.since) if args.since else None
+    result = evaluate(
+        args.db, args.adapter, json.loads(args.options),
+        source=heldout_source(since=since, fraction=args.fraction),
+        context=args.context, cutoffs=tuple(args.cutoffs), processes=args.processes,
+        batch_size=args.batch_size, limit=args.limit
+    )
+    print(json.dumps(result, indent=2))
+    print(write_result(result, args.results, args.name))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,175 @@
+import argparse
+import datetime
+import json
+import os
+import shutil
+import sys
+import time
+import uuid
+import duckdb
+
+# ======================
+# POINT-IN-TIME FEATURE SNAPSHOTS
+# ======================
+# Materialises training_features (session_recommendation_10.sql) as of a
+# timestamp into immutable Parquet files:
+#
+#   <root>/<snapshot id>/part-*.parquet   rows added by this snapshot
+#   <root>/<snapshot id>/manifest.json    as_of, parent and every file it reads
+#
+# A row belongs to every snapshot at or after the later of its session's
+# start_time and its session_assets.added_at (rows loaded before added_at
+# existed count from the session start). A child snapshot lists its parent's
+# files by reference and adds only rows that became visible in
+# (parent.as_of, as_of], so assets added to sessions that started earlier
+# are picked up. Rows store start_time; hours_since_use is derived at read
+# time against the snapshot's as_of, so inherited files stay valid and two
+# reads of one snapshot are identical.
+
+SNAPSHOT_FILE_SIZE = '256MB'
+
+FEATURE_QUERY = """
+    SELECT
+      u.id AS user_id,
+      a.id AS asset_id,
+      -- User features
+      u.godot_version,
+      u.gpu_vendor,
+      u.os_family,
+      -- Asset features
+      a.node_types,
+      a.script_languages,
+      a.shaders,
+      -- Combined embeddings
+      u.behavior_embedding AS user_embedding,
+      array_cat(
+        a.structural_embedding,
+        a.text_embedding
+      ) AS asset_embedding,
+      -- Interaction context
+      sa.usage_count,
+      s.id AS session_id,
+      s.start_time,
+      sa.added_at
+    FROM users u
+    JOIN sessions s ON u.id = s.user_id
+    JOIN session_assets sa ON s.id = sa.session_id
+    JOIN assets a ON sa.asset_id = a.id
+    WHERE {window}
+"""
+
+class FeatureSnapshots:
+    def __init__(self, root):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def manifest(self, snapshot_id):
+        with open(os.path.join(self.root, snapshot_id, 'manifest.json')) as f:
+            return json.load(f)
+
+    def list(self):
+        manifests = [
+            self.manifest(entry) for entry in os.listdir(self.root)
+            if not entry.startswith('.') and os.path.exists(os.path.join(self.root, entry, 'manifest.json'))
+        ]
+        return sorted(manifests, key=lambda manifest: (manifest['as_of'], manifest['created_at']))
+
+    def latest(self):
+        snapshots = self.list()
+        return snapshots[-1] if snapshots else None
+
+    def create(self, conn, as_of=None, parent=None, full=False):
+        # Builds on the latest snapshot unless told otherwise (or full=True)
+        as_of = as_of or datetime.datetime.now()
+        parent_manifest = None
+        if not full:
+            parent_manifest = self.manifest(parent) if parent else self.latest()
+        since = None
+        if parent_manifest is not None:
+            since = datetime.datetime.fromisoformat(parent_manifest['as_of'])
+            if as_of <= since:
+                raise ValueError(f"as_of {as_of} is not after parent {parent_manifest['id']} ({since})")
+
+        # Sub-second as_of plus a random suffix: snapshots built in the same
+        # second, or several full builds at one as_of, never share an id
+        snapshot_id = f"fs-{as_of:%Y%m%dT%H%M%S%f}-{uuid.uuid4().hex[:8]}"
+        staging = os.path.join(self.root, f".{snapshot_id}.tmp")
+        shutil.rmtree(staging, ignore_errors=True)
+        visible = "GREATEST(s.start_time, COALESCE(sa.added_at, s.start_time))"
+        window = f"{visible} <= TIMESTAMP '{as_of.isoformat(sep=' ')}'"
+        if since is not None:
+            window += f" AND {visible} > TIMESTAMP '{since.isoformat(sep=' ')}'"
+        start = time.perf_counter()
+        conn.execute(f"""
+            COPY ({FEATURE_QUERY.format(window=window)}) TO '{staging}'
+            (FORMAT PARQUET, FILE_SIZE_BYTES '{SNAPSHOT_FILE_SIZE}', FILENAME_PATTERN 'part-{{i}}')
+        """)
+        os.makedirs(staging, exist_ok=True)
+        own_files = sorted(os.path.join(snapshot_id, name) for name in os.listdir(staging) if name.endswith('.parquet'))
+        rows = conn.execute(
+            "SELECT COUNT(*) FROM read_parquet($paths)",
+            parameters={'paths': [os.path.join(staging, os.path.basename(name)) for name in own_files]}
+        ).fetchone()[0] if own_files else 0
+
+        manifest = {
+            'id': snapshot_id,
+            'as_of': as_of.isoformat(),
+            'parent': parent_manifest['id'] if parent_manifest else None,
+            'files': (parent_manifest['files'] if parent_manifest else []) + own_files,
+            'rows': (parent_manifest['rows'] if parent_manifest else 0) + rows,
+            'added_rows': rows,
+            'build_seconds': time.perf_counter() - start,
+            'created_at': datetime.datetime.now().isoformat()
+        }
+        with open(os.path.join(staging, 'manifest.json'), 'w') as f:
+            json.dump(manifest, f, indent=2)
+        os.rename(staging, os.path.join(self.root, snapshot_id))
+        return manifest
+
+    def relation(self, snapshot_id):
+        # SQL table expression for a snapshot, with hours_since_use as of its as_of
+        manifest = self.manifest(snapshot_id)
+        if not manifest['files']:
+            raise ValueError(f"Snapshot {snapshot_id} has no rows")
+        listing = ', '.join(f"'{os.path.join(self.root, name)}'" for name in manifest['files'])
+        return f"""(
+            SELECT *, DATE_DIFF('hour', start_time, TIMESTAMP '{manifest['as_of']}') AS hours_since_use
+            FROM read_parquet([{listing}])
+        )"""
+
+    def open(self, conn, snapshot_id, view='training_features_snapshot'):
+        # Training jobs read the snapshot through this view; nothing is recomputed
+        conn.execute(f"CREATE OR REPLACE TEMP VIEW {view} AS SELECT * FROM {self.relation(snapshot_id)}")
+        return view
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Versioned point-in-time training feature snapshots")
+    parser.add_argument('--root', default='feature_snapshots')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    create = commands.add_parser('create', help="Materialise training_features as of a timestamp")
+    create.add_argument('--db', required=True)
+    create.add_argument('--as-of', default=None, help="ISO timestamp; defaults to now")
+    create.add_argument('--parent', default=None, help="Snapshot to extend; defaults to the latest")
+    create.add_argument('--full', action='store_true', help="Build from scratch")
+
+    commands.add_parser('list', help="List snapshots")
+
+    args = parser.parse_args(argv)
+    snapshots = FeatureSnapshots(args.root)
+    if args.command == 'list':
+        for manifest in snapshots.list():
+            print(json.dumps({key: manifest[key] for key in ('id', 'as_of', 'parent', 'rows', 'added_rows')}))
+        return 0
+
+    conn = duckdb.connect(args.db, read_only=True)
+    try:
+        as_of = datetime.datetime.fromisoformat(args.as_of) if args.as_of else None
+        manifest = snapshots.create(conn, as_of=as_of, parent=args.parent, full=args.full)
+    finally:
+        conn.close()
+    print(json.dumps({key: manifest[key] for key in ('id', 'as_of', 'parent', 'rows', 'added_rows', 'build_seconds')}))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
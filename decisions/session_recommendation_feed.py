@@ -0,0 +1,70 @@
+import numpy as np
+import pandas as pd
+from session_recommendation_sampling import NegativeSampler, dense_codes
+
+USER_EMBEDDING_DIM = 256
+ITEM_EMBEDDING_DIM = 448
+
+# ======================
+# STREAMING TRAINING FEED
+# ======================
+# Reads the pinsage_training_feed view as Arrow record batches, so memory is
+# bounded by the batch size rather than users x assets. Embedding columns are
+# FLOAT[n] arrays: their flattened values are one contiguous float32 buffer,
+# which NumPy views in place.
+
+FEED_QUERY = """
+    SELECT user_id::VARCHAR AS user_id, item_id::VARCHAR AS item_id,
+           user_embedding, item_embedding, target
+    FROM pinsage_training_feed
+"""
+
+def write_negatives(conn, negatives_per_edge=4, alpha=0.75, seed=0, processes=None):
+    # Negatives come from the shared alias-table sampler: popularity^alpha
+    # over every asset, excluding each user's own edges
+    edges = conn.execute("""
+        SELECT DISTINCT user_id::VARCHAR AS user_id, asset_id::VARCHAR AS asset_id
+        FROM user_item_edges
+    """).fetchnumpy()
+    assets = conn.execute("SELECT id::VARCHAR AS id FROM assets ORDER BY 1").fetchnumpy()['id']
+    # Edges to assets no longer in the catalogue cannot be coded; they are
+    # dropped rather than mapped onto a neighbouring asset
+    positions = np.minimum(np.searchsorted(assets, edges['asset_id']), max(len(assets) - 1, 0))
+    known = assets[positions] == edges['asset_id'] if len(assets) else np.zeros(len(positions), dtype=bool)
+    users, user_codes = dense_codes(edges['user_id'][known])
+    item_codes = positions[known]
+
+    sampler = NegativeSampler(user_codes, item_codes, len(assets), alpha=alpha)
+    groups, items = sampler.sample_parallel(user_codes, negatives_per_edge, seed=seed, processes=processes)
+    negatives = pd.DataFrame({'user_id': users[groups], 'asset_id': assets[items]})
+
+    conn.execute("DELETE FROM pinsage_negatives")
+    conn.register('sampled_negatives', negatives)
+    conn.execute("""
+        INSERT INTO pinsage_negatives
+        SELECT user_id::UUID, asset_id::UUID FROM sampled_negatives
+    """)
+    conn.unregister('sampled_negatives')
+    return len(negatives)
+
+def embedding_matrix(column, dim):
+    # flatten() honours the batch's slice offset; the result is a view
+    values = column.flatten().to_numpy(zero_copy_only=True)
+    return values.reshape(len(column), dim)
+
+def iter_training_batches(conn, batch_size=65536, negatives_per_edge=4, alpha=0.75, seed=0):
+    write_negatives(conn, negatives_per_edge, alpha=alpha, seed=seed)
+    reader = conn.execute(FEED_QUERY).fetch_record_batch(batch_size)
+    for batch in reader:
+        columns = dict(zip(batch.schema.names, batch.columns))
+        yield {
+            'user_id': columns['user_id'].to_numpy(zero_copy_only=False),
+            'item_id': columns['item_id'].to_numpy(zero_copy_only=False),
+            'user_embedding': embedding_matrix(columns['user_embedding'], USER_EMBEDDING_DIM),
+            'item_embedding': embedding_matrix(columns['item_embedding'], ITEM_EMBEDDING_DIM),
+            'target': columns['target'].to_numpy(zero_copy_only=True)
+        }
+
+def batch_features(batch):
+    # The one per-batch copy: user and item embeddings side by side
+    return np.hstack([batch['user_embedding'], batch['item_embedding']])
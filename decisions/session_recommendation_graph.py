@@ -0,0 +1,250 @@
+import argparse
+import json
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+
+# recommend.py's termination_prob and sample_walk_len become the restart
+# probability and walk length; rankings come from visit counts, so each
+# query item gets far more walks than PinSage's num_walks=10
+TOP_K_NEIGHBOURS = 50
+RESTART_PROB = 0.5
+NUM_WALKS = 1000
+WALK_LENGTH = 5
+CSR_ARRAYS = ('indptr', 'indices', 'weights', 'cumulative')
+
+# ======================
+# CSR ITEM GRAPH
+# ======================
+# item_graph stores each co-occurring pair once (source < target). The CSR
+# layout holds both directions, with each node's edges pruned to its top_k
+# heaviest and sorted by weight:
+#
+#   indptr[n]:indptr[n + 1]   edge range of node n
+#   indices / weights         neighbour codes and summed weights
+#   cumulative                running weight total over all edges, so a
+#                             weighted neighbour of n is one searchsorted
+#
+# Node codes follow the item_ids passed in (the serving matrix order), so
+# graph codes and embedding rows line up. Saved arrays are memory-mapped
+# on load.
+
+class CSRGraph:
+    def __init__(self, item_ids, indptr, indices, weights, cumulative=None):
+        self.item_ids = [str(item) for item in item_ids]
+        self.item_index = {item: code for code, item in enumerate(self.item_ids)}
+        self.indptr = indptr
+        self.indices = indices
+        self.weights = weights
+        self.cumulative = np.cumsum(weights, dtype=np.float64) if cumulative is None else cumulative
+
+    def __len__(self):
+        return len(self.indptr) - 1
+
+    @property
+    def degrees(self):
+        return np.diff(self.indptr)
+
+    def neighbours(self, codes):
+        # Concatenated (targets, weights) of the given nodes
+        codes = np.asarray(codes, dtype=np.int64)
+        codes = codes[(codes >= 0) & (codes < len(self))]
+        if not len(codes):
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        starts, ends = self.indptr[codes], self.indptr[codes + 1]
+        lengths = ends - starts
+        positions = np.repeat(starts - np.concatenate([[0], np.cumsum(lengths)[:-1]]), lengths) + np.arange(lengths.sum())
+        return self.indices[positions].astype(np.int64), self.weights[positions]
+
+    # ======================
+    # EXPORT AND PERSISTENCE
+    # ======================
+
+    @classmethod
+    def from_database(cls, conn, item_ids, table='item_graph', top_k=TOP_K_NEIGHBOURS):
+        nodes = pd.DataFrame({'id': [str(item) for item in item_ids], 'code': np.arange(len(item_ids))})
+        conn.register('graph_nodes', nodes)
+        try:
+            edges = conn.execute(f"""
+                WITH both_ways AS (
+                  SELECT source, target, weight FROM {table}
+                  UNION ALL
+                  SELECT target, source, weight FROM {table}
+                ),
+                summed AS (
+                  SELECT s.code AS source, t.code AS target, SUM(g.weight)::FLOAT AS weight
+                  FROM both_ways g
+                  JOIN graph_nodes s ON s.id = g.source::VARCHAR
+                  JOIN graph_nodes t ON t.id = g.target::VARCHAR
+                  GROUP BY 1, 2
+                )
+                SELECT source, target, weight
+                FROM summed
+                QUALIFY ROW_NUMBER() OVER (PARTITION BY source ORDER BY weight DESC, target) <= $top_k
+                ORDER BY source, weight DESC, target
+            """, parameters={'top_k': top_k}).fetchnumpy()
+        finally:
+            conn.unregister('graph_nodes')
+        sources = np.asarray(edges['source'], dtype=np.int64)
+        counts = np.bincount(sources, minlength=len(item_ids))
+        indptr = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+        return cls(item_ids, indptr, np.asarray(edges['target'], dtype=np.int32),
+                   np.asarray(edges['weight'], dtype=np.float32))
+
+    def save(self, path):
+        os.makedirs(path, exist_ok=True)
+        for name in CSR_ARRAYS:
+            np.save(os.path.join(path, f"{name}.npy"), np.ascontiguousarray(getattr(self, name)))
+        np.save(os.path.join(path, 'item_ids.npy'), np.asarray(self.item_ids, dtype=str))
+        with open(os.path.join(path, 'graph.json'), 'w') as f:
+            json.dump({'nodes': len(self), 'edges': int(self.indptr[-1])}, f)
+
+    @classmethod
+    def load(cls, path):
+        arrays = {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode='r') for name in CSR_ARRAYS}
+        item_ids = np.load(os.path.join(path, 'item_ids.npy')).tolist()
+        return cls(item_ids, **arrays)
+
+    # ======================
+    # RANDOM WALK WITH RESTART
+    # ======================
+    # Pixie-style retrieval: every walker starts at a query node, steps to a
+    # weighted random neighbour and jumps back to its query with probability
+    # `restart` (or at a dead end). All walkers, across every query set of a
+    # batch, advance together, one vectorised step at a time. Query nodes of
+    # a set share its step budget in proportion to degree * (C - log
+    # degree), so hubs do not dominate, and per-query visit counts are
+    # boosted as (sum_q sqrt(visits_q))^2, which favours nodes reached from
+    # several queries.
+
+    def step(self, current, rng):
+        # Walkers at nodes without edges stay put and report moved=False
+        starts, ends = self.indptr[current], self.indptr[current + 1]
+        moved = ends > starts
+        if not moved.any():
+            return current, moved
+        lo = np.where(starts > 0, self.cumulative[np.maximum(starts - 1, 0)], 0.0)
+        hi = self.cumulative[np.maximum(ends - 1, 0)]
+        draws = lo + rng.random(len(current)) * (hi - lo)
+        positions = np.searchsorted(self.cumulative, draws, side='right')
+        positions = np.clip(positions, starts, np.maximum(ends - 1, starts))
+        positions = np.minimum(positions, len(self.indices) - 1)
+        return np.where(moved, self.indices[positions], current).astype(np.int64), moved
+
+    def random_walk_with_restart(self, query_codes, num_walks=NUM_WALKS, walk_length=WALK_LENGTH,
+                                 restart=RESTART_PROB, seed=None, k=None, exclude_queries=True):
+        return self.random_walks_with_restart([query_codes], num_walks, walk_length, restart, seed, k,
+                                              exclude_queries)[0]
+
+    def random_walks_with_restart(self, queries, num_walks=NUM_WALKS, walk_length=WALK_LENGTH,
+                                  restart=RESTART_PROB, seed=None, k=None, exclude_queries=True):
+        # One (nodes, scores) ranking per query set; the walkers of every set
+        # advance together, so a batch costs walk_length vectorised steps
+        n = len(self)
+        codes = [np.asarray(query_codes, dtype=np.int64) for query_codes in queries]
+        codes = [query_codes[(query_codes >= 0) & (query_codes < n)] for query_codes in codes]
+        results = [(np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64))] * len(queries)
+        if not sum(len(query_codes) for query_codes in codes):
+            return results
+        group_of = np.repeat(np.arange(len(codes)), [len(query_codes) for query_codes in codes])
+        query_codes = np.concatenate(codes)
+        rng = np.random.default_rng(seed)
+
+        degrees = self.degrees[query_codes].astype(np.float64)
+        largest = np.zeros(len(codes))
+        np.maximum.at(largest, group_of, degrees)
+        scale = degrees * (np.log(np.maximum(largest[group_of], 1.0)) + 1.0 - np.log(np.maximum(degrees, 1.0)))
+        totals = np.bincount(group_of, weights=scale, minlength=len(codes))[group_of]
+        sizes = np.bincount(group_of, minlength=len(codes))[group_of]
+        share = np.divide(scale, totals, out=np.zeros_like(scale), where=totals > 0)
+        walkers = np.floor(num_walks * sizes * share).astype(np.int64)
+        walkers[(scale > 0) & (walkers == 0)] = 1
+        origin = np.repeat(np.arange(len(query_codes)), walkers)
+        current = query_codes[origin]
+
+        visits = []
+        for _ in range(walk_length):
+            current, moved = self.step(current, rng)
+            restarting = ~moved | (rng.random(len(current)) < restart)
+            visits.append(origin[moved] * n + current[moved])
+            current[restarting] = query_codes[origin[restarting]]
+
+        # Per query, then summed per set: (sum_q sqrt(visits_q))^2
+        keys, counts = np.unique(np.concatenate(visits), return_counts=True)
+        keys, inverse = np.unique(group_of[keys // n] * n + keys % n, return_inverse=True)
+        scores = np.bincount(inverse, weights=np.sqrt(counts)) ** 2
+        if exclude_queries:
+            keep = ~np.isin(keys, group_of * n + query_codes)
+            keys, scores = keys[keep], scores[keep]
+        groups, nodes = keys // n, keys % n
+        order = np.lexsort((nodes, -scores, groups))
+        bounds = np.searchsorted(groups[order], np.arange(len(codes) + 1))
+        for group in range(len(codes)):
+            top = order[bounds[group]:bounds[group + 1]][:k]
+            results[group] = (nodes[top], scores[top])
+        return results
+
+    def recommend(self, item_ids, k=10, **options):
+        codes = np.fromiter((self.item_index.get(str(item), -1) for item in item_ids), dtype=np.int64)
+        nodes, scores = self.random_walk_with_restart(codes, k=k, **options)
+        return [(self.item_ids[node], float(score)) for node, score in zip(nodes, scores)]
+
+    def recommend_batch(self, histories, k=10, **options):
+        # recommend() for many item lists, walked together
+        codes = [np.fromiter((self.item_index.get(str(item), -1) for item in items), dtype=np.int64)
+                 for items in histories]
+        return [
+            [(self.item_ids[node], float(score)) for node, score in zip(nodes, scores)]
+            for nodes, scores in self.random_walks_with_restart(codes, k=k, **options)
+        ]
+
+# ======================
+# MAIN EXECUTION
+# ======================
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="CSR item graph with random-walk-with-restart retrieval")
+    parser.add_argument('--path', default='item_graph_csr')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    export = commands.add_parser('export', help="Export item_graph to memory-mappable CSR arrays")
+    export.add_argument('--db', required=True)
+    export.add_argument('--top-k', type=int, default=TOP_K_NEIGHBOURS)
+
+    query = commands.add_parser('query', help="Rank items by walks from the given items")
+    query.add_argument('items', nargs='+')
+    query.add_argument('--k', type=int, default=10)
+    query.add_argument('--num-walks', type=int, default=NUM_WALKS)
+    query.add_argument('--walk-length', type=int, default=WALK_LENGTH)
+    query.add_argument('--restart', type=float, default=RESTART_PROB)
+    query.add_argument('--seed', type=int, default=None)
+
+    args = parser.parse_args(argv)
+    if args.command == 'export':
+        import duckdb
+        conn = duckdb.connect(args.db, read_only=True)
+        try:
+            item_ids = conn.execute("SELECT id::VARCHAR AS id FROM assets ORDER BY id").fetchnumpy()['id']
+            start = time.perf_counter()
+            graph = CSRGraph.from_database(conn, item_ids.tolist(), top_k=args.top_k)
+        finally:
+            conn.close()
+        graph.save(args.path)
+        print(json.dumps({'nodes': len(graph), 'edges': int(graph.indptr[-1]),
+                          'seconds': time.perf_counter() - start}))
+        return 0
+
+    graph = CSRGraph.load(args.path)
+    start = time.perf_counter()
+    ranking = graph.recommend(args.items, args.k, num_walks=args.num_walks, walk_length=args.walk_length,
+                              restart=args.restart, seed=args.seed)
+    elapsed = (time.perf_counter() - start) * 1000
+    for item, score in ranking:
+        print(json.dumps({'item': item, 'score': score}))
+    print(json.dumps({'ms': elapsed}))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
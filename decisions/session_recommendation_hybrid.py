@@ -0,0 +1,191 @@
+import argparse
+import json
+import sys
+import time
+import numpy as np
+from session_recommendation_ann import MultiModalIndex, top_k
+from session_recommendation_graph import CSRGraph
+from session_recommendation_live import CONTEXT_ITEMS, ItemVectors
+
+# Weights of the hybrid query in session_recommendation_08.py
+MODALITY_WEIGHTS = {'text_embedding': 0.6, 'image_embedding': 0.4}
+SHORT_SESSION_ITEMS = 3
+SHORT_SESSION_BLEND = (0.8, 0.2)
+LONG_SESSION_BLEND = (0.5, 0.5)
+ANN_CANDIDATES = 200
+WALK_CANDIDATES = 0
+
+# ======================
+# CANDIDATE-RESTRICTED SCORING
+# ======================
+# Same scores as the CROSS JOIN query, computed only for the union of
+#
+#   - ANN neighbours of the session centroid, per modality
+#   - graph neighbours of the context items (CSR item graph, both directions)
+#   - optionally, the top random-walk-with-restart nodes from the context
+#
+# An asset outside both sets has no graph affinity and is not among the
+# nearest to the centroid in either modality, so it rarely reaches the
+# top-k; benchmark() measures the agreement with scoring every asset. With
+# normalised rows, the average of per-item cosines equals the dot product
+# with the context centroid, so the content score is one dot product per
+# candidate.
+
+def session_blend(context_length):
+    return SHORT_SESSION_BLEND if context_length < SHORT_SESSION_ITEMS else LONG_SESSION_BLEND
+
+class HybridSessionScorer:
+    def __init__(self, item_vectors, index, graph, modality_weights=MODALITY_WEIGHTS,
+                 ann_candidates=ANN_CANDIDATES, walk_candidates=WALK_CANDIDATES):
+        # graph is a CSRGraph over item_vectors.item_ids
+        self.items = item_vectors
+        self.index = index
+        self.graph = graph
+        self.modality_weights = modality_weights
+        self.ann_candidates = ann_candidates
+        self.walk_candidates = walk_candidates
+
+    def query_vector(self, centroid):
+        query = np.zeros(self.items.dim, dtype=np.float32)
+        for modality, weight in self.modality_weights.items():
+            span = self.items.slices[modality]
+            query[span] = weight * centroid[span]
+        return query
+
+    def ann_candidates_batch(self, contexts, centroids):
+        # Per session, the ANN neighbour codes of its centroid in each
+        # modality, from one search per modality over the whole batch
+        found = [[] for _ in contexts]
+        for modality in self.modality_weights:
+            if modality not in self.index.indexes:
+                continue
+            queries = centroids[:, self.items.slices[modality]]
+            rows = np.flatnonzero(queries.any(axis=1))
+            if not len(rows):
+                continue
+            exclude = [[self.items.item_ids[code] for code in contexts[row] if code >= 0] for row in rows]
+            results = self.index.search(modality, queries[rows], self.ann_candidates, exclude=exclude)
+            for row, (ids, _) in zip(rows.tolist(), results):
+                found[row].append(self.items.codes(ids))
+        return found
+
+    def candidates(self, context_codes, centroid, ann=None):
+        # ann: the session's ann_candidates_batch entry, if already searched
+        if ann is None:
+            ann, = self.ann_candidates_batch([context_codes], centroid[None, :])
+        found = list(ann)
+        targets, _ = self.graph.neighbours(context_codes)
+        found.append(targets)
+        if self.walk_candidates:
+            walked, _ = self.graph.random_walk_with_restart(context_codes, k=self.walk_candidates)
+            found.append(walked)
+        candidates = np.unique(np.concatenate(found))
+        candidates = candidates[candidates >= 0]
+        return candidates[~np.isin(candidates, context_codes)]
+
+    def score(self, context_codes, candidates, centroid):
+        content = self.items.vectors[candidates] @ self.query_vector(centroid)
+        targets, weights = self.graph.neighbours(context_codes)
+        graph = np.zeros(len(candidates), dtype=np.float32)
+        if len(targets):
+            positions = np.searchsorted(candidates, targets)
+            positions = np.minimum(positions, len(candidates) - 1)
+            hit = candidates[positions] == targets
+            np.add.at(graph, positions[hit], weights[hit])
+        content_weight, graph_weight = session_blend(len(context_codes))
+        return content_weight * content + graph_weight * graph
+
+    def recommend(self, context_ids, k=10, centroid=None):
+        # context_ids: the session's last items, oldest first
+        return self.recommend_batch([context_ids], k, None if centroid is None else [centroid])[0]
+
+    def recommend_batch(self, contexts, k=10, centroids=None):
+        # recommend() for many sessions: the ANN searches run once per
+        # modality for the batch, then each small candidate set is scored
+        codes = [self.items.codes(context_ids[-CONTEXT_ITEMS:]) for context_ids in contexts]
+        if centroids is None:
+            centroids = [self.items.centroid(context_codes) if len(context_codes) else None for context_codes in codes]
+        results = [[] for _ in contexts]
+        live = [n for n, centroid in enumerate(centroids) if centroid is not None]
+        if not live:
+            return results
+        ann = self.ann_candidates_batch([codes[n] for n in live], np.stack([centroids[n] for n in live]))
+        for n, found in zip(live, ann):
+            candidates = self.candidates(codes[n], centroids[n], found)
+            if not len(candidates):
+                continue
+            scores = self.score(codes[n], candidates, centroids[n])
+            top = top_k(scores, k)
+            results[n] = [(self.items.item_ids[code], float(score)) for code, score in zip(candidates[top], scores[top])]
+        return results
+
+    def recommend_session(self, store, session_id, k=10):
+        # Reads context and centroid from the live-session store
+        return self.recommend(store.context_ids(session_id), k, store.centroid(session_id))
+
+    def exhaustive(self, context_ids, k=10):
+        # Every asset scored, as the CROSS JOIN did; the reference for benchmark()
+        context_codes = self.items.codes(context_ids[-CONTEXT_ITEMS:])
+        centroid = self.items.centroid(context_codes)
+        candidates = np.setdiff1d(np.arange(len(self.items)), context_codes)
+        scores = self.score(context_codes, candidates, centroid)
+        top = top_k(scores, k)
+        return [(self.items.item_ids[code], float(score)) for code, score in zip(candidates[top], scores[top])]
+
+# ======================
+# BENCHMARK
+# ======================
+
+def benchmark(scorer, contexts, k=10):
+    report = {}
+    for name, method in (('exhaustive', scorer.exhaustive), ('candidates', scorer.recommend)):
+        start = time.perf_counter()
+        results = [method(context, k) for context in contexts]
+        report[name] = {'ms_per_query': (time.perf_counter() - start) * 1000 / max(len(contexts), 1)}
+        report[name]['results'] = results
+    overlap = [
+        len({item for item, _ in got} & {item for item, _ in want}) / max(len(want), 1)
+        for got, want in zip(report['candidates'].pop('results'), report['exhaustive'].pop('results'))
+    ]
+    report['top_k_agreement'] = float(np.mean(overlap)) if overlap else None
+    return report
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark candidate-restricted hybrid session scoring")
+    parser.add_argument('--db', required=True)
+    parser.add_argument('--sessions', type=int, default=200)
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--ann-candidates', type=int, default=ANN_CANDIDATES)
+    parser.add_argument('--walk-candidates', type=int, default=WALK_CANDIDATES)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    import duckdb
+    conn = duckdb.connect(args.db, read_only=True)
+    try:
+        items = ItemVectors.from_database(conn, tuple(MODALITY_WEIGHTS))
+        index = MultiModalIndex.from_database(
+            conn, {modality: items.layout[modality] for modality in MODALITY_WEIGHTS}
+        )
+        graph = CSRGraph.from_database(conn, items.item_ids)
+        contexts = conn.execute(f"""
+            SELECT items FROM (
+              SELECT LIST(item_id::VARCHAR ORDER BY event_order) AS items
+              FROM (
+                SELECT * FROM session_items
+                QUALIFY ROW_NUMBER() OVER (PARTITION BY session_id ORDER BY event_order DESC) <= {CONTEXT_ITEMS}
+              )
+              GROUP BY session_id
+            )
+            USING SAMPLE reservoir({int(args.sessions)} ROWS) REPEATABLE ({int(args.seed)})
+        """).fetchnumpy()['items']
+    finally:
+        conn.close()
+
+    scorer = HybridSessionScorer(items, index, graph, ann_candidates=args.ann_candidates,
+                                 walk_candidates=args.walk_candidates)
+    print(json.dumps(benchmark(scorer, [list(context) for context in contexts], args.k)))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
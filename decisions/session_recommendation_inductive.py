@@ -0,0 +1,375 @@
+import argparse
+import json
+import sys
+import time
+import numpy as np
+from session_recommendation_ann import MODALITIES, build_index, load_index, normalize, save_index
+
+# PinSage item inputs: the content embeddings of the training feed
+# (structural_embedding ++ text_embedding, ITEM_EMBEDDING_DIM wide)
+FEATURE_COLUMNS = ('structural_embedding', 'text_embedding')
+NUM_NEIGHBOURS = 10
+FALLBACK_NEIGHBOURS = 10
+EMBED_DIM = 64
+NUM_LAYERS = 2
+EPOCHS = 5
+BATCH_SIZE = 512
+MARGIN = 0.1
+LEARNING_RATE = 1e-3
+EMBED_BATCH = 4096
+
+# ======================
+# AGGREGATOR WEIGHTS
+# ======================
+# The convolutions of a feature-only PinSage, as a flat .npz (float32):
+#
+#   feature_proj / _bias     (F, D) / (D,)   item features -> layer-0 input
+#   layer{l}.Q / .q_bias     (D, H) / (H,)   neighbour transform
+#   layer{l}.W / .w_bias     (D + H, D) / (D,)
+#
+# A layer maps a node and its importance-weighted neighbours to
+#
+#   n = sum_u a_u relu(Q h_u + q) / sum_u a_u
+#   h' = normalize(relu(W [h ; n] + w))
+#
+# This is the layout the model must be trained in for inductive use: layer-0
+# inputs come from content features only, with no per-item id embedding, so
+# an item missing from training gets an embedding from its features and its
+# neighbours' features alone. libreco's PinSage adds a learned id embedding
+# to every item's input, so its weights do not fit this layout;
+# train_aggregator below fits the feature-only variant on the CSR graph.
+
+class PinSageAggregator:
+    def __init__(self, weights):
+        self.w = {name: np.asarray(value, dtype=np.float32) for name, value in weights.items()}
+        self.num_layers = sum(1 for name in self.w if name.endswith('.Q'))
+        self._check()
+
+    def _check(self):
+        # Fails on load rather than with a shape error mid-embedding
+        required = ['feature_proj', 'feature_proj_bias'] + [
+            f"layer{layer}.{name}" for layer in range(self.num_layers) for name in ('Q', 'q_bias', 'W', 'w_bias')
+        ]
+        missing = [name for name in required if name not in self.w]
+        if not self.num_layers or missing:
+            raise ValueError(f"Not a feature-only PinSage aggregator; missing {missing or ['layer0.Q']}")
+        width = self.w['feature_proj'].shape[1]
+        for layer in range(self.num_layers):
+            hidden = self.w[f"layer{layer}.Q"].shape[1]
+            if self.w[f"layer{layer}.Q"].shape[0] != width or self.w[f"layer{layer}.W"].shape[0] != width + hidden:
+                raise ValueError(f"Aggregator layer {layer} does not match its input width {width}")
+            width = self.w[f"layer{layer}.W"].shape[1]
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as arrays:
+            return cls({name: arrays[name] for name in arrays.files})
+
+    def save(self, path):
+        np.savez(path, **self.w)
+
+    @property
+    def dim(self):
+        return self.w[f"layer{self.num_layers - 1}.W"].shape[1]
+
+    def inputs(self, features):
+        return features @ self.w['feature_proj'] + self.w['feature_proj_bias']
+
+    def convolve(self, layer, own, neighbours, importance, segments):
+        # own: (N, D); neighbours: (E, D) grouped by node; segments: (N + 1,)
+        # offsets of each node's neighbours; importance: (E,)
+        prefix = f"layer{layer}."
+        messages = np.maximum(neighbours @ self.w[prefix + 'Q'] + self.w[prefix + 'q_bias'], 0.0)
+        owners = np.repeat(np.arange(len(own)), np.diff(segments))
+        pooled = np.zeros((len(own), messages.shape[1]), dtype=np.float32)
+        np.add.at(pooled, owners, messages * importance[:, None])
+        totals = np.bincount(owners, weights=importance, minlength=len(own))
+        pooled /= np.maximum(totals, 1e-12)[:, None]
+        hidden = np.maximum(np.hstack([own, pooled]) @ self.w[prefix + 'W'] + self.w[prefix + 'w_bias'], 0.0)
+        return normalize(hidden)
+
+# ======================
+# INDUCTIVE EMBEDDER
+# ======================
+# New items take codes after the graph's nodes. Their first hop comes from
+# their own item_graph rows (read at ingest, after the CSR export was
+# taken); deeper hops follow the CSR graph. An item with no co-occurrence
+# yet borrows its nearest items by content features as neighbours, with
+# cosine similarity as importance. The L-layer computation runs over the
+# union of L-hop neighbourhoods of a whole batch at once.
+
+class InductiveEmbedder:
+    def __init__(self, aggregator, graph, features, num_neighbours=NUM_NEIGHBOURS,
+                 fallback_neighbours=FALLBACK_NEIGHBOURS):
+        # features: (len(graph), F) rows in graph.item_ids order
+        self.aggregator = aggregator
+        self.graph = graph
+        self.features = features
+        self.num_neighbours = num_neighbours
+        self.fallback_neighbours = fallback_neighbours
+        self.feature_index = None
+
+    def _nearest(self, features):
+        if self.feature_index is None:
+            self.feature_index = build_index(self.features.shape[1], np.arange(len(self.features)), self.features)
+        results = self.feature_index.search(features, self.fallback_neighbours)
+        return [(ids.astype(np.int64), np.maximum(scores, 1e-6)) for ids, scores in results]
+
+    def _neighbours(self, codes, first_hop):
+        # Top neighbours of each code, concatenated, with segment offsets
+        targets, weights, lengths = [], [], []
+        for code in codes.tolist():
+            if code >= len(self.graph):
+                found, importance = first_hop[code]
+            else:
+                found, importance = self.graph.neighbours([code])
+            found, importance = found[:self.num_neighbours], importance[:self.num_neighbours]
+            targets.append(found)
+            weights.append(np.asarray(importance, dtype=np.float32))
+            lengths.append(len(found))
+        segments = np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64)
+        return np.concatenate(targets).astype(np.int64), np.concatenate(weights), segments
+
+    def plan(self, codes, first_hop):
+        # Node sets per layer, the batch at the top and widened one hop per
+        # layer, with each set's neighbour block
+        layers, blocks = [codes], []
+        for _ in range(self.aggregator.num_layers):
+            blocks.append(self._neighbours(layers[-1], first_hop))
+            layers.append(np.union1d(layers[-1], blocks[-1][0]))
+        return layers, blocks
+
+    def _forward(self, layers, blocks, inputs):
+        # Layer-0 inputs for the widest set, then one convolution per layer
+        nodes = layers[-1]
+        hidden = self.aggregator.inputs(inputs)
+        for layer in range(self.aggregator.num_layers):
+            current = layers[-(layer + 2)]
+            targets, importance, segments = blocks[-(layer + 1)]
+            own = hidden[np.searchsorted(nodes, current)]
+            neighbours = hidden[np.searchsorted(nodes, targets)]
+            hidden = self.aggregator.convolve(layer, own, neighbours, importance, segments)
+            nodes = current
+        return hidden
+
+    def embed(self, features, edges):
+        # features: (B, F) of the new items; edges: per new item, a list of
+        # (neighbour code, weight) from item_graph
+        features = np.asarray(features, dtype=np.float32)
+        new_codes = np.arange(len(self.graph), len(self.graph) + len(features))
+        first_hop = {}
+        fallback = [n for n, item_edges in enumerate(edges) if not item_edges]
+        nearest = dict(zip(fallback, self._nearest(features[fallback]))) if fallback else {}
+        for n, code in enumerate(new_codes.tolist()):
+            if edges[n]:
+                ranked = sorted(edges[n], key=lambda edge: -edge[1])
+                first_hop[code] = (np.array([t for t, _ in ranked], dtype=np.int64),
+                                   np.array([w for _, w in ranked], dtype=np.float32))
+            else:
+                first_hop[code] = nearest[n]
+
+        layers, blocks = self.plan(new_codes, first_hop)
+        nodes = layers[-1]
+        known = nodes < len(self.graph)
+        inputs = np.empty((len(nodes), self.features.shape[1]), dtype=np.float32)
+        inputs[known] = self.features[nodes[known]]
+        inputs[~known] = features[nodes[~known] - len(self.graph)]
+        return self._forward(layers, blocks, inputs)
+
+    def embed_graph(self, batch=EMBED_BATCH):
+        # Embeddings of the graph's own items, in graph.item_ids order: the
+        # matrix new items are added to
+        rows = []
+        for start in range(0, len(self.graph), batch):
+            layers, blocks = self.plan(np.arange(start, min(start + batch, len(self.graph))), {})
+            rows.append(self._forward(layers, blocks, self.features[layers[-1]]))
+        return np.vstack(rows) if rows else np.empty((0, self.aggregator.dim), dtype=np.float32)
+
+# ======================
+# FEATURE-ONLY TRAINING
+# ======================
+# PinSage's max-margin objective over the CSR graph's edges: a query item
+# should score its graph neighbour above a uniformly sampled item by MARGIN.
+# Each batch runs the same plan and convolutions as serving, in torch, and
+# the fitted weights are exported in the aggregator layout above.
+
+def train_aggregator(graph, features, dim=EMBED_DIM, num_layers=NUM_LAYERS, epochs=EPOCHS,
+                     batch_size=BATCH_SIZE, margin=MARGIN, lr=LEARNING_RATE,
+                     num_neighbours=NUM_NEIGHBOURS, seed=0):
+    import torch
+
+    torch.manual_seed(seed)
+    rng = np.random.default_rng(seed)
+    features = np.asarray(features, dtype=np.float32)
+    shapes = {'feature_proj': (features.shape[1], dim), 'feature_proj_bias': (dim,)}
+    for layer in range(num_layers):
+        shapes.update({f"layer{layer}.Q": (dim, dim), f"layer{layer}.q_bias": (dim,),
+                       f"layer{layer}.W": (2 * dim, dim), f"layer{layer}.w_bias": (dim,)})
+    params = {}
+    for name, shape in shapes.items():
+        params[name] = torch.zeros(shape) if len(shape) == 1 else torch.nn.init.xavier_uniform_(torch.empty(shape))
+        params[name].requires_grad_(True)
+    optimizer = torch.optim.Adam(params.values(), lr=lr)
+    embedder = InductiveEmbedder(PinSageAggregator({name: value.detach().numpy() for name, value in params.items()}),
+                                 graph, features, num_neighbours=num_neighbours)
+    table = torch.from_numpy(features)
+
+    def forward(codes):
+        # torch twin of InductiveEmbedder._forward
+        layers, blocks = embedder.plan(codes, {})
+        nodes = layers[-1]
+        hidden = table[nodes] @ params['feature_proj'] + params['feature_proj_bias']
+        for layer in range(num_layers):
+            prefix = f"layer{layer}."
+            current = layers[-(layer + 2)]
+            targets, importance, segments = blocks[-(layer + 1)]
+            own = hidden[torch.from_numpy(np.searchsorted(nodes, current))]
+            messages = torch.relu(hidden[torch.from_numpy(np.searchsorted(nodes, targets))] @ params[prefix + 'Q']
+                                  + params[prefix + 'q_bias'])
+            owners = torch.from_numpy(np.repeat(np.arange(len(current)), np.diff(segments)))
+            weights = torch.from_numpy(importance)
+            pooled = torch.zeros(len(current), dim).index_add(0, owners, messages * weights[:, None])
+            totals = torch.zeros(len(current)).index_add(0, owners, weights)
+            pooled = pooled / totals.clamp(min=1e-12)[:, None]
+            hidden = torch.relu(torch.cat([own, pooled], dim=1) @ params[prefix + 'W'] + params[prefix + 'w_bias'])
+            hidden = torch.nn.functional.normalize(hidden, dim=1)
+            nodes = current
+        return hidden
+
+    sources = np.repeat(np.arange(len(graph)), graph.degrees)
+    targets = np.asarray(graph.indices, dtype=np.int64)
+    history = []
+    for _ in range(epochs):
+        order = rng.permutation(len(sources))
+        total = 0.0
+        for start in range(0, len(order), batch_size):
+            pairs = order[start:start + batch_size]
+            negatives = rng.integers(0, len(graph), len(pairs))
+            codes, inverse = np.unique(np.concatenate([sources[pairs], targets[pairs], negatives]), return_inverse=True)
+            hidden = forward(codes)[torch.from_numpy(inverse)]
+            query, positive, negative = hidden.split(len(pairs))
+            loss = torch.relu((query * negative).sum(1) - (query * positive).sum(1) + margin).mean()
+            optimizer.zero_grad()
+            loss.backward()
+            optimizer.step()
+            total += loss.item() * len(pairs)
+        history.append(total / max(len(order), 1))
+    aggregator = PinSageAggregator({name: value.detach().numpy() for name, value in params.items()})
+    return aggregator, history
+
+# ======================
+# ONLINE INGEST
+# ======================
+
+def load_features(conn, item_ids, columns=FEATURE_COLUMNS):
+    # Feature rows in item_ids order; missing assets or embeddings are zeros
+    table = conn.execute(f"""
+        SELECT {', '.join(f'a.{column}' for column in columns)}
+        FROM (SELECT UNNEST($ids) AS id, generate_subscripts($ids, 1) AS position) wanted
+        LEFT JOIN assets a ON a.id = wanted.id::UUID
+        ORDER BY wanted.position
+    """, parameters={'ids': [str(item) for item in item_ids]}).fetch_arrow_table()
+    blocks = []
+    for column in columns:
+        dim = MODALITIES[column]
+        block = np.zeros((table.num_rows, dim), dtype=np.float32)
+        values = table[column].combine_chunks()
+        present = ~values.is_null().to_numpy(zero_copy_only=False)
+        if present.any():
+            block[present] = values.drop_null().flatten().to_numpy().reshape(-1, dim)
+        blocks.append(block)
+    return np.hstack(blocks)
+
+def ingest_items(conn, embedder, asset_ids, model=None, index=None):
+    # Embeds the given assets and inserts them into an asset embedding matrix
+    # (EmbeddingModel.add_items) and an ANN index, returning timings. The
+    # rows must share the aggregator's embedding space, e.g. the index
+    # `train` exports; the PinSage served by session_recommendation_07.py is
+    # id-only over `items`, so it is not a valid target
+    start = time.perf_counter()
+    asset_ids = [str(item) for item in asset_ids if str(item) not in embedder.graph.item_index
+                 and (index is None or str(item) not in index.rows.row_of)]
+    if not asset_ids:
+        return {'embedded': 0, 'seconds': time.perf_counter() - start}
+    features = load_features(conn, asset_ids)
+    # item_graph stores each pair once, so both columns are searched
+    rows = conn.execute("""
+        WITH new_assets AS (SELECT UNNEST($ids)::UUID AS id)
+        SELECT item::VARCHAR, neighbour::VARCHAR, SUM(weight)
+        FROM (
+          SELECT source AS item, target AS neighbour, weight FROM item_graph
+          WHERE source IN (SELECT id FROM new_assets)
+          UNION ALL
+          SELECT target, source, weight FROM item_graph
+          WHERE target IN (SELECT id FROM new_assets)
+        )
+        GROUP BY 1, 2
+    """, parameters={'ids': asset_ids}).fetchall()
+    edges = {item: [] for item in asset_ids}
+    for item, neighbour, weight in rows:
+        code = embedder.graph.item_index.get(neighbour)
+        if code is not None:
+            edges[item].append((code, float(weight)))
+    vectors = embedder.embed(features, [edges[item] for item in asset_ids])
+    if model is not None:
+        model.add_items(asset_ids, vectors)
+    if index is not None:
+        index.add(asset_ids, vectors)
+    return {
+        'embedded': len(asset_ids),
+        'with_graph_neighbours': sum(1 for item in asset_ids if edges[item]),
+        'seconds': time.perf_counter() - start
+    }
+
+# ======================
+# MAIN EXECUTION
+# ======================
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Inductive PinSage embeddings for newly uploaded assets")
+    parser.add_argument('--db', required=True)
+    parser.add_argument('--graph', required=True, help="CSR graph directory (session_recommendation_graph.py)")
+    parser.add_argument('--aggregator', default='pinsage_aggregator.npz', help=".npz of aggregator weights")
+    parser.add_argument('--index', default='pinsage_index', help="ANN index directory of the embeddings")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    train = commands.add_parser('train', help="Fit a feature-only aggregator and export the graph's embeddings")
+    train.add_argument('--dim', type=int, default=EMBED_DIM)
+    train.add_argument('--layers', type=int, default=NUM_LAYERS)
+    train.add_argument('--epochs', type=int, default=EPOCHS)
+    train.add_argument('--seed', type=int, default=0)
+
+    ingest = commands.add_parser('ingest', help="Embed new assets and add them to the index")
+    ingest.add_argument('assets', nargs='+')
+
+    args = parser.parse_args(argv)
+    import duckdb
+    from session_recommendation_graph import CSRGraph
+
+    graph = CSRGraph.load(args.graph)
+    conn = duckdb.connect(args.db, read_only=True)
+    try:
+        features = load_features(conn, graph.item_ids)
+        if args.command == 'train':
+            start = time.perf_counter()
+            aggregator, history = train_aggregator(graph, features, dim=args.dim, num_layers=args.layers,
+                                                   epochs=args.epochs, seed=args.seed)
+            aggregator.save(args.aggregator)
+            vectors = InductiveEmbedder(aggregator, graph, features).embed_graph()
+            save_index(build_index(aggregator.dim, graph.item_ids, vectors), args.index)
+            report = {'items': len(graph), 'loss': history, 'seconds': time.perf_counter() - start}
+        else:
+            embedder = InductiveEmbedder(PinSageAggregator.load(args.aggregator), graph, features)
+            index = load_index(args.index)
+            report = ingest_items(conn, embedder, args.assets, index=index)
+            if report['embedded']:
+                # The first add copied the memory-mapped rows, so the files
+                # can be rewritten in place
+                save_index(index, args.index)
+    finally:
+        conn.close()
+    print(json.dumps(report))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,344 @@
+import logging
+import threading
+import time
+import numpy as np
+import pandas as pd
+from session_recommendation_ann import MODALITIES, normalize
+
+logger = logging.getLogger(__name__)
+
+# The hybrid query's context: the last 5 items, over text and image embeddings
+CONTEXT_ITEMS = 5
+CONTEXT_MODALITIES = ('text_embedding', 'image_embedding')
+SESSION_TTL_SECONDS = 1800
+FLUSH_ROWS = 4096
+FLUSH_INTERVAL_SECONDS = 2.0
+INITIAL_SLOTS = 1024
+
+# ======================
+# ITEM VECTORS
+# ======================
+# One row per asset: each modality L2-normalised and concatenated, so the
+# mean of a session's rows holds the per-modality centroids side by side and
+# the dot product with a candidate row gives summed per-modality cosines.
+
+class ItemVectors:
+    def __init__(self, item_ids, vectors, layout):
+        self.item_ids = [str(item) for item in item_ids]
+        self.item_index = {item: idx for idx, item in enumerate(self.item_ids)}
+        self.vectors = vectors
+        self.layout = dict(layout)
+        self.slices = {}
+        offset = 0
+        for modality, dim in self.layout.items():
+            self.slices[modality] = slice(offset, offset + dim)
+            offset += dim
+        self.dim = offset
+
+    def __len__(self):
+        return len(self.item_ids)
+
+    def codes(self, items):
+        # Unknown items map to -1 and contribute nothing to a centroid
+        return np.fromiter((self.item_index.get(str(item), -1) for item in items), dtype=np.int64)
+
+    def rows(self, codes):
+        codes = np.asarray(codes, dtype=np.int64)
+        rows = np.zeros((len(codes), self.dim), dtype=np.float32)
+        known = codes >= 0
+        rows[known] = self.vectors[codes[known]]
+        return rows
+
+    def centroid(self, codes):
+        # Mean over the items that have vectors; zeros if none do
+        codes = np.asarray(codes, dtype=np.int64)
+        codes = codes[codes >= 0]
+        if not len(codes):
+            return np.zeros(self.dim, dtype=np.float32)
+        return self.vectors[codes].mean(axis=0).astype(np.float32)
+
+    @classmethod
+    def from_database(cls, conn, modalities=CONTEXT_MODALITIES):
+        layout = {modality: MODALITIES[modality] for modality in modalities}
+        table = conn.execute(f"""
+            SELECT id::VARCHAR AS id, {', '.join(modalities)}
+            FROM assets
+            ORDER BY id
+        """).fetch_arrow_table()
+        vectors = np.zeros((table.num_rows, sum(layout.values())), dtype=np.float32)
+        offset = 0
+        for modality, dim in layout.items():
+            column = table[modality].combine_chunks()
+            present = ~column.is_null().to_numpy(zero_copy_only=False)
+            if present.any():
+                values = column.drop_null().flatten().to_numpy().reshape(-1, dim)
+                vectors[present, offset:offset + dim] = normalize(values)
+            offset += dim
+        return cls(table['id'].to_pylist(), vectors, layout)
+
+# ======================
+# LIVE SESSION STORE
+# ======================
+# Active sessions live in fixed-width slots of preallocated arrays:
+#
+#   ring[slot]        last CONTEXT_ITEMS item codes, written round-robin
+#   events[slot]      events seen so far (the next event_order)
+#   vector_sum[slot]  sum of the ring's item rows (float64)
+#
+# Recording an event overwrites the oldest ring entry and adjusts the sum by
+# the incoming minus the outgoing row, so the centroid costs O(dim) per event
+# whatever the session length. Sessions idle past the TTL give their slot
+# back once their events are flushed, and a session the store does not hold
+# is hydrated from session_items before its next event, so event_order
+# continues where it left off. Events are queued and written to
+# session_items in batches by a background thread; reads never touch DuckDB.
+
+class LiveSessionStore:
+    def __init__(self, item_vectors, context=CONTEXT_ITEMS, ttl_seconds=SESSION_TTL_SECONDS,
+                 flush_rows=FLUSH_ROWS, slots=INITIAL_SLOTS):
+        self.items = item_vectors
+        self.context = context
+        self.ttl = ttl_seconds
+        self.flush_rows = flush_rows
+        self.lock = threading.Lock()
+        self.flushed = threading.Condition(self.lock)
+
+        self.slot_of = {}
+        self.session_of = [None] * slots
+        self.free = list(range(slots - 1, -1, -1))
+        self.ring = np.full((slots, context), -1, dtype=np.int64)
+        self.ring_ids = np.empty((slots, context), dtype=object)
+        self.events = np.zeros(slots, dtype=np.int64)
+        self.last_seen = np.zeros(slots, dtype=np.float64)
+        self.vector_sum = np.zeros((slots, item_vectors.dim), dtype=np.float64)
+        self.next_sweep = 0.0
+
+        self.pending = []
+        self.flushing = []
+        self.thread = None
+        self.stopping = False
+        self.stats = {'recorded': 0, 'flushed': 0, 'evicted': 0}
+
+    def __len__(self):
+        return len(self.slot_of)
+
+    # ======================
+    # SLOTS
+    # ======================
+
+    def _slot(self, session_id, now, events=0):
+        slot = self.slot_of.get(session_id)
+        if slot is not None:
+            return slot
+        if not self.free:
+            self._grow()
+        slot = self.free.pop()
+        self.slot_of[session_id] = slot
+        self.session_of[slot] = session_id
+        self.ring[slot] = -1
+        self.ring_ids[slot] = None
+        self.events[slot] = events
+        self.vector_sum[slot] = 0.0
+        self.last_seen[slot] = now
+        return slot
+
+    def _grow(self):
+        size = len(self.events)
+        self.ring = np.concatenate([self.ring, np.full((size, self.context), -1, dtype=np.int64)])
+        self.ring_ids = np.concatenate([self.ring_ids, np.empty((size, self.context), dtype=object)])
+        self.events = np.concatenate([self.events, np.zeros(size, dtype=np.int64)])
+        self.last_seen = np.concatenate([self.last_seen, np.zeros(size)])
+        self.vector_sum = np.concatenate([self.vector_sum, np.zeros((size, self.items.dim))])
+        self.session_of.extend([None] * size)
+        self.free.extend(range(2 * size - 1, size - 1, -1))
+
+    def evict_idle(self, now=None, conn=None):
+        # With a connection, queued events are flushed first so every idle
+        # session can go
+        now = time.time() if now is None else now
+        if conn is not None:
+            self.flush(conn)
+        with self.lock:
+            return self._evict_idle(now)
+
+    def _evict_idle(self, now):
+        # Sessions with events not yet in session_items stay until a later
+        # sweep: hydrating them again would miss those events
+        unflushed = {event[0] for event in self.pending}
+        unflushed.update(event[0] for event in self.flushing)
+        active = np.fromiter(self.slot_of.values(), dtype=np.int64, count=len(self.slot_of))
+        idle = active[self.last_seen[active] < now - self.ttl]
+        idle = np.array([slot for slot in idle.tolist() if self.session_of[slot] not in unflushed], dtype=np.int64)
+        for slot in idle.tolist():
+            del self.slot_of[self.session_of[slot]]
+            self.session_of[slot] = None
+            self.free.append(slot)
+        self.stats['evicted'] += len(idle)
+        self.next_sweep = now + self.ttl / 4
+        return len(idle)
+
+    # ======================
+    # EVENTS
+    # ======================
+
+    def record(self, session_id, item_id, now=None, conn=None):
+        # conn hydrates sessions the store does not hold (evicted, or begun
+        # before a restart); without it such a session restarts at order 0
+        now = time.time() if now is None else now
+        session_id, item_id = str(session_id), str(item_id)
+        code = self.items.item_index.get(item_id, -1)
+        if conn is not None:
+            with self.lock:
+                held = session_id in self.slot_of
+            if not held:
+                self.hydrate(conn, [session_id], now)
+        with self.lock:
+            if now >= self.next_sweep:
+                self._evict_idle(now)
+            slot = self._slot(session_id, now)
+            order = int(self.events[slot])
+            position = order % self.context
+            outgoing = self.ring[slot, position]
+            if outgoing >= 0:
+                self.vector_sum[slot] -= self.items.vectors[outgoing]
+            if code >= 0:
+                self.vector_sum[slot] += self.items.vectors[code]
+            self.ring[slot, position] = code
+            self.ring_ids[slot, position] = item_id
+            self.events[slot] = order + 1
+            self.last_seen[slot] = now
+            self.pending.append((session_id, item_id, order, now))
+            self.stats['recorded'] += 1
+            if len(self.pending) >= self.flush_rows:
+                self.flushed.notify()
+        return order
+
+    def _context_positions(self, slot):
+        events = int(self.events[slot])
+        start = max(0, events - self.context)
+        return [n % self.context for n in range(start, events)]
+
+    def context_ids(self, session_id):
+        # Oldest to newest
+        with self.lock:
+            slot = self.slot_of.get(str(session_id))
+            if slot is None:
+                return []
+            return [self.ring_ids[slot, position] for position in self._context_positions(slot)]
+
+    def context_codes(self, session_id):
+        with self.lock:
+            slot = self.slot_of.get(str(session_id))
+            if slot is None:
+                return np.empty(0, dtype=np.int64)
+            return self.ring[slot, self._context_positions(slot)].copy()
+
+    def centroid(self, session_id):
+        # Mean of the context rows of items with vectors (zeros if there are
+        # none); None for sessions the store does not hold
+        with self.lock:
+            slot = self.slot_of.get(str(session_id))
+            if slot is None:
+                return None
+            known = int((self.ring[slot, self._context_positions(slot)] >= 0).sum())
+            return (self.vector_sum[slot] / max(known, 1)).astype(np.float32)
+
+    def modality_centroid(self, centroid, modality):
+        return centroid[self.items.slices[modality]]
+
+    # ======================
+    # HYDRATION
+    # ======================
+
+    def hydrate(self, conn, session_ids, now=None):
+        # Restores sessions that were evicted or began before a restart from
+        # session_items; the serving path calls this only on a miss
+        now = time.time() if now is None else now
+        with self.lock:
+            missing = [str(session) for session in session_ids if str(session) not in self.slot_of]
+        if not missing:
+            return 0
+        rows = conn.execute("""
+            SELECT session_id::VARCHAR AS session_id, item_id::VARCHAR AS item_id, event_order,
+                   COUNT(*) OVER (PARTITION BY session_id) AS events
+            FROM session_items
+            WHERE session_id IN (SELECT UNNEST($sessions)::UUID)
+            QUALIFY ROW_NUMBER() OVER (PARTITION BY session_id ORDER BY event_order DESC) <= $context
+            ORDER BY session_id, event_order
+        """, parameters={'sessions': missing, 'context': self.context}).fetchdf()
+        with self.lock:
+            for session_id, history in rows.groupby('session_id', sort=False):
+                if session_id in self.slot_of:
+                    continue
+                total = int(max(history['events'].iloc[0], history['event_order'].iloc[-1] + 1))
+                slot = self._slot(session_id, now, events=total)
+                codes = self.items.codes(history['item_id'])
+                positions = [n % self.context for n in range(total - len(history), total)]
+                self.ring[slot, positions] = codes
+                self.ring_ids[slot, positions] = history['item_id'].to_numpy(dtype=object)
+                self.vector_sum[slot] = self.items.rows(codes).sum(axis=0)
+        return rows['session_id'].nunique()
+
+    # ======================
+    # BATCHED FLUSH
+    # ======================
+
+    def flush(self, conn):
+        with self.lock:
+            batch, self.pending = self.pending, []
+            self.flushing = batch
+        if not batch:
+            return 0
+        frame = pd.DataFrame(batch, columns=['session_id', 'item_id', 'event_order', 'timestamp'])
+        frame['timestamp'] = pd.to_datetime(frame['timestamp'], unit='s')
+        conn.register('live_session_events', frame)
+        try:
+            conn.execute("""
+                INSERT INTO session_items
+                SELECT session_id::UUID, item_id::UUID, event_order, timestamp
+                FROM live_session_events
+            """)
+        except Exception:
+            # Keep the events for the next attempt, ahead of newer ones
+            with self.lock:
+                self.pending[:0] = batch
+            raise
+        finally:
+            with self.lock:
+                self.flushing = []
+            conn.unregister('live_session_events')
+        self.stats['flushed'] += len(batch)
+        return len(batch)
+
+    def start_flusher(self, conn, interval=FLUSH_INTERVAL_SECONDS):
+        # conn is used only by the flusher thread (pass a cursor of the
+        # serving connection); it wakes every interval or when FLUSH_ROWS
+        # events are queued
+        if self.thread is not None:
+            return
+        self.stopping = False
+
+        def run():
+            while True:
+                with self.lock:
+                    if not self.stopping and len(self.pending) < self.flush_rows:
+                        self.flushed.wait(interval)
+                    stopping = self.stopping
+                try:
+                    self.flush(conn)
+                except Exception:
+                    logger.exception("session_items flush failed")
+                if stopping:
+                    return
+
+        self.thread = threading.Thread(target=run, name='live-session-flusher', daemon=True)
+        self.thread.start()
+
+    def stop_flusher(self):
+        if self.thread is None:
+            return
+        with self.lock:
+            self.stopping = True
+            self.flushed.notify()
+        self.thread.join()
+        self.thread = None
@@ -0,0 +1,289 @@
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import subprocess
+import sys
+import time
+import uuid
+import duckdb
+import httpx
+import numpy as np
+import pandas as pd
+
+DEFAULT_PIPELINE = '00000000-0000-0000-0000-000000000000'
+ENDPOINTS = ('/recommendations', '/trends', '/random-recommendations')
+
+# ======================
+# SYNTHETIC FIXTURE
+# ======================
+
+def generate_fixture(path, users=1000, items=5000, interactions=100000,
+                     days=14, genres=20, popularity_skew=1.1, seed=0):
+    from session_recommendation_07 import initialize_database
+
+    if os.path.exists(path):
+        os.remove(path)
+    shutil.rmtree(path + '.state', ignore_errors=True)
+    initialize_database(path)
+
+    rng = np.random.default_rng(seed)
+    now = int(time.time())
+    spread = days * 86400
+
+    user_ids = [str(uuid.UUID(bytes=rng.bytes(16), version=4)) for _ in range(users)]
+    item_ids = [str(uuid.UUID(bytes=rng.bytes(16), version=4)) for _ in range(items)]
+
+    user_rows = pd.DataFrame({
+        'userid': user_ids,
+        'username': [f"user_{n}" for n in range(users)]
+    })
+    item_rows = pd.DataFrame({
+        'itemid': item_ids,
+        'title': [f"Item {n}" for n in range(items)],
+        'genre': [f"genre_{g}" for g in rng.integers(genres, size=items)],
+        'created_at': pd.to_datetime(now - rng.integers(spread, size=items), unit='s')
+    })
+
+    # Zipf-like item popularity so trends and CF see a realistic long tail
+    popularity = 1.0 / np.arange(1, items + 1) ** popularity_skew
+    popularity /= popularity.sum()
+    interaction_rows = pd.DataFrame({
+        'userid': np.array(user_ids)[rng.integers(users, size=interactions)],
+        'itemid': np.array(item_ids)[rng.choice(items, size=interactions, p=popularity)],
+        'rating': rng.integers(1, 6, size=interactions),
+        'timestamp': now - rng.integers(spread, size=interactions)
+    })
+
+    conn = duckdb.connect(path)
+    try:
+        conn.register('user_rows', user_rows)
+        conn.register('item_rows', item_rows)
+        conn.register('interaction_rows', interaction_rows)
+        conn.execute("INSERT INTO users SELECT userid::UUID, username FROM user_rows")
+        conn.execute("""
+            INSERT INTO items
+            SELECT itemid::UUID, title, genre, created_at FROM item_rows
+        """)
+        conn.execute("""
+            INSERT INTO interactions (interactionid, userid, itemid, rating, timestamp)
+            SELECT gen_random_uuid(), userid::UUID, itemid::UUID, rating, timestamp
+            FROM interaction_rows
+        """)
+    finally:
+        conn.close()
+
+    return {'users': users, 'items': items, 'interactions': interactions, 'days': days}
+
+def load_fixture_ids(path):
+    conn = duckdb.connect(path, read_only=True)
+    try:
+        users = [row[0] for row in conn.execute("SELECT userid::VARCHAR FROM users").fetchall()]
+        items = [row[0] for row in conn.execute("SELECT itemid::VARCHAR FROM items").fetchall()]
+    finally:
+        conn.close()
+    return users, items
+
+# ======================
+# OPEN-LOOP LOAD GENERATOR
+# ======================
+
+def build_payload(endpoint, rng, users, items):
+    payload = {
+        'pipelineid': DEFAULT_PIPELINE,
+        'userid': users[rng.integers(len(users))],
+        'k': 20
+    }
+    if endpoint == '/recommendations' and rng.random() < 0.5:
+        payload['itemid'] = items[rng.integers(len(items))]
+    if endpoint == '/trends':
+        payload['time_period'] = int(rng.choice([3600, 86400, 604800]))
+    return payload
+
+async def send(client, endpoint, payload, scheduled):
+    # Latency is measured from the scheduled send time, so queueing behind a
+    # slow server shows up instead of being hidden (no coordinated omission)
+    try:
+        response = await client.post(endpoint, json=payload)
+        ok = response.status_code < 400
+    except httpx.HTTPError:
+        ok = False
+    return time.perf_counter() - scheduled, ok
+
+async def drive_endpoint(client, endpoint, rps, duration, users, items, seed):
+    rng = np.random.default_rng(seed)
+    tasks = []
+    start = time.perf_counter()
+    next_at = start
+    while next_at < start + duration:
+        delay = next_at - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        payload = build_payload(endpoint, rng, users, items)
+        tasks.append(asyncio.create_task(send(client, endpoint, payload, next_at)))
+        next_at += rng.exponential(1.0 / rps)
+    return await asyncio.gather(*tasks)
+
+async def run_load(base_url, endpoints, rps, duration, users, items, warmup=0, seed=0, timeout=30.0):
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=100)
+    async with httpx.AsyncClient(base_url=base_url, timeout=timeout, limits=limits) as client:
+        rng = np.random.default_rng(seed)
+        for endpoint in endpoints:
+            for _ in range(warmup):
+                await send(client, endpoint, build_payload(endpoint, rng, users, items), time.perf_counter())
+
+        results = await asyncio.gather(*[
+            drive_endpoint(client, endpoint, rps, duration, users, items, seed + n + 1)
+            for n, endpoint in enumerate(endpoints)
+        ])
+    return dict(zip(endpoints, results))
+
+# ======================
+# REPORTING
+# ======================
+
+def summarize(results, duration):
+    report = {}
+    for endpoint, samples in results.items():
+        latencies = np.array([latency for latency, _ in samples])
+        ok = np.array([status for _, status in samples], dtype=bool)
+        succeeded = latencies[ok] * 1000
+        p50, p95, p99 = np.percentile(succeeded, [50, 95, 99]) if len(succeeded) else (np.nan,) * 3
+        report[endpoint] = {
+            'requests': len(samples),
+            'errors': int((~ok).sum()),
+            'error_rate': float((~ok).mean()) if len(samples) else 0.0,
+            'throughput_rps': float(ok.sum() / duration),
+            'p50_ms': float(p50),
+            'p95_ms': float(p95),
+            'p99_ms': float(p99)
+        }
+    return report
+
+def compare_to_baseline(report, baseline, tolerance=0.2, error_margin=0.01):
+    regressions = []
+    for endpoint, current in report.items():
+        previous = baseline.get(endpoint)
+        if previous is None:
+            continue
+        for metric in ('p50_ms', 'p95_ms', 'p99_ms'):
+            if current[metric] > previous[metric] * (1 + tolerance):
+                regressions.append(f"{endpoint} {metric}: {previous[metric]:.1f} -> {current[metric]:.1f}")
+        if current['throughput_rps'] < previous['throughput_rps'] * (1 - tolerance):
+            regressions.append(
+                f"{endpoint} throughput_rps: {previous['throughput_rps']:.1f} -> {current['throughput_rps']:.1f}"
+            )
+        if current['error_rate'] > previous['error_rate'] + error_margin:
+            regressions.append(f"{endpoint} error_rate: {previous['error_rate']:.3f} -> {current['error_rate']:.3f}")
+    return regressions
+
+def print_report(report):
+    print(f"{'endpoint':<26}{'reqs':>8}{'err%':>8}{'rps':>9}{'p50':>9}{'p95':>9}{'p99':>9}")
+    for endpoint, stats in report.items():
+        print(
+            f"{endpoint:<26}{stats['requests']:>8}{stats['error_rate'] * 100:>8.2f}"
+            f"{stats['throughput_rps']:>9.1f}{stats['p50_ms']:>9.1f}{stats['p95_ms']:>9.1f}{stats['p99_ms']:>9.1f}"
+        )
+
+# ======================
+# LOCAL SERVER
+# ======================
+
+def start_server(db_path, port):
+    env = dict(
+        os.environ,
+        RECOMMENDATIONS_DB=os.path.abspath(db_path),
+        RECOMMENDATIONS_STATE_DIR=os.path.abspath(db_path) + '.state'
+    )
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', 'session_recommendation_07:app',
+         '--host', '127.0.0.1', '--port', str(port), '--log-level', 'warning'],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        env=env
+    )
+    deadline = time.time() + 120
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError("Recommendation server exited during startup")
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/openapi.json", timeout=1.0)
+            return process
+        except httpx.HTTPError:
+            time.sleep(0.5)
+    process.terminate()
+    raise RuntimeError("Recommendation server did not become ready")
+
+# ======================
+# MAIN EXECUTION
+# ======================
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load test the recommendation API")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    fixture = commands.add_parser('fixture', help="Generate a synthetic recommendations.db")
+    fixture.add_argument('--db', default='loadtest.db')
+    fixture.add_argument('--users', type=int, default=1000)
+    fixture.add_argument('--items', type=int, default=5000)
+    fixture.add_argument('--interactions', type=int, default=100000)
+    fixture.add_argument('--days', type=int, default=14)
+    fixture.add_argument('--seed', type=int, default=0)
+
+    run = commands.add_parser('run', help="Drive the API at a target request rate")
+    run.add_argument('--db', default='loadtest.db')
+    run.add_argument('--url', default=None, help="Target an already running server")
+    run.add_argument('--port', type=int, default=8765)
+    run.add_argument('--endpoints', nargs='+', default=list(ENDPOINTS))
+    run.add_argument('--rps', type=float, default=20.0, help="Target requests per second per endpoint")
+    run.add_argument('--duration', type=float, default=30.0)
+    run.add_argument('--warmup', type=int, default=3)
+    run.add_argument('--seed', type=int, default=0)
+    run.add_argument('--baseline', default=None, help="Compare against a saved report")
+    run.add_argument('--save-baseline', default=None)
+    run.add_argument('--tolerance', type=float, default=0.2)
+
+    args = parser.parse_args(argv)
+
+    if args.command == 'fixture':
+        print(json.dumps(generate_fixture(
+            args.db, users=args.users, items=args.items,
+            interactions=args.interactions, days=args.days, seed=args.seed
+        )))
+        return 0
+
+    users, items = load_fixture_ids(args.db)
+    server = None if args.url else start_server(args.db, args.port)
+    try:
+        results = asyncio.run(run_load(
+            base_url=args.url or f"http://127.0.0.1:{args.port}",
+            endpoints=args.endpoints,
+            rps=args.rps,
+            duration=args.duration,
+            users=users,
+            items=items,
+            warmup=args.warmup,
+            seed=args.seed
+        ))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    report = summarize(results, args.duration)
+    print_report(report)
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare_to_baseline(report, json.load(f), tolerance=args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        return 1 if regressions else 0
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
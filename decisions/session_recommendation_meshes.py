@@ -0,0 +1,277 @@
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+import numpy as np
+
+MAX_MESHLET_TRIANGLES = 126
+DESCRIPTOR_DIM = 256
+SURFACE_SAMPLES = 4096
+
+# ======================
+# MESHLET PACKING
+# ======================
+# Triangles are ordered along a Morton (Z-order) curve of their centroids so
+# that consecutive runs of 126 are spatially compact, then cut into meshlets.
+# Local vertex indices come from one np.unique over (meshlet, vertex) keys
+# for the whole mesh, so nothing loops per triangle or per meshlet.
+#
+# A meshlet set is stored flat, CSR style, matching mesh_input in
+# session_recommendation_11.md:
+#   vertices[vertex_offsets[m]:vertex_offsets[m + 1]]       local vertices
+#   triangles[triangle_offsets[m]:triangle_offsets[m + 1]]  local indices
+
+def _spread_bits(x):
+    # Spaces the low 21 bits of x three apart for 63-bit Morton codes
+    x = x.astype(np.uint64) & np.uint64(0x1fffff)
+    x = (x | x << np.uint64(32)) & np.uint64(0x1f00000000ffff)
+    x = (x | x << np.uint64(16)) & np.uint64(0x1f0000ff0000ff)
+    x = (x | x << np.uint64(8)) & np.uint64(0x100f00f00f00f00f)
+    x = (x | x << np.uint64(4)) & np.uint64(0x10c30c30c30c30c3)
+    x = (x | x << np.uint64(2)) & np.uint64(0x1249249249249249)
+    return x
+
+def morton_codes(points):
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 3)
+    if not len(points):
+        return np.empty(0, dtype=np.uint64)
+    lo = points.min(axis=0)
+    extent = np.maximum(points.max(axis=0) - lo, 1e-12)
+    cells = ((points - lo) / extent * 0x1fffff).astype(np.uint64)
+    return _spread_bits(cells[:, 0]) | _spread_bits(cells[:, 1]) << np.uint64(1) | _spread_bits(cells[:, 2]) << np.uint64(2)
+
+class Meshlets:
+    def __init__(self, vertices, vertex_offsets, triangles, triangle_offsets):
+        self.vertices = vertices
+        self.vertex_offsets = vertex_offsets
+        self.triangles = triangles
+        self.triangle_offsets = triangle_offsets
+
+    def __len__(self):
+        return len(self.triangle_offsets) - 1
+
+    def triangle_meshlets(self):
+        return np.repeat(np.arange(len(self)), np.diff(self.triangle_offsets))
+
+    def corners(self):
+        # (T, 3, 3) triangle corner positions, gathered back from local indices
+        base = self.vertex_offsets[:-1][self.triangle_meshlets()]
+        return self.vertices[self.triangles.astype(np.int64) + base[:, None]]
+
+    def to_arrow(self):
+        # The mesh_input meshlets list: one STRUCT<vertices FLOAT[3][],
+        # triangles INT[3][]> row per meshlet, built from the flat buffers
+        import pyarrow as pa
+        vertices = pa.ListArray.from_arrays(
+            pa.array(self.vertex_offsets.astype(np.int32)),
+            pa.FixedSizeListArray.from_arrays(pa.array(self.vertices.ravel(), type=pa.float32()), 3)
+        )
+        triangles = pa.ListArray.from_arrays(
+            pa.array(self.triangle_offsets.astype(np.int32)),
+            pa.FixedSizeListArray.from_arrays(pa.array(self.triangles.astype(np.int32).ravel()), 3)
+        )
+        return pa.StructArray.from_arrays([vertices, triangles], names=['vertices', 'triangles'])
+
+def build_meshlets(vertices, triangles=None, max_triangles=MAX_MESHLET_TRIANGLES):
+    vertices = np.ascontiguousarray(vertices, dtype=np.float32).reshape(-1, 3)
+    if triangles is None:
+        # Unindexed triangle soup: every three vertices are one triangle
+        triangles = np.arange(len(vertices) - len(vertices) % 3).reshape(-1, 3)
+    triangles = np.ascontiguousarray(triangles, dtype=np.int64).reshape(-1, 3)
+
+    order = np.argsort(morton_codes(vertices[triangles].mean(axis=1)), kind='stable')
+    triangles = triangles[order]
+    meshlet_of = np.arange(len(triangles)) // max_triangles
+    n_meshlets = int(meshlet_of[-1]) + 1 if len(triangles) else 0
+    triangle_offsets = np.minimum(np.arange(n_meshlets + 1) * max_triangles, len(triangles))
+
+    keys = meshlet_of[:, None] * len(vertices) + triangles
+    unique, inverse = np.unique(keys.ravel(), return_inverse=True)
+    unique_meshlets = unique // len(vertices)
+    vertex_offsets = np.searchsorted(unique_meshlets, np.arange(n_meshlets + 1))
+    local = inverse.reshape(-1, 3) - vertex_offsets[meshlet_of][:, None]
+    return Meshlets(
+        vertices[unique % len(vertices)],
+        vertex_offsets,
+        local.astype(np.uint16),
+        triangle_offsets
+    )
+
+# ======================
+# MESH DESCRIPTOR
+# ======================
+# A 256-d, scale- and orientation-normalised shape descriptor:
+#   64  D2 distances between area-sampled surface points
+#   48  A3 angles between triples of surface points
+#   64  face normal directions in the PCA frame (8 azimuth x 8 elevation)
+#   32  meshlet area distribution (log of area relative to the mean)
+#   32  meshlet normal-cone spread
+#   16  global scalars
+# Histograms are area-weighted and normalised per block; the whole vector
+# is L2-normalised so cosine similarity applies directly.
+
+def _histogram(values, bins, lo, hi, weights=None):
+    counts, _ = np.histogram(values, bins=bins, range=(lo, hi), weights=weights)
+    total = counts.sum()
+    return (counts / total if total else counts).astype(np.float32)
+
+def _pca_frame(corners, areas):
+    centroids = corners.mean(axis=1)
+    weights = areas / max(areas.sum(), 1e-12)
+    center = weights @ centroids
+    offset = centroids - center
+    eigenvalues, eigenvectors = np.linalg.eigh((offset * weights[:, None]).T @ offset)
+    eigenvalues, eigenvectors = eigenvalues[::-1], eigenvectors[:, ::-1]
+    # Fix each axis' sign by the third moment so mirrored inputs agree
+    skew = weights @ (offset @ eigenvectors) ** 3
+    eigenvectors = eigenvectors * np.where(skew < 0, -1.0, 1.0)
+    return center, eigenvalues, eigenvectors
+
+def _sample_surface(corners, areas, n, rng):
+    picks = rng.choice(len(corners), size=n, p=areas / areas.sum())
+    r1 = np.sqrt(rng.random(n))[:, None]
+    r2 = rng.random(n)[:, None]
+    a, b, c = corners[picks, 0], corners[picks, 1], corners[picks, 2]
+    return (1 - r1) * a + r1 * (1 - r2) * b + r1 * r2 * c
+
+def mesh_descriptor(meshlets, samples=SURFACE_SAMPLES, seed=0):
+    descriptor = np.zeros(DESCRIPTOR_DIM, dtype=np.float32)
+    if not len(meshlets):
+        return descriptor
+    rng = np.random.default_rng(seed)
+    corners = meshlets.corners().astype(np.float64)
+    cross = np.cross(corners[:, 1] - corners[:, 0], corners[:, 2] - corners[:, 0])
+    doubled = np.linalg.norm(cross, axis=1)
+    areas = doubled / 2
+    valid = doubled > 1e-20
+    if not valid.any():
+        return descriptor
+    normals = cross[valid] / doubled[valid, None]
+
+    center, eigenvalues, axes = _pca_frame(corners[valid], areas[valid])
+    extent = corners.reshape(-1, 3).max(axis=0) - corners.reshape(-1, 3).min(axis=0)
+    diagonal = max(float(np.linalg.norm(extent)), 1e-12)
+
+    # D2 and A3 over area-weighted surface samples
+    points = _sample_surface(corners[valid], areas[valid], samples, rng)
+    pairs = rng.integers(samples, size=(samples, 2))
+    d2 = np.linalg.norm(points[pairs[:, 0]] - points[pairs[:, 1]], axis=1) / diagonal
+    triples = rng.integers(samples, size=(samples, 3))
+    u = points[triples[:, 0]] - points[triples[:, 1]]
+    v = points[triples[:, 2]] - points[triples[:, 1]]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        cosines = np.einsum('ij,ij->i', u, v) / (np.linalg.norm(u, axis=1) * np.linalg.norm(v, axis=1))
+    a3 = np.arccos(np.clip(cosines[np.isfinite(cosines)], -1, 1))
+
+    # Normal directions in the PCA frame
+    local_normals = normals @ axes
+    azimuth = np.arctan2(local_normals[:, 1], local_normals[:, 0])
+    elevation = np.clip(local_normals[:, 2], -1, 1)
+    direction, _, _ = np.histogram2d(
+        azimuth, elevation, bins=(8, 8), range=((-np.pi, np.pi), (-1, 1)), weights=areas[valid]
+    )
+    direction = (direction.ravel() / max(direction.sum(), 1e-12)).astype(np.float32)
+
+    # Per-meshlet area and normal cone spread
+    meshlet_of = meshlets.triangle_meshlets()
+    meshlet_area = np.bincount(meshlet_of, weights=areas, minlength=len(meshlets))
+    weighted = np.stack([
+        np.bincount(meshlet_of[valid], weights=normals[:, axis] * areas[valid], minlength=len(meshlets))
+        for axis in range(3)
+    ], axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        spread = 1 - np.linalg.norm(weighted, axis=1) / meshlet_area
+        log_area = np.log(meshlet_area / meshlet_area.mean())
+    spread = spread[np.isfinite(spread)]
+    log_area = log_area[np.isfinite(log_area)]
+
+    total_area = areas.sum()
+    local_vertices = np.diff(meshlets.vertex_offsets)
+    scalars = np.array([
+        eigenvalues[1] / max(eigenvalues[0], 1e-12),
+        eigenvalues[2] / max(eigenvalues[0], 1e-12),
+        *np.sort(extent)[::-1] / max(extent.max(), 1e-12),
+        np.log10(max(total_area, 1e-12) / diagonal ** 2),
+        np.log10(len(corners) + 1) / 7,
+        np.log10(len(meshlets) + 1) / 5,
+        len(corners) / len(meshlets) / MAX_MESHLET_TRIANGLES,
+        local_vertices.mean() / (3 * MAX_MESHLET_TRIANGLES),
+        1 - valid.mean(),
+        spread.mean() if len(spread) else 0.0,
+        log_area.std() / 4 if len(log_area) else 0.0,
+        d2.mean(),
+        d2.std(),
+        (np.abs(local_normals[:, 2]) * areas[valid]).sum() / total_area
+    ], dtype=np.float32)
+
+    descriptor = np.concatenate([
+        _histogram(d2, 64, 0, 1),
+        _histogram(a3, 48, 0, np.pi),
+        direction,
+        _histogram(log_area, 32, -4, 4),
+        _histogram(spread, 32, 0, 1),
+        scalars
+    ])
+    norm = np.linalg.norm(descriptor)
+    return descriptor / norm if norm else descriptor
+
+def mesh_hash(vertices, triangles):
+    digest = hashlib.sha256(np.ascontiguousarray(vertices, dtype=np.float32).tobytes())
+    if triangles is not None:
+        digest.update(np.ascontiguousarray(triangles, dtype=np.int64).tobytes())
+    return digest.hexdigest()
+
+# ======================
+# BATCH DRIVER
+# ======================
+
+def load_mesh(path):
+    # .npz with a (V, 3) 'vertices' array and an optional (T, 3) 'triangles' array
+    with np.load(path) as data:
+        return data['vertices'], data['triangles'] if 'triangles' in data else None
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Pack meshes into meshlets and compute mesh_embedding")
+    parser.add_argument('inputs', nargs='*', help=".npz meshes named <asset id>.npz")
+    parser.add_argument('--db', default=None, help="Write mesh_embedding into this database")
+    parser.add_argument('--synthetic-triangles', type=int, default=0, help="Time a random triangle soup")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    meshes = []
+    if args.synthetic_triangles:
+        rng = np.random.default_rng(args.seed)
+        meshes.append(('synthetic', rng.random((args.synthetic_triangles * 3, 3), dtype=np.float32), None))
+    meshes.extend((os.path.splitext(os.path.basename(path))[0], *load_mesh(path)) for path in args.inputs)
+
+    ids, vectors, hashes = [], [], []
+    for asset_id, vertices, triangles in meshes:
+        start = time.perf_counter()
+        meshlets = build_meshlets(vertices, triangles)
+        packed = time.perf_counter()
+        vectors.append(mesh_descriptor(meshlets, seed=args.seed))
+        done = time.perf_counter()
+        ids.append(asset_id)
+        hashes.append(mesh_hash(vertices, triangles))
+        print(json.dumps({
+            'asset': asset_id,
+            'triangles': int(meshlets.triangle_offsets[-1]),
+            'meshlets': len(meshlets),
+            'pack_seconds': packed - start,
+            'descriptor_seconds': done - packed
+        }))
+
+    if args.db and ids:
+        import duckdb
+        from session_recommendation_embeddings import write_embeddings
+        conn = duckdb.connect(args.db)
+        try:
+            write_embeddings(conn, 'mesh_embedding', ids, np.stack(vectors), hashes)
+        finally:
+            conn.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,233 @@
+import bisect
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter as Tally
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+COUNT_BUCKETS = (0, 1, 5, 10, 25, 50, 100, 250, 500, 1000, 5000, 10000, 50000)
+
+# ======================
+# PROMETHEUS-TEXT METRICS
+# ======================
+
+def _labels(labelnames, values):
+    if not labelnames:
+        return ''
+    pairs = ','.join(f'{name}="{value}"' for name, value in zip(labelnames, values))
+    return '{' + pairs + '}'
+
+class Histogram:
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self.series = {}
+        self.lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self.lock:
+            counts, total = self.series.get(key, ([0] * (len(self.buckets) + 1), 0.0))
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            self.series[key] = (counts, total + value)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            series = {key: (list(counts), total) for key, (counts, total) in self.series.items()}
+        for key, (counts, total) in sorted(series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                label_str = _labels(self.labelnames + ('le',), key + (le,))
+                lines.append(f"{self.name}_bucket{label_str} {cumulative}")
+            label_str = _labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{label_str} {total}")
+            lines.append(f"{self.name}_count{label_str} {cumulative}")
+        return lines
+
+class Counter:
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.series = Tally()
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self.lock:
+            self.series[key] += amount
+
+    def value(self, **labels):
+        return self.series[tuple(str(labels[name]) for name in self.labelnames)]
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self.lock:
+            series = dict(self.series)
+        for key, value in sorted(series.items()):
+            lines.append(f"{self.name}{_labels(self.labelnames, key)} {value}")
+        return lines
+
+class CacheRatio:
+    # Gauge derived from a hit/miss counter at render time
+    def __init__(self, name, documentation, counter):
+        self.name = name
+        self.documentation = documentation
+        self.counter = counter
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} gauge"]
+        caches = sorted({key[0] for key in self.counter.series})
+        for cache in caches:
+            hits = self.counter.value(cache=cache, result='hit')
+            misses = self.counter.value(cache=cache, result='miss')
+            ratio = hits / (hits + misses) if hits + misses else 0.0
+            lines.append(f'{self.name}{{cache="{cache}"}} {ratio}')
+        return lines
+
+class MetricsRegistry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+registry = MetricsRegistry()
+
+request_seconds = registry.register(Histogram(
+    'recommendation_request_seconds', "End-to-end request latency.", ('endpoint',)
+))
+stage_seconds = registry.register(Histogram(
+    'recommendation_stage_seconds', "Latency of each serving stage.", ('endpoint', 'stage')
+))
+candidate_count = registry.register(Histogram(
+    'recommendation_candidates', "Candidates produced by each scoring source.",
+    ('source',), buckets=COUNT_BUCKETS
+))
+cache_requests = registry.register(Counter(
+    'recommendation_cache_requests_total', "Cache lookups by outcome.", ('cache', 'result')
+))
+cache_hit_ratio = registry.register(CacheRatio(
+    'recommendation_cache_hit_ratio', "Share of cache lookups that hit.", cache_requests
+))
+
+# ======================
+# REQUEST TRACING
+# ======================
+
+class RequestTrace:
+    def __init__(self, endpoint):
+        self.endpoint = endpoint
+        self.started = time.perf_counter()
+        self.stages = {}
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.stages[name] = self.stages.get(name, 0.0) + elapsed
+            stage_seconds.observe(elapsed, endpoint=self.endpoint, stage=name)
+
+    def candidates(self, source, count):
+        candidate_count.observe(count, source=source)
+
+    def finish(self):
+        elapsed = time.perf_counter() - self.started
+        request_seconds.observe(elapsed, endpoint=self.endpoint)
+        return elapsed
+
+    def timings_ms(self):
+        return {name: round(seconds * 1000, 3) for name, seconds in self.stages.items()}
+
+def record_cache(cache, hit):
+    cache_requests.inc(cache=cache, result='hit' if hit else 'miss')
+
+# ======================
+# SLOW-REQUEST SAMPLING PROFILER
+# ======================
+# Opt-in via RECOMMENDATIONS_PROFILE_SLOW_MS. A daemon thread samples the
+# stack of every in-flight request at a fixed interval; stacks are only
+# reported when the request ends up slower than the threshold.
+
+class SlowRequestProfiler:
+    def __init__(self, threshold_ms, interval=0.005, top=20):
+        self.threshold = threshold_ms / 1000
+        self.interval = interval
+        self.top = top
+        self.active = {}
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.run, name='slow-request-profiler', daemon=True)
+            self.thread.start()
+
+    def run(self):
+        while True:
+            time.sleep(self.interval)
+            with self.lock:
+                active = list(self.active.values())
+            if not active:
+                continue
+            frames = sys._current_frames()
+            for thread_id, samples in active:
+                frame = frames.get(thread_id)
+                if frame is not None:
+                    samples[_collapse(frame)] += 1
+
+    @contextmanager
+    def profile(self, label):
+        self.start()
+        token = object()
+        samples = Tally()
+        start = time.perf_counter()
+        with self.lock:
+            self.active[token] = (threading.get_ident(), samples)
+        try:
+            yield
+        finally:
+            with self.lock:
+                del self.active[token]
+            elapsed = time.perf_counter() - start
+            if elapsed >= self.threshold and samples:
+                report = '\n'.join(
+                    f"  {count:>5} {stack}" for stack, count in samples.most_common(self.top)
+                )
+                logger.warning("Slow request %s took %.1f ms; sampled stacks:\n%s",
+                               label, elapsed * 1000, report)
+
+def _collapse(frame):
+    stack = []
+    while frame is not None:
+        code = frame.f_code
+        stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}:{frame.f_lineno}")
+        frame = frame.f_back
+    return ';'.join(reversed(stack))
+
+@contextmanager
+def _no_profile(label):
+    yield
+
+_threshold = os.environ.get('RECOMMENDATIONS_PROFILE_SLOW_MS')
+profile_slow_requests = SlowRequestProfiler(float(_threshold)).profile if _threshold else _no_profile
@@ -0,0 +1,284 @@
+import argparse
+import datetime
+import json
+import os
+import sys
+import threading
+import uuid
+import duckdb
+
+PARTITIONED_TABLES = ('sessions', 'session_assets')
+COMPACT_MIN_FILES = 4
+COMPACT_TARGET_BYTES = 128 * 1024 * 1024
+SESSION_LOOKBACK_DAYS = 7
+
+# Typed empty relations for scans that match no partition
+EMPTY_SCANS = {
+    'sessions': "(SELECT NULL::UUID AS id, NULL::UUID AS user_id, NULL::TIMESTAMP AS start_time, "
+                "NULL::INTERVAL AS duration, NULL::UUID[] AS modified_assets, NULL::VARCHAR AS day LIMIT 0)",
+    'session_assets': "(SELECT NULL::UUID AS session_id, NULL::UUID AS asset_id, NULL::INT AS usage_count, "
+                      "NULL::VARCHAR[] AS node_paths, NULL::TIMESTAMP AS added_at, NULL::VARCHAR AS day LIMIT 0)"
+}
+HIVE_OPTIONS = "hive_partitioning = true, hive_types = {'day': VARCHAR}"
+
+# ======================
+# DAY-PARTITIONED SESSION STORAGE
+# ======================
+# sessions and session_assets are written as Hive-partitioned Parquet:
+#
+#   <root>/sessions/day=2025-03-01/part-<uuid>.parquet
+#   <root>/session_assets/day=2025-03-01/part-<uuid>.parquet
+#   <root>/<table>/_manifest.json    files, rows, bytes and time range per day
+#
+# session_assets rows take the day of their session's start_time. Readers
+# list files from the manifest rather than globbing, so a compaction swaps
+# a partition's files atomically (new file first, then the manifest, then
+# the old files are unlinked) and a time-range query only opens the
+# partitions it overlaps.
+
+class PartitionedStore:
+    def __init__(self, root):
+        self.root = root
+        self.lock = threading.Lock()
+        for table in PARTITIONED_TABLES:
+            os.makedirs(os.path.join(root, table), exist_ok=True)
+
+    # ======================
+    # MANIFEST
+    # ======================
+
+    def manifest_path(self, table):
+        return os.path.join(self.root, table, '_manifest.json')
+
+    def manifest(self, table):
+        try:
+            with open(self.manifest_path(table)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def write_manifest(self, table, manifest):
+        path = self.manifest_path(table)
+        with open(path + '.tmp', 'w') as f:
+            json.dump(manifest, f, indent=1, sort_keys=True)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(path + '.tmp', path)
+
+    def _partition_files(self, table):
+        files = set()
+        table_root = os.path.join(self.root, table)
+        for entry in os.listdir(table_root):
+            if entry.startswith('day='):
+                for name in os.listdir(os.path.join(table_root, entry)):
+                    if name.endswith('.parquet'):
+                        files.add(os.path.join(entry, name))
+        return files
+
+    def _refresh(self, conn, table, manifest, days):
+        # Recomputes statistics for the given partitions from their files
+        for day in days:
+            entry = manifest.get(day)
+            if not entry or not entry['files']:
+                manifest.pop(day, None)
+                continue
+            paths = [os.path.join(self.root, table, name) for name in entry['files']]
+            time_column = 'start_time' if table == 'sessions' else None
+            rows, lo, hi = conn.execute(f"""
+                SELECT COUNT(*), {f'MIN({time_column}), MAX({time_column})' if time_column else 'NULL, NULL'}
+                FROM read_parquet($paths)
+            """, parameters={'paths': paths}).fetchone()
+            entry.update(
+                rows=rows,
+                bytes=sum(os.path.getsize(path) for path in paths),
+                min_time=None if lo is None else lo.isoformat(),
+                max_time=None if hi is None else hi.isoformat()
+            )
+
+    # ======================
+    # WRITES
+    # ======================
+
+    def append(self, conn, table, query, params=None):
+        # query yields rows of the table plus a 'day' VARCHAR column
+        with self.lock:
+            before = self._partition_files(table)
+            copy = f"""
+                COPY ({query}) TO '{os.path.join(self.root, table)}'
+                (FORMAT PARQUET, PARTITION_BY (day), FILENAME_PATTERN 'part-{{uuid}}', OVERWRITE_OR_IGNORE)
+            """
+            if params is None:
+                conn.execute(copy)
+            else:
+                conn.execute(copy, parameters=params)
+            added = sorted(self._partition_files(table) - before)
+
+            manifest = self.manifest(table)
+            days = set()
+            for name in added:
+                day = name.split(os.sep, 1)[0][len('day='):]
+                manifest.setdefault(day, {'files': []})['files'].append(name)
+                days.add(day)
+            self._refresh(conn, table, manifest, days)
+            self.write_manifest(table, manifest)
+            return len(added)
+
+    def append_sessions(self, conn, sessions, session_assets=None):
+        # sessions / session_assets name a table, view or registered frame
+        # holding one batch in the schema's column layout
+        self.append(conn, 'sessions', f"""
+            SELECT *, strftime(start_time, '%Y-%m-%d') AS day FROM {sessions}
+        """)
+        if session_assets is None:
+            return
+        # Rows take their session's start day. Sessions of earlier batches are
+        # looked up in recent partitions first, and older partitions are read
+        # only when some session is still missing; rows whose session was
+        # never written take today's partition
+        lookback = datetime.datetime.now() - datetime.timedelta(days=SESSION_LOOKBACK_DAYS)
+        lookups = [
+            f"SELECT id, strftime(start_time, '%Y-%m-%d') AS day FROM {sessions}",
+            f"SELECT id, day FROM {self.scan('sessions', lookback)}"
+        ]
+        missing = conn.execute(f"""
+            SELECT COUNT(*) FROM {session_assets} sa
+            ANTI JOIN ({' UNION ALL '.join(lookups)}) k ON k.id = sa.session_id
+        """).fetchone()[0]
+        if missing:
+            lookups.append(f"SELECT id, day FROM {self.scan('sessions', None, lookback)}")
+        self.append(conn, 'session_assets', f"""
+            WITH known AS ({' UNION ALL '.join(lookups)})
+            SELECT sa.*, COALESCE(k.day, strftime(CURRENT_DATE, '%Y-%m-%d')) AS day
+            FROM {session_assets} sa
+            LEFT JOIN (SELECT DISTINCT ON (id) id, day FROM known) k ON k.id = sa.session_id
+        """)
+
+    # ======================
+    # COMPACTION
+    # ======================
+
+    def compact(self, conn, table, min_files=COMPACT_MIN_FILES, target_bytes=COMPACT_TARGET_BYTES):
+        with self.lock:
+            manifest = self.manifest(table)
+            compacted = []
+            for day, entry in sorted(manifest.items()):
+                small = [name for name in entry['files']
+                         if os.path.getsize(os.path.join(self.root, table, name)) < target_bytes]
+                if len(small) < min_files:
+                    continue
+                name = os.path.join(f"day={day}", f"compact-{uuid.uuid4()}.parquet")
+                target = os.path.join(self.root, table, name)
+                paths = [os.path.join(self.root, table, small_name) for small_name in small]
+                order = ' ORDER BY start_time' if table == 'sessions' else ''
+                conn.execute(f"""
+                    COPY (SELECT * EXCLUDE (day) FROM read_parquet($paths, {HIVE_OPTIONS}){order})
+                    TO '{target}.tmp' (FORMAT PARQUET)
+                """, parameters={'paths': paths})
+                os.replace(target + '.tmp', target)
+                entry['files'] = [f for f in entry['files'] if f not in small] + [name]
+                compacted.append((day, paths))
+            if not compacted:
+                return 0
+            self._refresh(conn, table, manifest, [day for day, _ in compacted])
+            self.write_manifest(table, manifest)
+            # Old files go only once the manifest no longer lists them
+            for _, paths in compacted:
+                for path in paths:
+                    os.remove(path)
+            return len(compacted)
+
+    # ======================
+    # PRUNED READS
+    # ======================
+
+    def files(self, table, start=None, end=None):
+        # Partitions overlapping [start, end); start/end are dates or datetimes
+        lo = None if start is None else _day(start)
+        hi = None if end is None else _day(end)
+        names = []
+        for day, entry in sorted(self.manifest(table).items()):
+            if (lo is None or day >= lo) and (hi is None or day <= hi):
+                names.extend(entry['files'])
+        return [os.path.join(self.root, table, name) for name in names]
+
+    def scan(self, table, start=None, end=None):
+        # SQL table expression over the pruned partitions, plus an exact time
+        # filter for sessions
+        paths = self.files(table, start, end)
+        if not paths:
+            return EMPTY_SCANS[table]
+        listing = ', '.join(f"'{path}'" for path in paths)
+        expression = f"read_parquet([{listing}], {HIVE_OPTIONS})"
+        if table == 'sessions' and (start is not None or end is not None):
+            bounds = []
+            if start is not None:
+                bounds.append(f"start_time >= TIMESTAMP '{_timestamp(start)}'")
+            if end is not None:
+                bounds.append(f"start_time < TIMESTAMP '{_timestamp(end)}'")
+            expression = f"(SELECT * FROM {expression} WHERE {' AND '.join(bounds)})"
+        return expression
+
+    def register_window(self, conn, start=None, end=None):
+        # Temp views sessions_window / session_assets_window for time-windowed
+        # queries (hours_since_use, trends, incremental graph updates)
+        conn.execute(f"CREATE OR REPLACE TEMP VIEW sessions_window AS SELECT * FROM {self.scan('sessions', start, end)}")
+        conn.execute(f"""
+            CREATE OR REPLACE TEMP VIEW session_assets_window AS
+            SELECT sa.* FROM {self.scan('session_assets', start, end)} sa
+            SEMI JOIN sessions_window s ON s.id = sa.session_id
+        """)
+
+def _day(value):
+    return value.strftime('%Y-%m-%d')
+
+def _timestamp(value):
+    return value.isoformat(sep=' ') if isinstance(value, datetime.datetime) else f"{value.isoformat()} 00:00:00"
+
+# ======================
+# MAIN EXECUTION
+# ======================
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Day-partitioned Parquet storage for sessions")
+    parser.add_argument('--root', default='sessions_store')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    append = commands.add_parser('append', help="Append a batch of sessions (and session_assets)")
+    append.add_argument('--sessions', required=True, help="Parquet file of sessions rows")
+    append.add_argument('--session-assets', default=None, help="Parquet file of session_assets rows")
+
+    compact = commands.add_parser('compact', help="Merge small files per partition")
+    compact.add_argument('--min-files', type=int, default=COMPACT_MIN_FILES)
+
+    commands.add_parser('stats', help="Print partition statistics")
+
+    query = commands.add_parser('query', help="Run SQL over sessions_window / session_assets_window")
+    query.add_argument('--hours', type=float, default=24)
+    query.add_argument('sql')
+
+    args = parser.parse_args(argv)
+    store = PartitionedStore(args.root)
+    conn = duckdb.connect()
+    try:
+        if args.command == 'append':
+            conn.execute(f"CREATE TEMP VIEW batch_sessions AS SELECT * FROM read_parquet('{args.sessions}')")
+            assets = None
+            if args.session_assets:
+                conn.execute(f"CREATE TEMP VIEW batch_assets AS SELECT * FROM read_parquet('{args.session_assets}')")
+                assets = 'batch_assets'
+            store.append_sessions(conn, 'batch_sessions', assets)
+        elif args.command == 'compact':
+            for table in PARTITIONED_TABLES:
+                print(json.dumps({'table': table, 'compacted': store.compact(conn, table, args.min_files)}))
+        elif args.command == 'stats':
+            print(json.dumps({table: store.manifest(table) for table in PARTITIONED_TABLES}, indent=2))
+        else:
+            end = datetime.datetime.now()
+            store.register_window(conn, end - datetime.timedelta(hours=args.hours), None)
+            print(conn.execute(args.sql).fetchdf().to_string())
+    finally:
+        conn.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
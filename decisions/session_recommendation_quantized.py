@@ -0,0 +1,205 @@
+import argparse
+import json
+import os
+import sys
+import time
+import numpy as np
+from session_recommendation_ann import MODALITIES, normalize, top_k
+
+RERANK_CANDIDATES = 300
+SCORE_CHUNK = 65536
+
+# ======================
+# CODECS
+# ======================
+# float16 halves the footprint with negligible error. int8 stores one byte
+# per value with a per-dimension offset and step, and scores asymmetrically:
+#   q . x ~= q . lo + (q * step) . code
+# so queries stay float32 and codes are never decoded in full.
+
+class Float16Codec:
+    name = 'float16'
+
+    def __init__(self, params=None):
+        pass
+
+    @classmethod
+    def fit(cls, vectors):
+        return cls()
+
+    def encode(self, vectors):
+        return np.asarray(vectors, dtype=np.float16)
+
+    def score(self, codes, query):
+        return codes.astype(np.float32) @ query
+
+    def params(self):
+        return {}
+
+class Int8Codec:
+    name = 'int8'
+
+    def __init__(self, params):
+        self.lo = params['lo']
+        self.step = params['step']
+
+    @classmethod
+    def fit(cls, vectors):
+        lo = vectors.min(axis=0)
+        step = (vectors.max(axis=0) - lo) / 255.0
+        step[step == 0] = 1.0
+        return cls({'lo': lo.astype(np.float32), 'step': step.astype(np.float32)})
+
+    def encode(self, vectors):
+        codes = np.rint((np.asarray(vectors, dtype=np.float32) - self.lo) / self.step)
+        return np.clip(codes, 0, 255).astype(np.uint8)
+
+    def score(self, codes, query):
+        return codes.astype(np.float32) @ (query * self.step) + float(query @ self.lo)
+
+    def params(self):
+        return {'lo': self.lo, 'step': self.step}
+
+CODECS = {codec.name: codec for codec in (Float16Codec, Int8Codec)}
+
+# ======================
+# QUANTIZED STORE
+# ======================
+# Codes stay resident; the float32 originals are only touched for the final
+# re-rank of a few hundred candidates, so on disk they can stay memory-mapped.
+
+class QuantizedStore:
+    def __init__(self, ids, codes, codec, full=None):
+        self.ids = np.asarray(ids, dtype=object)
+        self.codes = codes
+        self.codec = codec
+        self.full = full
+
+    @classmethod
+    def build(cls, ids, vectors, encoding='int8', keep_full=True):
+        vectors = normalize(vectors)
+        codec = CODECS[encoding].fit(vectors)
+        return cls(ids, codec.encode(vectors), codec, vectors if keep_full else None)
+
+    def __len__(self):
+        return len(self.codes)
+
+    def nbytes(self):
+        return self.codes.nbytes
+
+    def approximate_scores(self, query, rows=None):
+        codes = self.codes if rows is None else self.codes[rows]
+        return np.concatenate([
+            self.codec.score(codes[start:start + SCORE_CHUNK], query)
+            for start in range(0, len(codes), SCORE_CHUNK)
+        ]) if len(codes) else np.empty(0, dtype=np.float32)
+
+    def search(self, queries, k=10, rerank=RERANK_CANDIDATES, rows=None):
+        # rows optionally restricts scoring to candidate rows (e.g. an ANN probe)
+        queries = normalize(np.atleast_2d(queries))
+        rows = None if rows is None else np.asarray(rows, dtype=np.int64)
+        results = []
+        two_pass = self.full is not None and rerank > 0
+        for query in queries:
+            scores = self.approximate_scores(query, rows)
+            shortlist = top_k(scores, max(k, rerank) if two_pass else k)
+            candidates = shortlist if rows is None else rows[shortlist]
+            if two_pass:
+                # Second pass: exact scores for the shortlist only, read in
+                # row order from the (possibly memory-mapped) originals
+                candidates = np.sort(candidates)
+                candidate_scores = self.full[candidates] @ query
+            else:
+                candidate_scores = scores[shortlist]
+            top = top_k(candidate_scores, k)
+            results.append((self.ids[candidates[top]], candidate_scores[top]))
+        return results
+
+    def save(self, path):
+        os.makedirs(path, exist_ok=True)
+        arrays = dict(self.codec.params(), codes=self.codes, ids=self.ids.astype(str))
+        if self.full is not None:
+            arrays['full'] = self.full
+        for name, array in arrays.items():
+            np.save(os.path.join(path, f"{name}.npy"), np.ascontiguousarray(array))
+        with open(os.path.join(path, 'store.json'), 'w') as f:
+            json.dump({'encoding': self.codec.name}, f)
+
+    @classmethod
+    def load(cls, path):
+        with open(os.path.join(path, 'store.json')) as f:
+            meta = json.load(f)
+        array = lambda name: np.load(os.path.join(path, f"{name}.npy"))
+        codec_cls = CODECS[meta['encoding']]
+        params = {name: array(name) for name in ('lo', 'step') if os.path.exists(os.path.join(path, f"{name}.npy"))}
+        full_path = os.path.join(path, 'full.npy')
+        full = np.load(full_path, mmap_mode='r') if os.path.exists(full_path) else None
+        return cls(array('ids').astype(object), array('codes'), codec_cls(params), full)
+
+# ======================
+# BENCHMARK
+# ======================
+# Per modality and encoding: resident bytes per vector, queries per second
+# and recall@k against exact float32 search, with and without the re-rank.
+
+def benchmark(vectors, queries, k=10, rerank=RERANK_CANDIDATES, encodings=tuple(CODECS)):
+    vectors = normalize(vectors)
+    queries = normalize(queries)
+    ids = np.arange(len(vectors))
+    truth = [set(top_k(vectors @ query, k).tolist()) for query in queries]
+    report = [{'encoding': 'float32', 'bytes_per_vector': vectors.nbytes / len(vectors)}]
+    for encoding in encodings:
+        store = QuantizedStore.build(ids, vectors, encoding)
+        for stage, stage_rerank in (('quantized', 0), ('reranked', rerank)):
+            start = time.perf_counter()
+            found = store.search(queries, k, rerank=stage_rerank)
+            elapsed = time.perf_counter() - start
+            hits = sum(len(truth_set & set(got.tolist())) for truth_set, (got, _) in zip(truth, found))
+            report.append({
+                'encoding': encoding,
+                'stage': stage,
+                'bytes_per_vector': store.nbytes() / len(store),
+                'queries_per_second': len(queries) / elapsed,
+                'recall': hits / max(sum(len(t) for t in truth), 1)
+            })
+    return report
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark quantized asset embedding storage")
+    parser.add_argument('--db', default=None, help="DuckDB database with an assets table")
+    parser.add_argument('--synthetic', type=int, default=0, help="Benchmark N random vectors instead")
+    parser.add_argument('--modalities', nargs='+', default=list(MODALITIES))
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--rerank', type=int, default=RERANK_CANDIDATES)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    rng = np.random.default_rng(args.seed)
+    conn = None
+    if not args.synthetic:
+        import duckdb
+        conn = duckdb.connect(args.db, read_only=True)
+    try:
+        for modality in args.modalities:
+            dim = MODALITIES[modality]
+            if conn is None:
+                vectors = rng.standard_normal((args.synthetic, dim), dtype=np.float32)
+            else:
+                table = conn.execute(f"""
+                    SELECT {modality} AS embedding FROM assets WHERE {modality} IS NOT NULL
+                """).fetch_arrow_table()
+                if not table.num_rows:
+                    continue
+                vectors = table['embedding'].combine_chunks().flatten().to_numpy().reshape(-1, dim)
+            queries = vectors[rng.choice(len(vectors), min(args.queries, len(vectors)), replace=False)]
+            queries = queries + rng.normal(0, 0.05, queries.shape).astype(np.float32)
+            for row in benchmark(vectors, queries, args.k, args.rerank):
+                print(json.dumps(dict(row, modality=modality, items=len(vectors))))
+    finally:
+        if conn is not None:
+            conn.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
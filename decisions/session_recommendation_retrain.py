@@ -0,0 +1,301 @@
+import argparse
+import datetime
+import json
+import os
+import shutil
+import sys
+import time
+import duckdb
+import numpy as np
+import pandas as pd
+from session_recommendation_sampling import NegativeSampler, dense_codes
+
+# Model of RecommendationSystem.prepare_model (session_recommendation_07.py)
+# (labelled frames carry their own negatives, hence cross_entropy)
+PINSAGE_PARAMS = dict(task="ranking", loss_type="cross_entropy", embed_size=64, n_epochs=10,
+                      num_walks=10, sample_walk_len=5)
+INCREMENTAL_EPOCHS = 2
+REPLAY_RATIO = 0.5
+FULL_RETRAIN_EVERY = 24
+HOLDOUT_FRACTION = 0.05
+RECALL_K = 10
+QUALITY_TOLERANCE = 0.05
+MODEL_NAME = 'pinsage'
+
+# ======================
+# TRAINING FRAMES
+# ======================
+# Positives are interactions; each gets one negative from the shared
+# sampler (popularity^alpha over the item catalogue, never one of the
+# user's positives in the same frame).
+
+def labelled_frame(interactions, catalogue, alpha=0.75, seed=0):
+    users, user_codes = dense_codes(interactions['userid'].to_numpy())
+    item_codes = np.searchsorted(catalogue, interactions['itemid'].to_numpy())
+    sampler = NegativeSampler(user_codes, item_codes, len(catalogue), alpha=alpha)
+    groups, items = sampler.sample(user_codes, num_neg=1, seed=seed)
+    return pd.concat([
+        pd.DataFrame({'user': interactions['userid'], 'item': interactions['itemid'], 'label': 1}),
+        pd.DataFrame({'user': users[groups], 'item': catalogue[items], 'label': 0})
+    ], ignore_index=True)
+
+def read_interactions(conn, after=None):
+    # Every interaction, or those with ingest_seq past a watermark. Rows
+    # from before ingest_seq existed have it NULL: a full read keeps them,
+    # and the database sequence numbers every row inserted since
+    window = "" if after is None else "WHERE ingest_seq > $after"
+    return conn.execute(f"""
+        SELECT userid::VARCHAR AS userid, itemid::VARCHAR AS itemid, timestamp, ingest_seq
+        FROM interactions
+        {window}
+    """, parameters={} if after is None else {'after': after}).fetchdf()
+
+def trained_watermark(train, holdout, fallback=0):
+    # Highest ingest_seq with every row at or below it trained on. Held-out
+    # rows stay past it, so the next refresh trains on them
+    seqs = train['ingest_seq'].dropna()
+    if seqs.empty:
+        return fallback
+    watermark = int(seqs.max())
+    held = holdout['ingest_seq'].dropna()
+    if not held.empty:
+        watermark = min(watermark, int(held.min()) - 1)
+    return max(watermark, fallback)
+
+def replay_sample(conn, upto, rows, seed=0):
+    # Uniform sample of interactions up to the watermark (and the unnumbered
+    # older rows), so fine-tuning keeps seeing the long-term history
+    return conn.execute(f"""
+        SELECT * FROM (
+          SELECT userid::VARCHAR AS userid, itemid::VARCHAR AS itemid, timestamp, ingest_seq
+          FROM interactions
+          WHERE ingest_seq <= $upto OR ingest_seq IS NULL
+        ) USING SAMPLE reservoir({int(rows)} ROWS) REPEATABLE ({int(seed)})
+    """, parameters={'upto': upto}).fetchdf()
+
+def catalogue_ids(conn):
+    # Negatives come from the item catalogue plus anything interacted with
+    return conn.execute("""
+        SELECT itemid::VARCHAR AS itemid FROM items
+        UNION
+        SELECT itemid::VARCHAR FROM interactions
+        ORDER BY 1
+    """).fetchnumpy()['itemid']
+
+def split_holdout(interactions, fraction=HOLDOUT_FRACTION):
+    # The most recent interactions are held out for the quality check
+    if not fraction or interactions.empty:
+        return interactions, interactions.iloc[:0]
+    cutoff = interactions['timestamp'].quantile(1 - fraction)
+    recent = interactions['timestamp'] > cutoff
+    return interactions[~recent], interactions[recent]
+
+def known_users(model):
+    return set(str(user) for user in model.data_info.user2id)
+
+def recall_at_k(model, holdout, k=RECALL_K):
+    # Share of held-out (user, item) pairs found in the user's top k
+    holdout = holdout[holdout['userid'].isin(known_users(model))]
+    if holdout.empty:
+        return None
+    users = holdout['userid'].unique().tolist()
+    recommended = model.recommend_user(user=users, n_rec=k, filter_consumed=True)
+    top = {str(user): set(str(item) for item in items) for user, items in recommended.items()}
+    hits = [item in top.get(user, ()) for user, item in zip(holdout['userid'], holdout['itemid'])]
+    return float(np.mean(hits))
+
+# ======================
+# VERSIONED MODEL STORE
+# ======================
+# Each fit is saved with its DataInfo under its own directory:
+#
+#   <root>/m-20250301T120000000000/   libreco files for data_info and model
+#   <root>/m-20250301T120000000000/version.json
+#       kind (full / incremental), parent, watermark (every row up to this
+#       ingest_seq was trained on), recall on the recent holdout, accepted
+#   <root>/CURRENT                    last accepted version
+#
+# An incremental version loads the previous DataInfo, extends its user and
+# item mappings with merge_trainset, rebuilds the model with the previous
+# weights copied in (rebuild_model) and fine-tunes on the interactions
+# since the previous watermark plus a replay sample of older ones. It is
+# accepted only if its recall on the most recent new interactions is within
+# QUALITY_TOLERANCE of the last full retrain's on the same rows; otherwise,
+# and every FULL_RETRAIN_EVERY versions, a full retrain resets the baseline.
+
+class ModelStore:
+    def __init__(self, root):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def meta(self, version):
+        with open(os.path.join(self.root, version, 'version.json')) as f:
+            return json.load(f)
+
+    def current(self):
+        try:
+            with open(os.path.join(self.root, 'CURRENT')) as f:
+                return self.meta(f.read().strip())
+        except FileNotFoundError:
+            return None
+
+    def baseline(self, meta):
+        # Nearest full retrain up the parent chain
+        while meta is not None and meta['kind'] != 'full':
+            meta = self.meta(meta['parent']) if meta['parent'] else None
+        return meta
+
+    def load(self, version):
+        from libreco.algorithms import PinSage
+        from libreco.data import DataInfo
+
+        path = os.path.join(self.root, version)
+        data_info = DataInfo.load(path, model_name=MODEL_NAME)
+        return PinSage.load(path, model_name=MODEL_NAME, data_info=data_info)
+
+    def _save(self, model, meta):
+        version = f"m-{datetime.datetime.now():%Y%m%dT%H%M%S%f}"
+        staging = os.path.join(self.root, f".{version}.tmp")
+        shutil.rmtree(staging, ignore_errors=True)
+        os.makedirs(staging)
+        # The embeddings load() serves from, plus the torch state dict the
+        # next version's rebuild_model() starts from
+        model.data_info.save(path=staging, model_name=MODEL_NAME)
+        model.save(path=staging, model_name=MODEL_NAME, inference_only=True)
+        model.save(path=staging, model_name=MODEL_NAME, inference_only=False)
+        meta = dict(meta, version=version, saved_at=time.time())
+        with open(os.path.join(staging, 'version.json'), 'w') as f:
+            json.dump(meta, f, indent=2)
+        os.rename(staging, os.path.join(self.root, version))
+        if meta['accepted']:
+            pointer = os.path.join(self.root, 'CURRENT.tmp')
+            with open(pointer, 'w') as f:
+                f.write(version)
+            os.replace(pointer, os.path.join(self.root, 'CURRENT'))
+        return meta
+
+    # ======================
+    # TRAINING
+    # ======================
+
+    def train_full(self, conn, seed=0, holdout_fraction=HOLDOUT_FRACTION):
+        from libreco.algorithms import PinSage
+        from libreco.data import DatasetPure
+
+        start = time.perf_counter()
+        train, holdout = split_holdout(read_interactions(conn), holdout_fraction)
+        train_data, data_info = DatasetPure.build_trainset(labelled_frame(train, catalogue_ids(conn), seed=seed))
+        model = PinSage(data_info=data_info, **PINSAGE_PARAMS)
+        model.fit(train_data, neg_sampling=False)
+        meta = self._save(model, {
+            'kind': 'full',
+            'parent': None,
+            'watermark': trained_watermark(train, holdout),
+            'trained_rows': len(train),
+            'recall': recall_at_k(model, holdout),
+            'seconds': time.perf_counter() - start,
+            'accepted': True,
+            'incremental_since_full': 0
+        })
+        return model, meta
+
+    def train_incremental(self, conn, parent, replay_ratio=REPLAY_RATIO, epochs=INCREMENTAL_EPOCHS,
+                          seed=0, holdout_fraction=HOLDOUT_FRACTION):
+        from libreco.algorithms import PinSage
+        from libreco.data import DataInfo, DatasetPure
+
+        start = time.perf_counter()
+        fresh = read_interactions(conn, after=parent['watermark'])
+        train, holdout = split_holdout(fresh, holdout_fraction)
+        if train.empty:
+            return None, parent
+        replay_rows = int(len(train) * replay_ratio)
+        replayed = replay_sample(conn, parent['watermark'], replay_rows, seed) if replay_rows else train.iloc[:0]
+        frame = labelled_frame(pd.concat([train, replayed], ignore_index=True), catalogue_ids(conn), seed=seed)
+
+        path = os.path.join(self.root, parent['version'])
+        previous_info = DataInfo.load(path, model_name=MODEL_NAME)
+        train_data, data_info = DatasetPure.merge_trainset(frame, previous_info, merge_behavior=True)
+        model = PinSage(data_info=data_info, **dict(PINSAGE_PARAMS, n_epochs=epochs))
+        # Copies every trained variable; rows for new users/items start fresh
+        model.rebuild_model(path=path, model_name=MODEL_NAME)
+        model.fit(train_data, neg_sampling=False)
+
+        # Both models are scored on the same recent holdout, restricted to
+        # users the baseline knows so new users do not skew the comparison
+        baseline = self.baseline(parent)
+        reference = None
+        if baseline is not None:
+            baseline_model = self.load(baseline['version'])
+            holdout = holdout[holdout['userid'].isin(known_users(baseline_model))]
+            reference = recall_at_k(baseline_model, holdout)
+        recall = recall_at_k(model, holdout)
+        accepted = recall is None or reference is None or recall >= reference * (1 - QUALITY_TOLERANCE)
+        meta = self._save(model, {
+            'kind': 'incremental',
+            'parent': parent['version'],
+            'watermark': trained_watermark(train, holdout, parent['watermark']),
+            'trained_rows': len(train),
+            'replayed_rows': len(replayed),
+            'recall': recall,
+            'baseline': baseline['version'] if baseline else None,
+            'baseline_recall': reference,
+            'seconds': time.perf_counter() - start,
+            'accepted': accepted,
+            'incremental_since_full': parent.get('incremental_since_full', 0) + 1
+        })
+        return model, meta
+
+    def refresh(self, conn, full=False, **options):
+        # Incremental on top of CURRENT; full on first run, on request, or
+        # when the chain of incremental versions is due for a new baseline
+        parent = self.current()
+        if full or parent is None or parent.get('incremental_since_full', 0) + 1 >= FULL_RETRAIN_EVERY:
+            return self.train_full(conn, seed=options.get('seed', 0))
+        model, meta = self.train_incremental(conn, parent, **options)
+        if model is None:
+            return self.load(parent['version']), parent
+        if not meta['accepted']:
+            # Quality fell below the baseline: fall back to a full retrain
+            return self.train_full(conn, seed=options.get('seed', 0))
+        return model, meta
+
+# ======================
+# MAIN EXECUTION
+# ======================
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Warm-start incremental retraining with a full-retrain quality check")
+    parser.add_argument('--root', default='models')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    refresh = commands.add_parser('refresh', help="Fine-tune CURRENT on new interactions (or retrain)")
+    refresh.add_argument('--db', required=True)
+    refresh.add_argument('--full', action='store_true')
+    refresh.add_argument('--replay-ratio', type=float, default=REPLAY_RATIO)
+    refresh.add_argument('--epochs', type=int, default=INCREMENTAL_EPOCHS)
+    refresh.add_argument('--seed', type=int, default=0)
+
+    commands.add_parser('history', help="List versions with their recall")
+
+    args = parser.parse_args(argv)
+    store = ModelStore(args.root)
+    if args.command == 'history':
+        versions = sorted(entry for entry in os.listdir(args.root) if entry.startswith('m-'))
+        for version in versions:
+            meta = store.meta(version)
+            print(json.dumps({key: meta.get(key) for key in
+                              ('version', 'kind', 'parent', 'watermark', 'recall', 'baseline_recall', 'accepted', 'seconds')}))
+        return 0
+
+    conn = duckdb.connect(args.db, read_only=True)
+    try:
+        _, meta = store.refresh(conn, full=args.full, replay_ratio=args.replay_ratio,
+                                epochs=args.epochs, seed=args.seed)
+    finally:
+        conn.close()
+    print(json.dumps(meta, indent=2))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,117 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+DEFAULT_CHUNK_SIZE = 1 << 20
+
+# ======================
+# ALIAS TABLE
+# ======================
+# Vose's alias method: O(n) to build, O(1) per draw, fully vectorized over
+# the draws. Column i is kept with probability prob[i], otherwise alias[i].
+
+class AliasTable:
+    def __init__(self, weights):
+        weights = np.asarray(weights, dtype=np.float64)
+        total = weights.sum()
+        if not len(weights) or total <= 0:
+            raise ValueError("Alias table needs at least one positive weight")
+        n = len(weights)
+        scaled = weights * (n / total)
+        self.prob = np.ones(n)
+        self.alias = np.arange(n, dtype=np.int64)
+
+        small = np.flatnonzero(scaled < 1.0).tolist()
+        large = np.flatnonzero(scaled >= 1.0).tolist()
+        while small and large:
+            s = small.pop()
+            l = large.pop()
+            self.prob[s] = scaled[s]
+            self.alias[s] = l
+            scaled[l] -= 1.0 - scaled[s]
+            (small if scaled[l] < 1.0 else large).append(l)
+        # Whatever is left is 1 up to rounding and keeps prob 1
+
+    def __len__(self):
+        return len(self.prob)
+
+    def draw(self, rng, size):
+        columns = rng.integers(len(self.prob), size=size)
+        keep = rng.random(size) < self.prob[columns]
+        return np.where(keep, columns, self.alias[columns])
+
+# ======================
+# NEGATIVE SAMPLER
+# ======================
+# Draws items over dense ids 0..n_items-1 with probability proportional to
+# (count + 1) ** alpha: alpha=0 is uniform, alpha=0.75 the usual smoothed
+# popularity. Draws landing on a positive of the same group are redrawn;
+# positives are sorted int64 keys group * n_items + item, checked with one
+# searchsorted per round. Groups are users for user-level exclusion or
+# sessions for in-session exclusion.
+
+class NegativeSampler:
+    def __init__(self, groups, items, n_items, alpha=0.0, max_rounds=10):
+        groups = np.asarray(groups, dtype=np.int64)
+        items = np.asarray(items, dtype=np.int64)
+        self.n_items = int(n_items)
+        self.alpha = alpha
+        self.max_rounds = max_rounds
+        self.keys = np.unique(groups * self.n_items + items)
+        counts = np.bincount(items, minlength=self.n_items)
+        self.table = AliasTable((counts + 1.0) ** alpha)
+
+    def is_positive(self, groups, items):
+        if not len(self.keys):
+            return np.zeros(len(items), dtype=bool)
+        keys = groups * self.n_items + items
+        pos = np.minimum(np.searchsorted(self.keys, keys), len(self.keys) - 1)
+        return self.keys[pos] == keys
+
+    def sample(self, groups, num_neg=1, seed=None):
+        # Returns (groups, items) with num_neg rows per input row; rows still
+        # colliding after max_rounds (groups that saw nearly every item) are dropped
+        rng = np.random.default_rng(seed)
+        groups = np.repeat(np.asarray(groups, dtype=np.int64), num_neg)
+        items = self.table.draw(rng, len(groups))
+        rejected = np.flatnonzero(self.is_positive(groups, items))
+        for _ in range(self.max_rounds):
+            if not len(rejected):
+                break
+            items[rejected] = self.table.draw(rng, len(rejected))
+            rejected = rejected[self.is_positive(groups[rejected], items[rejected])]
+        if len(rejected):
+            keep = np.ones(len(groups), dtype=bool)
+            keep[rejected] = False
+            groups, items = groups[keep], items[keep]
+        return groups, items
+
+    def sample_parallel(self, groups, num_neg=1, seed=0, processes=None, chunk_size=DEFAULT_CHUNK_SIZE):
+        # Chunks get their own child SeedSequence, so the output depends on
+        # seed and chunk_size only, not on how many processes ran them
+        groups = np.asarray(groups, dtype=np.int64)
+        chunks = [groups[start:start + chunk_size] for start in range(0, len(groups), chunk_size)]
+        seeds = np.random.SeedSequence(seed).spawn(len(chunks))
+        processes = processes or os.cpu_count()
+        if processes == 1 or len(chunks) <= 1:
+            results = [self.sample(chunk, num_neg, child) for chunk, child in zip(chunks, seeds)]
+        else:
+            with ProcessPoolExecutor(processes, initializer=_init_worker, initargs=(self,)) as pool:
+                results = list(pool.map(_sample_chunk, chunks, [num_neg] * len(chunks), seeds))
+        if not results:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+        return (np.concatenate([g for g, _ in results]),
+                np.concatenate([i for _, i in results]))
+
+_worker_sampler = None
+
+def _init_worker(sampler):
+    global _worker_sampler
+    _worker_sampler = sampler
+
+def _sample_chunk(groups, num_neg, seed):
+    return _worker_sampler.sample(groups, num_neg, seed)
+
+def dense_codes(values):
+    uniques, codes = np.unique(np.asarray(values), return_inverse=True)
+    return uniques, codes.astype(np.int64)
@@ -0,0 +1,193 @@
+import argparse
+import io
+import json
+import os
+import re
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+SCENE_SUFFIXES = ('.tscn', '.tres')
+CHUNK_FILES = 64
+CHUNK_ROWS = 256
+
+SCRIPT_LANGUAGES = {
+    '.gd': 'GDScript',
+    '.cs': 'C#',
+    '.vs': 'VisualScript'
+}
+BUILTIN_SCRIPT_TYPES = {
+    'GDScript': 'GDScript',
+    'CSharpScript': 'C#',
+    'VisualScript': 'VisualScript'
+}
+SHADER_TYPES = ('Shader', 'VisualShader', 'ShaderInclude')
+
+# Parquet layout of the node_types / script_languages / shaders columns
+EXTRACT_FIELDS = [
+    pa.field('node_types', pa.map_(pa.string(), pa.int32())),
+    pa.field('script_languages', pa.map_(pa.string(), pa.int32())),
+    pa.field('shaders', pa.list_(pa.string()))
+]
+
+# ======================
+# STREAMING SCENE PARSER
+# ======================
+# Godot text scenes and resources are a flat list of [section key=value ...]
+# headers, each followed by property lines. One pass over the lines reads
+# only the headers; no node tree is built. Multi-line string properties
+# (shader code, built-in scripts) can contain lines starting with '[', so
+# the parser tracks whether it is inside a string by counting unescaped quotes.
+
+HEADER_ATTRIBUTE = re.compile(r'(\w+)=("(?:[^"\\]|\\.)*"|\w+\([^)]*\)|[^\s\]]+)')
+UNESCAPED_QUOTE = re.compile(r'(?<!\\)(?:\\\\)*"')
+
+def parse_header(line):
+    end = line.find(' ')
+    section = line[1:end if end > 0 else line.rfind(']')]
+    attributes = {key: value.strip('"') for key, value in HEADER_ATTRIBUTE.findall(line)}
+    return section, attributes
+
+def extract(lines):
+    node_types = Counter()
+    script_languages = Counter()
+    shaders = []
+    in_string = False
+    for line in lines:
+        if not in_string and line.startswith('['):
+            section, attributes = parse_header(line)
+            kind = attributes.get('type')
+            if section == 'node':
+                # Instanced sub-scenes carry no type of their own
+                if kind is not None:
+                    node_types[kind] += 1
+            elif section in ('ext_resource', 'sub_resource'):
+                path = attributes.get('path')
+                if kind == 'Script' and path:
+                    language = SCRIPT_LANGUAGES.get(os.path.splitext(path)[1])
+                    if language:
+                        script_languages[language] += 1
+                elif kind in BUILTIN_SCRIPT_TYPES:
+                    script_languages[BUILTIN_SCRIPT_TYPES[kind]] += 1
+                elif kind in SHADER_TYPES:
+                    shaders.append(path or f"{section}:{attributes.get('id', '')}")
+            continue
+        if len(UNESCAPED_QUOTE.findall(line)) % 2:
+            in_string = not in_string
+    return {
+        'node_types': dict(node_types),
+        'script_languages': dict(script_languages),
+        'shaders': shaders
+    }
+
+def extract_file(path):
+    with open(path, encoding='utf-8', errors='replace') as f:
+        fields = extract(f)
+    return fields, os.path.getsize(path)
+
+def extract_text(text):
+    return extract(io.StringIO(text)), len(text.encode('utf-8'))
+
+# ======================
+# BULK EXTRACTION
+# ======================
+# Workers get chunks of paths (and open the files themselves) or chunks of
+# scene_text read from DuckDB; results come back in order and are appended
+# to one Parquet file, so memory stays bounded by the chunk size.
+
+def _extract_files(paths):
+    return [extract_file(path) for path in paths]
+
+def _extract_texts(texts):
+    return [extract_text(text or '') for text in texts]
+
+def iter_scene_files(root):
+    for directory, _, files in os.walk(root):
+        for name in sorted(files):
+            if name.endswith(SCENE_SUFFIXES):
+                yield os.path.join(directory, name)
+
+def _chunks(items, size):
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def _record_batch(key_field, keys, results):
+    columns = {key_field.name: pa.array(keys, type=key_field.type)}
+    for field in EXTRACT_FIELDS:
+        values = [fields[field.name] for fields, _ in results]
+        if isinstance(field.type, pa.MapType):
+            values = [list(value.items()) for value in values]
+        columns[field.name] = pa.array(values, type=field.type)
+    return pa.RecordBatch.from_pydict(columns)
+
+def extract_to_parquet(output, root=None, db_path=None, processes=None):
+    if db_path is not None:
+        import duckdb
+        conn = duckdb.connect(db_path, read_only=True)
+        reader = conn.execute("""
+            SELECT id::VARCHAR AS id, scene_text FROM assets
+        """).fetch_record_batch(CHUNK_ROWS)
+        key_field = pa.field('id', pa.string())
+        chunks = ((batch.column('id').to_pylist(), batch.column('scene_text').to_pylist()) for batch in reader)
+        work = _extract_texts
+    else:
+        conn = None
+        key_field = pa.field('path', pa.string())
+        chunks = (
+            ([os.path.relpath(path, root) for path in paths], paths)
+            for paths in _chunks(iter_scene_files(root), CHUNK_FILES)
+        )
+        work = _extract_files
+
+    schema = pa.schema([key_field] + EXTRACT_FIELDS)
+    processes = processes or os.cpu_count()
+    stats = {'scenes': 0, 'bytes': 0}
+    start = time.perf_counter()
+    try:
+        with ProcessPoolExecutor(processes) as pool, \
+                pq.ParquetWriter(output, schema) as writer:
+            pending = []
+            for keys, inputs in chunks:
+                pending.append((keys, pool.submit(work, inputs)))
+                # Keep a bounded number of chunks in flight
+                if len(pending) >= 2 * processes:
+                    _write_chunk(writer, key_field, *pending.pop(0), stats)
+            for keys, future in pending:
+                _write_chunk(writer, key_field, keys, future, stats)
+    finally:
+        if conn is not None:
+            conn.close()
+    stats['seconds'] = time.perf_counter() - start
+    stats['mb_per_second'] = stats['bytes'] / 1e6 / stats['seconds'] if stats['seconds'] else 0.0
+    return stats
+
+def _write_chunk(writer, key_field, keys, future, stats):
+    results = future.result()
+    writer.write_batch(_record_batch(key_field, keys, results))
+    stats['scenes'] += len(results)
+    stats['bytes'] += sum(size for _, size in results)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Extract node types, script languages and shaders from Godot scenes")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--root', help="Directory of .tscn/.tres files")
+    source.add_argument('--db', help="DuckDB database; reads assets.scene_text")
+    parser.add_argument('--output', default='scene_features.parquet')
+    parser.add_argument('--processes', type=int, default=None)
+    args = parser.parse_args(argv)
+
+    stats = extract_to_parquet(args.output, root=args.root, db_path=args.db, processes=args.processes)
+    print(json.dumps(stats))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,142 @@
+import numpy as np
+
+# ======================
+# SEEN-ITEM STORE
+# ======================
+# Items are mapped to dense int32 ids; each user's history is a sorted int32
+# array over those ids. WarmState snapshots persist it as CSR arrays
+# (users, indptr, indices, item_ids).
+
+class SeenItemStore:
+    def __init__(self, item_ids=()):
+        self.item_ids = [str(item) for item in item_ids]
+        self.item_index = {item: idx for idx, item in enumerate(self.item_ids)}
+        self.seen = {}
+
+    def __len__(self):
+        return len(self.seen)
+
+    def assign(self, item):
+        key = str(item)
+        idx = self.item_index.get(key)
+        if idx is None:
+            idx = len(self.item_ids)
+            self.item_ids.append(key)
+            self.item_index[key] = idx
+        return idx
+
+    def get(self, userid):
+        return self.seen.get(str(userid), _EMPTY)
+
+    def add(self, userid, items):
+        ids = np.fromiter((self.assign(item) for item in items), dtype=np.int32)
+        if not len(ids):
+            return
+        key = str(userid)
+        self.seen[key] = np.union1d(self.seen.get(key, _EMPTY), ids).astype(np.int32)
+
+    def filter(self, candidates, userid=None, excluded=None, promoted=None, k=None):
+        # Items unknown to the store get call-local ids past the end of the
+        # dense range so they can still be matched against excluded/promoted
+        local = {}
+        originals = {}
+
+        def encode(items):
+            ids = np.empty(len(items), dtype=np.int64)
+            for n, item in enumerate(items):
+                key = str(item)
+                idx = self.item_index.get(key)
+                if idx is None:
+                    idx = local.setdefault(key, len(self.item_ids) + len(local))
+                originals.setdefault(idx, item)
+                ids[n] = idx
+            return ids
+
+        kept = filter_candidates(
+            candidates=encode(list(candidates)),
+            seen=self.get(userid) if userid is not None else None,
+            excluded=encode(excluded or []),
+            promoted=encode(promoted or []),
+            k=k
+        )
+        return [originals[idx] for idx in kept.tolist()]
+
+    # ======================
+    # SNAPSHOT ARRAYS
+    # ======================
+
+    def to_arrays(self):
+        users = sorted(self.seen)
+        arrays = [self.seen[user] for user in users]
+        indptr = np.zeros(len(users) + 1, dtype=np.int64)
+        np.cumsum([len(array) for array in arrays], out=indptr[1:])
+        return {
+            'item_ids': np.array(self.item_ids, dtype=str),
+            'users': np.array(users, dtype=str),
+            'indptr': indptr,
+            'indices': np.concatenate(arrays).astype(np.int32) if arrays else _EMPTY
+        }
+
+    @classmethod
+    def from_arrays(cls, item_ids, users, indptr, indices):
+        # Per-user arrays are views into indices, so a memory-mapped CSR
+        # is used in place without copying
+        store = cls(item_ids=item_ids.tolist())
+        for row, user in enumerate(users.tolist()):
+            store.seen[user] = indices[indptr[row]:indptr[row + 1]]
+        return store
+
+    @classmethod
+    def from_database(cls, conn):
+        items = conn.execute("""
+            SELECT itemid::VARCHAR FROM items ORDER BY created_at, itemid
+        """).fetchall()
+        store = cls(item_ids=[item for (item,) in items])
+
+        history = conn.execute("""
+            SELECT DISTINCT userid::VARCHAR AS userid, itemid::VARCHAR AS itemid
+            FROM interactions
+            ORDER BY userid
+        """).fetchdf()
+        if history.empty:
+            return store
+
+        ids = np.fromiter(
+            (store.assign(item) for item in history['itemid']),
+            dtype=np.int32,
+            count=len(history)
+        )
+        users, starts = np.unique(history['userid'].to_numpy(), return_index=True)
+        for user, array in zip(users.tolist(), np.split(ids, starts[1:])):
+            store.seen[user] = np.sort(array)
+        return store
+
+_EMPTY = np.empty(0, dtype=np.int32)
+
+# ======================
+# VECTORIZED FILTERING
+# ======================
+
+def filter_candidates(candidates, seen=None, excluded=None, promoted=None, k=None):
+    candidates = np.asarray(candidates)
+    drop = np.zeros(len(candidates), dtype=bool)
+
+    if seen is not None and len(seen):
+        pos = np.searchsorted(seen, candidates).clip(max=len(seen) - 1)
+        drop |= seen[pos] == candidates
+
+    if excluded is not None and len(excluded):
+        drop |= np.isin(candidates, excluded)
+
+    # Promoted items go to the top unless excluded; seen history does not
+    # override an explicit promotion
+    if promoted is not None and len(promoted):
+        promoted = np.asarray(promoted)
+        if excluded is not None and len(excluded):
+            promoted = promoted[~np.isin(promoted, excluded)]
+        drop |= np.isin(candidates, promoted)
+        combined = np.concatenate([promoted, candidates[~drop]])
+    else:
+        combined = candidates[~drop]
+
+    return combined if k is None else combined[:k]
@@ -0,0 +1,129 @@
+import argparse
+import json
+import os
+import shutil
+import sys
+import time
+import duckdb
+
+# Context windows and minimum session length from session_recommendation_01.md
+CONTEXT_WINDOWS = (13, 26)
+MIN_SESSION_ITEMS = 3
+BATCH_ROWS = 1 << 20
+SHARD_FILE_SIZE = '256MB'
+
+# ======================
+# NEXT-ITEM PAIRS
+# ======================
+# Every item after the first becomes a target, with the up-to-`context` items
+# before it as history:
+#
+#   session a b c d  ->  [a] -> b,  [a b] -> c,  [a b c] -> d
+#
+# A windowed LIST over a ROWS frame builds each history in DuckDB, so no
+# session is materialised in Python and the cost per pair is bounded by the
+# context size. Sessions shorter than MIN_SESSION_ITEMS are dropped before the
+# frame is evaluated.
+
+PAIRS_QUERY = """
+    WITH events AS (
+      SELECT
+        session_id,
+        item_id,
+        event_order,
+        COUNT(*) OVER (PARTITION BY session_id) AS session_length
+      FROM {source}
+    ),
+    framed AS (
+      SELECT
+        session_id,
+        item_id AS next_item,
+        ROW_NUMBER() OVER (PARTITION BY session_id ORDER BY event_order, item_id) - 1 AS position,
+        LIST(item_id) OVER (
+          PARTITION BY session_id ORDER BY event_order, item_id
+          ROWS BETWEEN {context} PRECEDING AND 1 PRECEDING
+        ) AS history
+      FROM events
+      WHERE session_length >= {min_items}
+    )
+    SELECT session_id, position, history, next_item
+    FROM framed
+    WHERE position > 0
+"""
+
+def pairs_query(source='session_items', context=CONTEXT_WINDOWS[0], min_items=MIN_SESSION_ITEMS):
+    # source is any relation with session_id, item_id and event_order columns
+    if context < 1:
+        raise ValueError(f"context must be positive, got {context}")
+    return PAIRS_QUERY.format(source=source, context=int(context), min_items=int(min_items))
+
+# ======================
+# OUTPUTS
+# ======================
+
+def iter_pair_batches(conn, source='session_items', context=CONTEXT_WINDOWS[0],
+                      min_items=MIN_SESSION_ITEMS, batch_rows=BATCH_ROWS):
+    # Arrow record batches for in-process training loops
+    reader = conn.execute(pairs_query(source, context, min_items)).fetch_record_batch(batch_rows)
+    for batch in reader:
+        yield batch
+
+def write_pair_shards(conn, output, source='session_items', context=CONTEXT_WINDOWS[0],
+                      min_items=MIN_SESSION_ITEMS, file_size=SHARD_FILE_SIZE):
+    # Parquet shards written by DuckDB's parallel COPY; the directory is
+    # replaced whole, so readers never mix shards of two exports
+    output = output.rstrip(os.sep)
+    staging = output + '.tmp'
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    shutil.rmtree(staging, ignore_errors=True)
+    start = time.perf_counter()
+    conn.execute(f"""
+        COPY ({pairs_query(source, context, min_items)}) TO '{staging}'
+        (FORMAT PARQUET, FILE_SIZE_BYTES '{file_size}', FILENAME_PATTERN 'pairs-{{i}}')
+    """)
+    seconds = time.perf_counter() - start
+    os.makedirs(staging, exist_ok=True)
+    shards = sorted(name for name in os.listdir(staging) if name.endswith('.parquet'))
+    pairs = conn.execute(
+        "SELECT COUNT(*) FROM read_parquet($paths)",
+        parameters={'paths': [os.path.join(staging, name) for name in shards]}
+    ).fetchone()[0] if shards else 0
+    shutil.rmtree(output, ignore_errors=True)
+    os.rename(staging, output)
+    return {
+        'context': context,
+        'shards': len(shards),
+        'pairs': pairs,
+        'seconds': seconds,
+        'pairs_per_second': pairs / seconds if seconds else 0.0
+    }
+
+# ======================
+# MAIN EXECUTION
+# ======================
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export every prefix -> next-item pair of each session")
+    parser.add_argument('--db', required=True)
+    parser.add_argument('--source', default='session_items',
+                        help="Table or view with session_id, item_id, event_order")
+    parser.add_argument('--contexts', type=int, nargs='+', default=list(CONTEXT_WINDOWS))
+    parser.add_argument('--min-items', type=int, default=MIN_SESSION_ITEMS)
+    parser.add_argument('--output', default='session_pairs',
+                        help="Shards go to <output>/context=<n>/")
+    args = parser.parse_args(argv)
+
+    conn = duckdb.connect(args.db, read_only=True)
+    try:
+        for context in args.contexts:
+            stats = write_pair_shards(
+                conn, os.path.join(args.output, f"context={context}"),
+                args.source, context, args.min_items
+            )
+            print(json.dumps(stats))
+    finally:
+        conn.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
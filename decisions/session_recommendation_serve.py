@@ -0,0 +1,67 @@
+import argparse
+import os
+import subprocess
+import sys
+import time
+import uvicorn
+from session_recommendation_shared import read_current_version
+
+# ======================
+# MULTI-PROCESS DEPLOYMENT
+# ======================
+# One writer process owns recommendations.db, takes all writes and publishes
+# snapshots to the state directory. N reader workers share the public port
+# and serve from the latest snapshot, memory-mapping its arrays and opening
+# its database copy read-only, so reads scale across cores.
+
+def start_writer(host, port, state_dir):
+    env = dict(
+        os.environ,
+        RECOMMENDATIONS_ROLE='writer',
+        RECOMMENDATIONS_STATE_DIR=state_dir
+    )
+    return subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', 'session_recommendation_07:app',
+         '--host', host, '--port', str(port)],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        env=env
+    )
+
+def wait_for_state(state_dir, writer, timeout):
+    deadline = time.time() + timeout
+    while read_current_version(state_dir) == 0:
+        if writer.poll() is not None:
+            raise RuntimeError("Writer exited before publishing state")
+        if time.time() > deadline:
+            raise RuntimeError("Writer did not publish state in time")
+        time.sleep(0.5)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve recommendations with one writer and N readers")
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--writer-port', type=int, default=8001)
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--state-dir', default='state')
+    parser.add_argument('--startup-timeout', type=float, default=3600)
+    args = parser.parse_args(argv)
+
+    state_dir = os.path.abspath(args.state_dir)
+    writer = start_writer('127.0.0.1', args.writer_port, state_dir)
+    try:
+        wait_for_state(state_dir, writer, args.startup_timeout)
+
+        # Reader workers are started from this process and inherit its environment
+        os.environ.update(
+            RECOMMENDATIONS_ROLE='reader',
+            RECOMMENDATIONS_STATE_DIR=state_dir,
+            RECOMMENDATIONS_WRITER_URL=f"http://127.0.0.1:{args.writer_port}"
+        )
+        uvicorn.run('session_recommendation_07:app', host=args.host, port=args.port, workers=args.workers)
+    finally:
+        writer.terminate()
+        writer.wait()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
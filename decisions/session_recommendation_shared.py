@@ -0,0 +1,267 @@
+import json
+import os
+import shutil
+import threading
+import time
+import duckdb
+import numpy as np
+
+# ======================
+# VERSIONED SHARED STATE
+# ======================
+# One writer publishes immutable snapshot directories:
+#
+#   <root>/v00000042/<name>.npy           arrays, memory-mapped by readers
+#   <root>/v00000042/metadata.json        includes the database copy it reads
+#   <root>/databases/d00000040.db         read-only copies of the database
+#   <root>/CURRENT                        name of the live version
+#
+# A version is fully written under a temporary name, renamed into place and
+# only then made live by atomically replacing CURRENT. Readers never see a
+# partial snapshot and can keep using an old one until they next check.
+# Copying the database is O(database), so publishers pass db_path only
+# every few minutes; versions in between point at the latest copy.
+
+SNAPSHOT_DB = 'recommendations.db'
+DATABASES_DIR = 'databases'
+
+class StatePublisher:
+    def __init__(self, root, keep=3):
+        self.root = root
+        self.keep = keep
+        self.lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    def current_version(self):
+        return read_current_version(self.root)
+
+    def next_version(self):
+        # Past every version directory, not just CURRENT: a publish that died
+        # after renaming its directory but before replacing CURRENT leaves one
+        published = [
+            int(entry[1:]) for entry in os.listdir(self.root)
+            if entry.startswith('v') and entry[1:].isdigit()
+        ]
+        return max(published + [self.current_version()]) + 1
+
+    def publish(self, db_path=None, arrays=None, metadata=None):
+        with self.lock:
+            version = self.next_version()
+            name = f"v{version:08d}"
+            staging = os.path.join(self.root, f".{name}.tmp")
+            shutil.rmtree(staging, ignore_errors=True)
+            os.makedirs(staging)
+
+            if db_path is not None:
+                database = f"d{version:08d}.db"
+                databases = os.path.join(self.root, DATABASES_DIR)
+                os.makedirs(databases, exist_ok=True)
+                copy_path = os.path.join(databases, f".{database}.tmp")
+                if os.path.exists(copy_path):
+                    os.remove(copy_path)
+                copy_database(db_path, copy_path)
+                os.replace(copy_path, os.path.join(databases, database))
+            else:
+                database = self.current_database()
+            for array_name, array in (arrays or {}).items():
+                np.save(os.path.join(staging, f"{array_name}.npy"), np.ascontiguousarray(array))
+            with open(os.path.join(staging, 'metadata.json'), 'w') as f:
+                json.dump(dict(metadata or {}, version=version, database=database,
+                               published_at=time.time()), f)
+
+            os.rename(staging, os.path.join(self.root, name))
+            pointer = os.path.join(self.root, 'CURRENT.tmp')
+            with open(pointer, 'w') as f:
+                f.write(name)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(pointer, os.path.join(self.root, 'CURRENT'))
+
+            self.prune(version)
+            return version
+
+    def current_database(self):
+        version = self.current_version()
+        if not version:
+            return None
+        return Snapshot(self.root, version).metadata.get('database')
+
+    def prune(self, version):
+        # Old versions are unlinked, not truncated: readers that still have
+        # them mapped keep a valid view until they move on
+        for entry in os.listdir(self.root):
+            if entry.startswith('v') and entry[1:].isdigit() and int(entry[1:]) <= version - self.keep:
+                shutil.rmtree(os.path.join(self.root, entry), ignore_errors=True)
+        # Database copies go once no remaining version points at them
+        databases = os.path.join(self.root, DATABASES_DIR)
+        if not os.path.isdir(databases):
+            return
+        referenced = {
+            Snapshot(self.root, int(entry[1:])).metadata.get('database')
+            for entry in os.listdir(self.root) if entry.startswith('v') and entry[1:].isdigit()
+        }
+        for entry in os.listdir(databases):
+            if entry.startswith('d') and entry not in referenced:
+                os.remove(os.path.join(databases, entry))
+
+def copy_database(source_path, target_path):
+    # COPY FROM DATABASE runs inside one transaction, so the copy is
+    # consistent even while other connections keep writing to the source
+    conn = duckdb.connect(source_path)
+    try:
+        conn.execute(f"ATTACH '{target_path}' AS snapshot")
+        conn.execute(f"COPY FROM DATABASE {_database_name(conn)} TO snapshot")
+        conn.execute("DETACH snapshot")
+    finally:
+        conn.close()
+
+def _database_name(conn):
+    return conn.execute("SELECT current_database()").fetchone()[0]
+
+def read_current_version(root):
+    try:
+        with open(os.path.join(root, 'CURRENT')) as f:
+            return int(f.read().strip()[1:])
+    except FileNotFoundError:
+        return 0
+
+class Snapshot:
+    def __init__(self, root, version):
+        self.root = root
+        self.version = version
+        self.path = os.path.join(root, f"v{version:08d}")
+        self.arrays = {}
+        with open(os.path.join(self.path, 'metadata.json')) as f:
+            self.metadata = json.load(f)
+
+    def has(self, name):
+        return os.path.exists(os.path.join(self.path, f"{name}.npy"))
+
+    def array(self, name):
+        if name not in self.arrays:
+            self.arrays[name] = np.load(os.path.join(self.path, f"{name}.npy"), mmap_mode='r')
+        return self.arrays[name]
+
+    def connect(self):
+        database = self.metadata.get('database')
+        if database is None:
+            # Versions published before database copies moved out of them
+            return duckdb.connect(os.path.join(self.path, SNAPSHOT_DB), read_only=True)
+        return duckdb.connect(os.path.join(self.root, DATABASES_DIR, database), read_only=True)
+
+class StateReader:
+    def __init__(self, root, check_interval=1.0, on_swap=None):
+        self.root = root
+        self.check_interval = check_interval
+        self.on_swap = on_swap
+        self.snapshot = None
+        self.checked_at = 0.0
+        self.lock = threading.Lock()
+
+    def current(self):
+        now = time.monotonic()
+        if self.snapshot is None or now - self.checked_at >= self.check_interval:
+            with self.lock:
+                self.checked_at = now
+                version = read_current_version(self.root)
+                if version == 0:
+                    raise RuntimeError(f"No published state in {self.root}")
+                if self.snapshot is None or version != self.snapshot.version:
+                    snapshot = Snapshot(self.root, version)
+                    if self.on_swap is not None:
+                        self.on_swap(snapshot)
+                    self.snapshot = snapshot
+        return self.snapshot
+
+# ======================
+# EMBEDDING MODEL VIEW
+# ======================
+# Readers do not train; they score with the embeddings the writer exported
+# from its fitted model, behind the same predict() call the service uses.
+
+def export_model_embeddings(model):
+    # A fitted libreco model, or embeddings already being served
+    if isinstance(model, EmbeddingModel):
+        return model.to_arrays()
+    info = model.data_info
+    return {
+        'model_user_ids': np.array([str(info.id2user[i]) for i in range(info.n_users)]),
+        'model_item_ids': np.array([str(info.id2item[i]) for i in range(info.n_items)]),
+        'user_embeddings': np.asarray(model.get_user_embedding(), dtype=np.float32),
+        'item_embeddings': np.asarray(model.get_item_embedding(), dtype=np.float32)
+    }
+
+class EmbeddingModel:
+    def __init__(self, user_ids, item_ids, user_embeddings, item_embeddings):
+        self.user_index = {user: row for row, user in enumerate(user_ids.tolist())}
+        self.item_ids = item_ids
+        self.user_embeddings = user_embeddings
+        self.item_buffer = item_embeddings
+        self.n_items = len(item_ids)
+        self.item_index = None
+
+    @property
+    def item_embeddings(self):
+        return self.item_buffer[:self.n_items]
+
+    def has_item(self, itemid):
+        if self.item_index is None:
+            self.item_index = {item: row for row, item in enumerate(self.item_ids.tolist())}
+        return str(itemid) in self.item_index
+
+    def add_items(self, item_ids, vectors):
+        # Rows for items the fitted model never saw (inductive embeddings).
+        # Snapshot arrays are memory-mapped read-only, so the first add
+        # copies into a capacity-doubling buffer
+        item_ids = [str(item) for item in item_ids]
+        new = np.array([not self.has_item(item) for item in item_ids], dtype=bool)
+        if not new.any():
+            return 0
+        item_ids = [item for item, keep in zip(item_ids, new) if keep]
+        vectors = np.asarray(vectors, dtype=np.float32)[new]
+        needed = self.n_items + len(item_ids)
+        if needed > len(self.item_buffer) or not self.item_buffer.flags.writeable:
+            grown = np.empty((max(needed, 2 * len(self.item_buffer)), self.item_buffer.shape[1]), dtype=np.float32)
+            grown[:self.n_items] = self.item_buffer[:self.n_items]
+            self.item_buffer = grown
+        self.item_buffer[self.n_items:needed] = vectors
+        self.item_ids = np.concatenate([np.asarray(self.item_ids, dtype=object), np.asarray(item_ids, dtype=object)])
+        self.item_index.update((item, self.n_items + n) for n, item in enumerate(item_ids))
+        self.n_items = needed
+        return len(item_ids)
+
+    def to_arrays(self):
+        return {
+            'model_user_ids': np.array(sorted(self.user_index, key=self.user_index.get), dtype=str),
+            'model_item_ids': np.asarray(self.item_ids, dtype=str),
+            'user_embeddings': np.asarray(self.user_embeddings, dtype=np.float32),
+            'item_embeddings': np.asarray(self.item_embeddings, dtype=np.float32)
+        }
+
+    @classmethod
+    def from_model(cls, model):
+        arrays = export_model_embeddings(model)
+        return cls(arrays['model_user_ids'], arrays['model_item_ids'],
+                   arrays['user_embeddings'], arrays['item_embeddings'])
+
+    @classmethod
+    def from_snapshot(cls, snapshot):
+        if not snapshot.has('item_embeddings'):
+            return None
+        return cls(
+            snapshot.array('model_user_ids'),
+            snapshot.array('model_item_ids'),
+            snapshot.array('user_embeddings'),
+            snapshot.array('item_embeddings')
+        )
+
+    def predict(self, userid, n=100):
+        row = self.user_index.get(str(userid))
+        if row is None:
+            return []
+        logits = self.item_embeddings @ self.user_embeddings[row]
+        n = min(n, len(logits))
+        top = np.argpartition(-logits, n - 1)[:n]
+        top = top[np.argsort(-logits[top])]
+        scores = 1.0 / (1.0 + np.exp(-logits[top]))
+        return list(zip(self.item_ids[top].tolist(), scores.tolist()))
@@ -0,0 +1,354 @@
+import argparse
+import json
+import sys
+import time
+import numpy as np
+from session_recommendation_ann import build_index
+from session_recommendation_sequences import CONTEXT_WINDOWS
+
+# Combiner of session_recommendation_prediction_13.yaml
+NUM_LAYERS = 2
+NUM_HEADS = 4
+HIDDEN_SIZE = 128
+ITEM_EMBEDDING_SIZE = 64
+FFN_SIZE = 256
+LAYER_NORM_EPS = 1e-6
+TOP_K = 10
+# Attention spans at most MAX_LENGTH items; an overflowing session is
+# re-encoded from its last WINDOW items
+WINDOW, MAX_LENGTH = CONTEXT_WINDOWS
+INITIAL_SLOTS = 256
+
+# ======================
+# WEIGHTS
+# ======================
+# Weights are a flat .npz exported from the trained model (float32):
+#
+#   item_ids                 vocabulary, row order of item_embeddings
+#   item_embeddings          (V, 64), tied between item_sequence and next_item
+#   input_projection/_bias   (64, 128) / (128,)
+#   position_embeddings      (MAX_LENGTH, 128)
+#   layer{i}.{q,k,v,o}       (128, 128) with .{q,k,v,o}_bias (128,)
+#   layer{i}.ffn1 / ffn2     (128, F) / (F, 128) with _bias
+#   layer{i}.norm1/norm2     _gamma / _beta (128,)
+#   output_projection/_bias  (128, 64) / (64,)
+#
+# Blocks are post-norm (x = norm(x + attention(x)); x = norm(x + ffn(x)))
+# as in Ludwig's transformer combiner, with causal self-attention.
+
+def random_weights(n_items, seed=0, num_layers=NUM_LAYERS, hidden=HIDDEN_SIZE,
+                   embedding=ITEM_EMBEDDING_SIZE, ffn=FFN_SIZE, max_length=MAX_LENGTH):
+    # Untrained weights of the right shapes, for benchmarks
+    rng = np.random.default_rng(seed)
+    dense = lambda rows, cols: (rng.standard_normal((rows, cols)) / np.sqrt(rows)).astype(np.float32)
+    weights = {
+        'item_ids': np.array([f"item-{n}" for n in range(n_items)]),
+        'item_embeddings': dense(n_items, embedding) * np.sqrt(n_items / embedding),
+        'input_projection': dense(embedding, hidden),
+        'input_projection_bias': np.zeros(hidden, dtype=np.float32),
+        'position_embeddings': dense(max_length, hidden) * 0.1,
+        'output_projection': dense(hidden, embedding),
+        'output_projection_bias': np.zeros(embedding, dtype=np.float32)
+    }
+    for layer in range(num_layers):
+        prefix = f"layer{layer}."
+        for name in ('q', 'k', 'v', 'o'):
+            weights[prefix + name] = dense(hidden, hidden)
+            weights[prefix + name + '_bias'] = np.zeros(hidden, dtype=np.float32)
+        weights[prefix + 'ffn1'] = dense(hidden, ffn)
+        weights[prefix + 'ffn1_bias'] = np.zeros(ffn, dtype=np.float32)
+        weights[prefix + 'ffn2'] = dense(ffn, hidden)
+        weights[prefix + 'ffn2_bias'] = np.zeros(hidden, dtype=np.float32)
+        for norm in ('norm1', 'norm2'):
+            weights[prefix + norm + '_gamma'] = np.ones(hidden, dtype=np.float32)
+            weights[prefix + norm + '_beta'] = np.zeros(hidden, dtype=np.float32)
+    return weights
+
+def layer_norm(x, gamma, beta):
+    mean = x.mean(axis=-1, keepdims=True)
+    var = x.var(axis=-1, keepdims=True)
+    return (x - mean) / np.sqrt(var + LAYER_NORM_EPS) * gamma + beta
+
+def softmax(x):
+    x = x - x.max(axis=-1, keepdims=True)
+    np.exp(x, out=x)
+    return x / x.sum(axis=-1, keepdims=True)
+
+class SessionTransformer:
+    def __init__(self, weights, num_heads=NUM_HEADS):
+        self.w = {name: np.asarray(value) for name, value in weights.items()}
+        self.item_ids = [str(item) for item in self.w.pop('item_ids')]
+        self.item_index = {item: code for code, item in enumerate(self.item_ids)}
+        self.num_layers = sum(1 for name in self.w if name.endswith('.q'))
+        self.num_heads = num_heads
+        self.hidden = self.w['input_projection'].shape[1]
+        self.head_dim = self.hidden // num_heads
+        self.max_length = len(self.w['position_embeddings'])
+
+    @classmethod
+    def load(cls, path, num_heads=NUM_HEADS):
+        with np.load(path) as arrays:
+            return cls({name: arrays[name] for name in arrays.files}, num_heads)
+
+    def embed(self, codes, positions):
+        x = self.w['item_embeddings'][codes] @ self.w['input_projection'] + self.w['input_projection_bias']
+        return x + self.w['position_embeddings'][positions]
+
+    def heads(self, x):
+        # (..., hidden) -> (..., heads, head_dim)
+        return x.reshape(*x.shape[:-1], self.num_heads, self.head_dim)
+
+    def project(self, x, layer, name):
+        prefix = f"layer{layer}."
+        return x @ self.w[prefix + name] + self.w[prefix + name + '_bias']
+
+    def feed_forward(self, x, layer):
+        prefix = f"layer{layer}."
+        x = layer_norm(x, self.w[prefix + 'norm1_gamma'], self.w[prefix + 'norm1_beta'])
+        hidden = np.maximum(self.project(x, layer, 'ffn1'), 0.0)
+        return layer_norm(x + self.project(hidden, layer, 'ffn2'),
+                          self.w[prefix + 'norm2_gamma'], self.w[prefix + 'norm2_beta'])
+
+    def output(self, x):
+        return x @ self.w['output_projection'] + self.w['output_projection_bias']
+
+    def encode(self, codes, every_position=False):
+        # Full causal pass over one sequence; returns the query vector of the
+        # last position (of every position, each seeing only its prefix, with
+        # every_position) and per-layer (keys, values) of shape (T, heads, head_dim)
+        codes = np.asarray(codes, dtype=np.int64)
+        length = len(codes)
+        x = self.embed(codes, np.arange(length))
+        future = np.triu(np.ones((length, length), dtype=bool), k=1)
+        cache = []
+        for layer in range(self.num_layers):
+            q = self.heads(self.project(x, layer, 'q'))
+            k = self.heads(self.project(x, layer, 'k'))
+            v = self.heads(self.project(x, layer, 'v'))
+            cache.append((k, v))
+            scores = np.einsum('thd,shd->hts', q, k) / np.sqrt(self.head_dim)
+            scores[:, future] = -np.inf
+            attended = np.einsum('hts,shd->thd', softmax(scores), v).reshape(length, self.hidden)
+            x = self.feed_forward(x + self.project(attended, layer, 'o'), layer)
+        return self.output(x if every_position else x[-1]), cache
+
+    def step(self, codes, positions, keys, values, lengths):
+        # One new item for each of B sessions. keys/values[layer] are
+        # (B, max_length, heads, head_dim) cache views; the new key/value is
+        # written at positions and attention covers positions <= lengths
+        x = self.embed(codes, positions)
+        rows = np.arange(len(codes))
+        visible = np.arange(self.max_length)[None, :] <= lengths[:, None]
+        for layer in range(self.num_layers):
+            q = self.heads(self.project(x, layer, 'q'))
+            keys[layer][rows, positions] = self.heads(self.project(x, layer, 'k'))
+            values[layer][rows, positions] = self.heads(self.project(x, layer, 'v'))
+            scores = np.einsum('bhd,bshd->bhs', q, keys[layer]) / np.sqrt(self.head_dim)
+            scores = np.where(visible[:, None, :], scores, -np.inf)
+            attended = np.einsum('bhs,bshd->bhd', softmax(scores), values[layer]).reshape(len(codes), self.hidden)
+            x = self.feed_forward(x + self.project(attended, layer, 'o'), layer)
+        return self.output(x)
+
+# ======================
+# TIED-EMBEDDING RETRIEVAL
+# ======================
+# next_item logits are dot products with the tied item embeddings. The ANN
+# indexes rank by cosine, so each item row gets one extra coordinate
+# sqrt(M^2 - |e|^2) (M the largest norm): every augmented row has norm M,
+# the query gets a 0 there, and cosine order equals logit order.
+
+class TiedEmbeddingIndex:
+    def __init__(self, item_ids, embeddings, **options):
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        norms = np.linalg.norm(embeddings, axis=1)
+        self.max_norm = float(norms.max()) if len(norms) else 1.0
+        extra = np.sqrt(np.maximum(self.max_norm ** 2 - norms ** 2, 0.0))[:, None]
+        self.index = build_index(embeddings.shape[1] + 1, list(item_ids), np.hstack([embeddings, extra]), **options)
+
+    def search(self, queries, k=TOP_K, exclude=None):
+        queries = np.atleast_2d(queries).astype(np.float32)
+        augmented = np.hstack([queries, np.zeros((len(queries), 1), dtype=np.float32)])
+        query_norms = np.linalg.norm(queries, axis=1)
+        results = self.index.search(augmented, k, exclude=exclude)
+        # Cosine back to logits
+        return [(ids, scores * self.max_norm * norm) for (ids, scores), norm in zip(results, query_norms)]
+
+# ======================
+# INCREMENTAL SESSION RUNTIME
+# ======================
+# Each live session owns a slot in preallocated key/value caches:
+#
+#   keys[layer], values[layer]   (slots, MAX_LENGTH, heads, head_dim)
+#   lengths[slot]                items cached
+#   queries[slot]                next_item query after the latest item
+#
+# observe() groups a batch of events by session and feeds them through
+# step() as rounds of at most one event per session, so concurrent sessions
+# share one forward pass and each event costs one position, not a re-encode
+# of the whole sequence.
+
+class TransformerSessionRuntime:
+    def __init__(self, model, index=None, slots=INITIAL_SLOTS, window=WINDOW, **index_options):
+        # The tied-embedding index is built on the first recommend() unless given
+        self.model = model
+        self.index = index
+        self.index_options = index_options
+        self.window = window
+        shape = (slots, model.max_length, model.num_heads, model.head_dim)
+        self.keys = [np.zeros(shape, dtype=np.float32) for _ in range(model.num_layers)]
+        self.values = [np.zeros(shape, dtype=np.float32) for _ in range(model.num_layers)]
+        self.lengths = np.zeros(slots, dtype=np.int64)
+        self.queries = np.zeros((slots, model.w['item_embeddings'].shape[1]), dtype=np.float32)
+        self.history = [[] for _ in range(slots)]
+        self.slot_of = {}
+        self.free = list(range(slots - 1, -1, -1))
+        self.stats = {'steps': 0, 'reencodes': 0, 'unknown_items': 0}
+
+    def __len__(self):
+        return len(self.slot_of)
+
+    def _grow(self):
+        size = len(self.lengths)
+        self.keys = [np.concatenate([cache, np.zeros_like(cache)]) for cache in self.keys]
+        self.values = [np.concatenate([cache, np.zeros_like(cache)]) for cache in self.values]
+        self.lengths = np.concatenate([self.lengths, np.zeros(size, dtype=np.int64)])
+        self.queries = np.concatenate([self.queries, np.zeros_like(self.queries)])
+        self.history.extend([] for _ in range(size))
+        self.free.extend(range(2 * size - 1, size - 1, -1))
+
+    def _slot(self, session_id):
+        slot = self.slot_of.get(session_id)
+        if slot is None:
+            if not self.free:
+                self._grow()
+            slot = self.free.pop()
+            self.slot_of[session_id] = slot
+            self.lengths[slot] = 0
+            self.history[slot] = []
+        return slot
+
+    def end_session(self, session_id):
+        slot = self.slot_of.pop(str(session_id), None)
+        if slot is not None:
+            self.free.append(slot)
+
+    def _reencode(self, slot):
+        # Sliding the window shifts positions, so the kept items are encoded
+        # afresh; this happens once every MAX_LENGTH - window events
+        codes = self.history[slot][-self.window:]
+        self.history[slot] = list(codes)
+        query, cache = self.model.encode(codes)
+        for layer, (k, v) in enumerate(cache):
+            self.keys[layer][slot, :len(codes)] = k
+            self.values[layer][slot, :len(codes)] = v
+        self.lengths[slot] = len(codes)
+        self.queries[slot] = query
+        self.stats['reencodes'] += 1
+
+    def observe(self, events):
+        # events: iterable of (session_id, item_id) in arrival order
+        pending = {}
+        for session_id, item_id in events:
+            code = self.model.item_index.get(str(item_id))
+            if code is None:
+                self.stats['unknown_items'] += 1
+                continue
+            pending.setdefault(self._slot(str(session_id)), []).append(code)
+
+        while pending:
+            slots = np.fromiter(pending, dtype=np.int64, count=len(pending))
+            full = slots[self.lengths[slots] >= self.model.max_length]
+            for slot in full.tolist():
+                self._reencode(slot)
+            codes = np.array([pending[slot].pop(0) for slot in slots.tolist()], dtype=np.int64)
+            positions = self.lengths[slots]
+            keys = [cache[slots] for cache in self.keys]
+            values = [cache[slots] for cache in self.values]
+            self.queries[slots] = self.model.step(codes, positions, keys, values, positions)
+            for layer in range(self.model.num_layers):
+                self.keys[layer][slots, positions] = keys[layer][np.arange(len(slots)), positions]
+                self.values[layer][slots, positions] = values[layer][np.arange(len(slots)), positions]
+            self.lengths[slots] += 1
+            for slot, code in zip(slots.tolist(), codes.tolist()):
+                self.history[slot].append(code)
+            pending = {slot: codes for slot, codes in pending.items() if codes}
+            self.stats['steps'] += 1
+
+    def recommend(self, session_ids, k=TOP_K, exclude_seen=False):
+        sessions = [str(session_id) for session_id in session_ids]
+        slots = [self.slot_of.get(session_id) for session_id in sessions]
+        known = [n for n, slot in enumerate(slots) if slot is not None and self.lengths[slot]]
+        results = [[] for _ in sessions]
+        if not known:
+            return results
+        if self.index is None:
+            self.index = TiedEmbeddingIndex(self.model.item_ids, self.model.w['item_embeddings'], **self.index_options)
+        rows = np.array([slots[n] for n in known], dtype=np.int64)
+        exclude = None
+        if exclude_seen:
+            exclude = [[self.model.item_ids[code] for code in self.history[slot]] for slot in rows.tolist()]
+        for n, (ids, scores) in zip(known, self.index.search(self.queries[rows], k, exclude=exclude)):
+            results[n] = list(zip(ids.tolist(), scores.tolist()))
+        return results
+
+# ======================
+# BENCHMARK
+# ======================
+
+def benchmark(model, sessions=256, events=20, k=TOP_K, seed=0):
+    # Incremental steps for concurrent sessions vs re-encoding each sequence
+    # on every event; also reports the largest query difference between them
+    rng = np.random.default_rng(seed)
+    sequences = rng.integers(0, len(model.item_ids), size=(sessions, events))
+    runtime = TransformerSessionRuntime(model, slots=sessions)
+
+    start = time.perf_counter()
+    for position in range(events):
+        runtime.observe((f"s{n}", model.item_ids[code]) for n, code in enumerate(sequences[:, position]))
+        runtime.recommend([f"s{n}" for n in range(sessions)], k)
+    incremental = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for position in range(events):
+        for n in range(sessions):
+            history = sequences[n, max(0, position + 1 - model.max_length):position + 1]
+            model.encode(history)
+    full = time.perf_counter() - start
+
+    within = min(events, model.max_length)
+    difference = max(
+        float(np.abs(model.encode(sequences[n, :within])[0] - _replay(model, sequences[n, :within])).max())
+        for n in range(min(sessions, 8))
+    )
+    return {
+        'sessions': sessions,
+        'events': events,
+        'incremental_ms_per_event': incremental * 1000 / (sessions * events),
+        'reencode_ms_per_event': full * 1000 / (sessions * events),
+        'max_query_difference': difference,
+        'stats': runtime.stats
+    }
+
+def _replay(model, codes):
+    runtime = TransformerSessionRuntime(model, slots=1)
+    runtime.observe(('s', model.item_ids[code]) for code in codes)
+    return runtime.queries[runtime.slot_of['s']]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Incremental CPU inference for the session next-item transformer")
+    parser.add_argument('--weights', default=None, help=".npz weights; random weights when omitted")
+    parser.add_argument('--items', type=int, default=50000, help="Vocabulary size for random weights")
+    parser.add_argument('--sessions', type=int, default=256)
+    parser.add_argument('--events', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    if args.weights:
+        model = SessionTransformer.load(args.weights)
+    else:
+        model = SessionTransformer(random_weights(args.items, args.seed))
+    print(json.dumps(benchmark(model, args.sessions, args.events, seed=args.seed)))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,261 @@
+import time
+import uuid
+import numpy as np
+from session_recommendation_seen import SeenItemStore
+from session_recommendation_shared import EmbeddingModel
+
+TREND_BUCKET_SECONDS = 3600
+TREND_RETENTION_SECONDS = 1209600
+
+# ======================
+# WARM SERVING STATE
+# ======================
+# Everything the service derives from DuckDB, kept over the seen store's dense
+# item ids: per-item rating aggregates, the genre index, hourly trend buckets,
+# per-user seen items and (when available) the model embeddings. It is saved
+# as a published snapshot and restored by memory-mapping, after which only
+# interactions with ingest_seq past the snapshot's watermark are replayed.
+
+class WarmState:
+    def __init__(self, seen, genre_names=(), genre_codes=None, rating_sum=None,
+                 rating_count=None, trend_hours=None, trend_items=None, trend_counts=None,
+                 watermark=0, model=None, model_fitted_at=None):
+        self.seen = seen
+        self.genre_names = list(genre_names)
+        self.genre_index = {genre: code for code, genre in enumerate(self.genre_names)}
+        n_items = len(seen.item_ids)
+        self.genre_codes = _resized(genre_codes, n_items, -1, np.int32)
+        self.rating_sum = _resized(rating_sum, n_items, 0, np.float64)
+        self.rating_count = _resized(rating_count, n_items, 0, np.int64)
+        self.item_uuids = [uuid.UUID(item) for item in seen.item_ids]
+
+        # Compacted buckets sorted by hour, plus events not yet compacted
+        self.trend_hours = _EMPTY_I64 if trend_hours is None else trend_hours
+        self.trend_items = _EMPTY_I32 if trend_items is None else trend_items
+        self.trend_counts = _EMPTY_I32 if trend_counts is None else trend_counts
+        self.pending_hours = []
+        self.pending_items = []
+
+        self.watermark = int(watermark)
+        self.model = model
+        self.model_fitted_at = model_fitted_at
+
+    # ======================
+    # ITEM INDEX
+    # ======================
+
+    def assign(self, item):
+        idx = self.seen.assign(item)
+        if idx >= len(self.item_uuids):
+            self._grow()
+        return idx
+
+    def _grow(self):
+        n_items = len(self.seen.item_ids)
+        self.item_uuids.extend(uuid.UUID(item) for item in self.seen.item_ids[len(self.item_uuids):])
+        self.genre_codes = _resized(self.genre_codes, n_items, -1, np.int32)
+        self.rating_sum = _resized(self.rating_sum, n_items, 0, np.float64)
+        self.rating_count = _resized(self.rating_count, n_items, 0, np.int64)
+
+    def sync_items(self, conn):
+        catalogue = conn.execute("""
+            SELECT itemid::VARCHAR AS itemid, genre FROM items
+        """).fetchall()
+        for itemid, genre in catalogue:
+            idx = self.assign(itemid)
+            if genre not in self.genre_index:
+                self.genre_index[genre] = len(self.genre_names)
+                self.genre_names.append(genre)
+            self.genre_codes[idx] = self.genre_index[genre]
+
+    # ======================
+    # INGEST AND REPLAY
+    # ======================
+
+    def apply(self, rows):
+        if rows.empty:
+            return
+        ids = np.fromiter((self.assign(item) for item in rows['itemid']), dtype=np.int64, count=len(rows))
+        rated = rows['rating'].notna().to_numpy()
+        np.add.at(self.rating_sum, ids[rated], rows['rating'].to_numpy()[rated].astype(np.float64))
+        np.add.at(self.rating_count, ids[rated], 1)
+
+        self.pending_hours.append(rows['timestamp'].to_numpy(np.int64) // TREND_BUCKET_SECONDS)
+        self.pending_items.append(ids.astype(np.int32))
+
+        for userid, items in rows.groupby('userid')['itemid']:
+            self.seen.add(userid, items)
+        self.watermark = max(self.watermark, int(rows['ingest_seq'].max()))
+
+    def replay(self, conn, catalogue=True):
+        # Every row past the watermark, whoever wrote it, so the watermark
+        # never moves past rows the state has not applied. The catalogue
+        # scan (new items' genres) can be skipped on the ingest path
+        rows = conn.execute("""
+            SELECT userid::VARCHAR AS userid, itemid::VARCHAR AS itemid, rating, timestamp, ingest_seq
+            FROM interactions
+            WHERE ingest_seq > $watermark
+            ORDER BY ingest_seq
+        """, parameters={'watermark': self.watermark}).fetchdf()
+        if catalogue:
+            self.sync_items(conn)
+        self.apply(rows)
+        return len(rows)
+
+    # ======================
+    # SCORING SUPPORT
+    # ======================
+
+    def collaborative_scores(self, own_sum, own_count):
+        # AVG(rating) * 20 over everyone except the user, from the global
+        # aggregates minus the user's own per-item contribution
+        other_count = self.rating_count - own_count
+        with np.errstate(divide='ignore', invalid='ignore'):
+            scores = (self.rating_sum - own_sum) / other_count * 20
+        return {self.item_uuids[idx]: scores[idx] for idx in np.flatnonzero(other_count > 0)}
+
+    def own_ratings(self, conn, userid):
+        own = conn.execute("""
+            SELECT itemid::VARCHAR, SUM(rating), COUNT(rating)
+            FROM interactions
+            WHERE userid = $userid
+            GROUP BY itemid
+        """, parameters={'userid': str(userid)}).fetchall()
+        own_sum = np.zeros(len(self.rating_sum))
+        own_count = np.zeros(len(self.rating_count), dtype=np.int64)
+        for itemid, total, count in own:
+            idx = self.seen.item_index.get(itemid)
+            if idx is not None and idx < len(own_sum):
+                own_sum[idx] = total or 0
+                own_count[idx] = count
+        return own_sum, own_count
+
+    def genre_code(self, itemid):
+        idx = self.seen.item_index.get(str(itemid))
+        return -1 if idx is None else int(self.genre_codes[idx])
+
+    def top_genre_code(self, userid):
+        seen = self.seen.get(userid)
+        codes = self.genre_codes[seen[seen < len(self.genre_codes)]]
+        codes = codes[codes >= 0]
+        if not len(codes):
+            return -1
+        return int(np.bincount(codes).argmax())
+
+    def content_scores(self, code):
+        if code < 0:
+            return {}
+        return {self.item_uuids[idx]: 100 for idx in np.flatnonzero(self.genre_codes == code)}
+
+    def trends(self, start, end, k):
+        self.compact_trends()
+        # Bucketed to the hour: the window covers every bucket it touches
+        lo = np.searchsorted(self.trend_hours, start // TREND_BUCKET_SECONDS, side='left')
+        hi = np.searchsorted(self.trend_hours, end // TREND_BUCKET_SECONDS, side='right')
+        totals = np.bincount(
+            self.trend_items[lo:hi], weights=self.trend_counts[lo:hi], minlength=len(self.item_uuids)
+        )
+        top = np.argsort(-totals, kind='stable')[:k]
+        top = top[totals[top] > 0]
+        return [(self.item_uuids[idx], int(totals[idx])) for idx in top]
+
+    def compact_trends(self, now=None):
+        if not self.pending_hours:
+            return
+        cutoff = (int(now or time.time()) - TREND_RETENTION_SECONDS) // TREND_BUCKET_SECONDS
+        hours = np.concatenate([self.trend_hours.astype(np.int64)] + self.pending_hours)
+        items = np.concatenate([self.trend_items.astype(np.int64)] + [i.astype(np.int64) for i in self.pending_items])
+        counts = np.concatenate([self.trend_counts.astype(np.int64)] + [np.ones(len(h), np.int64) for h in self.pending_hours])
+        keep = hours >= cutoff
+        keys = hours[keep] * len(self.item_uuids) + items[keep]
+        unique, inverse = np.unique(keys, return_inverse=True)
+        self.trend_hours = unique // len(self.item_uuids)
+        self.trend_items = (unique % len(self.item_uuids)).astype(np.int32)
+        self.trend_counts = np.bincount(inverse, weights=counts[keep]).astype(np.int32)
+        self.pending_hours = []
+        self.pending_items = []
+
+    # ======================
+    # SNAPSHOTS
+    # ======================
+
+    def to_arrays(self):
+        self.compact_trends()
+        arrays = {f"seen_{name}": array for name, array in self.seen.to_arrays().items()}
+        arrays.update(
+            genre_names=np.array(self.genre_names, dtype=str),
+            genre_codes=self.genre_codes,
+            rating_sum=self.rating_sum,
+            rating_count=self.rating_count,
+            trend_hours=self.trend_hours,
+            trend_items=self.trend_items,
+            trend_counts=self.trend_counts
+        )
+        return arrays
+
+    def metadata(self):
+        return {'watermark': self.watermark, 'model_fitted_at': self.model_fitted_at}
+
+    @classmethod
+    def from_snapshot(cls, snapshot):
+        seen = SeenItemStore.from_arrays(
+            *(snapshot.array(f"seen_{name}") for name in ('item_ids', 'users', 'indptr', 'indices'))
+        )
+        return cls(
+            seen,
+            genre_names=snapshot.array('genre_names').tolist(),
+            # Aggregates are small and updated in place, so they are copied;
+            # seen arrays and trend buckets stay memory-mapped until modified
+            genre_codes=np.array(snapshot.array('genre_codes')),
+            rating_sum=np.array(snapshot.array('rating_sum')),
+            rating_count=np.array(snapshot.array('rating_count')),
+            trend_hours=snapshot.array('trend_hours'),
+            trend_items=snapshot.array('trend_items'),
+            trend_counts=snapshot.array('trend_counts'),
+            watermark=snapshot.metadata.get('watermark', 0),
+            model=EmbeddingModel.from_snapshot(snapshot),
+            model_fitted_at=snapshot.metadata.get('model_fitted_at')
+        )
+
+    @classmethod
+    def from_database(cls, conn, now=None):
+        state = cls(SeenItemStore.from_database(conn))
+        state.sync_items(conn)
+
+        totals = conn.execute("""
+            SELECT itemid::VARCHAR, SUM(rating), COUNT(rating)
+            FROM interactions
+            GROUP BY itemid
+        """).fetchall()
+        for itemid, total, count in totals:
+            idx = state.assign(itemid)
+            state.rating_sum[idx] = total or 0
+            state.rating_count[idx] = count
+
+        cutoff = int(now or time.time()) - TREND_RETENTION_SECONDS
+        buckets = conn.execute("""
+            SELECT timestamp // $bucket AS hour, itemid::VARCHAR, COUNT(*)
+            FROM interactions
+            WHERE timestamp >= $cutoff
+            GROUP BY 1, 2
+            ORDER BY 1
+        """, parameters={'bucket': TREND_BUCKET_SECONDS, 'cutoff': cutoff}).fetchall()
+        state.trend_hours = np.array([hour for hour, _, _ in buckets], dtype=np.int64)
+        state.trend_items = np.array([state.assign(item) for _, item, _ in buckets], dtype=np.int32)
+        state.trend_counts = np.array([count for _, _, count in buckets], dtype=np.int32)
+
+        state.watermark = conn.execute("""
+            SELECT COALESCE(MAX(ingest_seq), 0) FROM interactions
+        """).fetchone()[0]
+        return state
+
+def _resized(array, size, fill, dtype):
+    if array is None:
+        return np.full(size, fill, dtype=dtype)
+    array = np.asarray(array, dtype=dtype)
+    if len(array) >= size:
+        return array
+    return np.concatenate([array, np.full(size - len(array), fill, dtype=dtype)])
+
+_EMPTY_I64 = np.empty(0, dtype=np.int64)
+_EMPTY_I32 = np.empty(0, dtype=np.int32)
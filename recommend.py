@@ -134,10 +134,12 @@ pinsage.fit(
     metrics=["precision", "recall"],
 )
 
-# Save the model and data info
+# Save the model and data info; full variables (not inference_only) so a
+# later run can warm-start from them with DatasetFeat.merge_trainset and
+# rebuild_model, as decisions/session_recommendation_retrain.py does
 data_info.save(path="model_path_data", model_name="pinsage")
 pinsage.save(
-    path="model_path_model", model_name="pinsage", manual=True, inference_only=True
+    path="model_path_model", model_name="pinsage", manual=True, inference_only=False
 )
 
 # Make predictions and recommendations
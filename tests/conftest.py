@@ -0,0 +1,22 @@
+import os
+import sys
+import duckdb
+import pytest
+
+DECISIONS = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'decisions')
+
+# The scripts in decisions/ import each other as siblings
+sys.path.insert(0, DECISIONS)
+
+@pytest.fixture
+def godot_conn():
+    # Tables and views of session_recommendation_10.sql; the HNSW extension,
+    # its index and the loading procedures are left out
+    with open(os.path.join(DECISIONS, 'session_recommendation_10.sql')) as f:
+        schema = f.read()
+    start = schema.index('-- Core Tables')
+    end = schema.index('-- Indexes')
+    conn = duckdb.connect()
+    conn.execute(schema[start:schema.rindex('-- ======================', 0, end)])
+    yield conn
+    conn.close()
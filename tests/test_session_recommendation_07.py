@@ -0,0 +1,158 @@
+import json
+import time
+import types
+import uuid
+import duckdb
+from fastapi.testclient import TestClient
+import numpy as np
+import session_recommendation_07 as service
+from session_recommendation_shared import EmbeddingModel, Snapshot, StatePublisher
+from session_recommendation_warm import WarmState
+
+def make_database(tmp_path):
+    path = str(tmp_path / 'recommendations.db')
+    service.initialize_database(path)
+    return path
+
+def insert_interaction(conn, userid, itemid, rating):
+    conn.execute(
+        "INSERT INTO interactions (interactionid, userid, itemid, rating, timestamp) VALUES (?, ?, ?, ?, ?)",
+        [str(uuid.uuid4()), str(userid), str(itemid), rating, int(time.time())]
+    )
+
+def test_fetch_item_details_runs_against_duckdb(tmp_path):
+    path = make_database(tmp_path)
+    items = [uuid.uuid4() for _ in range(3)]
+    with duckdb.connect(path) as conn:
+        conn.executemany(
+            "INSERT INTO items (itemid, title, genre) VALUES (?, ?, ?)",
+            [(str(item), f"title {n}", 'drama') for n, item in enumerate(items)]
+        )
+        conn.executemany(
+            "INSERT INTO interactions (interactionid, userid, itemid, rating, timestamp) VALUES (?, ?, ?, ?, ?)",
+            [(str(uuid.uuid4()), str(uuid.uuid4()), str(items[0]), rating, 0) for rating in (3, 5)]
+        )
+        details = service.fetch_item_details(conn, items[:2])
+        detailed = service.fetch_item_details(conn, items[:1], detailed=True)
+        output = service.format_recommendation_output(conn, [items[1], uuid.uuid4(), items[0]])
+
+    assert set(details) == {str(items[0]), str(items[1])}
+    assert details[str(items[0])]['avg_rating'] == 4
+    assert details[str(items[0])]['interaction_count'] == 2
+    assert details[str(items[1])]['interaction_count'] == 0
+    assert 'score' in detailed[str(items[0])]
+    # Input order is kept and unknown items are dropped
+    assert [result['itemid'] for result in output['results']] == [str(items[1]), str(items[0])]
+
+def test_batch_model_serves_every_user_from_a_snapshot_model(tmp_path, monkeypatch):
+    snapshot_model = object()
+    monkeypatch.setattr(service, 'warm_state', types.SimpleNamespace(model=snapshot_model, model_fitted_at=time.time()))
+    with duckdb.connect(make_database(tmp_path)) as conn:
+        system = service.RecommendationSystem(conn, models={})
+        assert system.prepare_batch_model(['user-a', 'user-b', 'user-c']) is snapshot_model
+        assert system.models == {}
+
+def test_interactions_apply_rows_from_other_writers_first(tmp_path, monkeypatch):
+    path = make_database(tmp_path)
+    user, item, other_item = uuid.uuid4(), uuid.uuid4(), uuid.uuid4()
+    with duckdb.connect(path) as conn:
+        insert_interaction(conn, user, item, 3)
+        state = WarmState.from_database(conn)
+        # An ETL job's row, written after the state was built
+        insert_interaction(conn, uuid.uuid4(), item, 5)
+    monkeypatch.setattr(service, 'DB_PATH', path)
+    monkeypatch.setattr(service, 'warm_state', state)
+    monkeypatch.setattr(service, 'ingested_since_publish', 0)
+
+    response = TestClient(service.app).post('/interactions', json={
+        'interactions': [{'userid': str(user), 'itemid': str(other_item), 'rating': 4}]
+    })
+
+    assert response.json() == {'recorded': 1}
+    assert state.watermark == 3
+    assert service.ingested_since_publish == 2
+    assert state.rating_count[state.seen.item_index[str(item)]] == 2
+    assert state.rating_count[state.seen.item_index[str(other_item)]] == 1
+
+def test_writer_republishes_snapshot_embeddings_after_restart(tmp_path, monkeypatch):
+    path = make_database(tmp_path)
+    with duckdb.connect(path) as conn:
+        state = WarmState.from_database(conn)
+    state.model = EmbeddingModel(np.array(['u1']), np.array(['i1', 'i2']),
+                                 np.ones((1, 2), dtype=np.float32), np.eye(2, dtype=np.float32))
+    state.model_fitted_at = time.time()
+    publisher = StatePublisher(str(tmp_path / 'state'))
+    monkeypatch.setattr(service, 'ROLE', 'writer')
+    monkeypatch.setattr(service, 'DB_PATH', path)
+    monkeypatch.setattr(service, 'MODEL_STORE', None)
+    monkeypatch.setattr(service, 'warm_state', state)
+    monkeypatch.setattr(service, 'state_publisher', publisher)
+    monkeypatch.setattr(service, 'model_cache', {})
+
+    service.write_snapshot(state.to_arrays(), state.metadata(), list(state.seen.item_ids))
+
+    snapshot = Snapshot(str(tmp_path / 'state'), publisher.current_version())
+    assert EmbeddingModel.from_snapshot(snapshot).predict('u1', n=2) == state.model.predict('u1', n=2)
+    assert snapshot.metadata['model_fitted_at'] == state.model_fitted_at
+
+def patch_service(monkeypatch, path, state):
+    monkeypatch.setattr(service, 'DB_PATH', path)
+    monkeypatch.setattr(service, 'MODEL_STORE', None)
+    monkeypatch.setattr(service, 'warm_state', state)
+    # A deterministic stand-in for the STAR election: items by summed score
+    def election(method, ballots, seats):
+        totals = {}
+        for ballot in ballots:
+            for item, score in ballot.items():
+                totals[item] = totals.get(item, 0) + score
+        return sorted(totals, key=lambda item: (-totals[item], str(item)))[:seats]
+    monkeypatch.setattr(service.starvote, 'election', election)
+
+def test_batch_entries_are_scored_as_they_stream(tmp_path, monkeypatch):
+    path = make_database(tmp_path)
+    users, items = [uuid.uuid4() for _ in range(3)], [uuid.uuid4() for _ in range(6)]
+    pipeline = uuid.uuid4()
+    with duckdb.connect(path) as conn:
+        conn.execute("INSERT INTO pipelines (pipelineid) VALUES (?)", [str(pipeline)])
+        conn.executemany("INSERT INTO items (itemid, title, genre) VALUES (?, ?, ?)",
+                         [(str(item), f"title {n}", ('drama', 'comedy')[n % 2]) for n, item in enumerate(items)])
+        for n, (user, item) in enumerate((u, i) for u in users for i in items[:4]):
+            insert_interaction(conn, user, item, n % 5 + 1)
+        insert_interaction(conn, users[0], items[4], 2)
+        state = WarmState.from_database(conn)
+    state.model = EmbeddingModel(np.array([str(user) for user in users]), np.array([str(item) for item in items]),
+                                 np.eye(3, 6, dtype=np.float32), np.eye(6, dtype=np.float32))
+    state.model_fitted_at = time.time()
+    patch_service(monkeypatch, path, state)
+
+    entries = [{'userid': str(users[0]), 'itemid': str(items[1]), 'k': 2}, {'userid': str(users[1]), 'k': 3}]
+    request = service.BatchRecommendationRequest(pipelineid=pipeline, entries=entries)
+    predicted = []
+    monkeypatch.setattr(state.model, 'predict', lambda userid, n: predicted.append(userid) or [])
+    with duckdb.connect(path) as conn:
+        system = service.RecommendationSystem(conn, models={})
+        elections = service.generate_batch_hybrid_recommendations(conn, system, request)
+        assert predicted == []
+        first = next(elections)
+        # Sparse per-user deltas give the single-request CF scores
+        single = service.RecommendationRequest(pipelineid=pipeline, userid=users[0], itemid=items[1], k=2)
+        assert first == service.generate_hybrid_recommendations(conn, system, single)
+        assert [str(userid) for userid in predicted] == [str(users[0])] * 2
+    monkeypatch.undo()
+    patch_service(monkeypatch, path, state)
+
+    client = TestClient(service.app)
+    response = client.post('/batch-recommendations', json={
+        'pipelineid': str(pipeline), 'entries': entries, 'exploration_factor': 0
+    })
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert [line['userid'] for line in lines] == [str(users[0]), str(users[1])]
+    # Only unseen items are eligible: item 5 for the first user, 4 and 5 for the second
+    assert [{result['itemid'] for result in line['results']} for line in lines] == [
+        {str(items[5])}, {str(items[4]), str(items[5])}
+    ]
+
+    missing = client.post('/batch-recommendations', json={
+        'pipelineid': str(pipeline), 'entries': [{'userid': str(users[0]), 'itemid': str(uuid.uuid4())}]
+    })
+    assert missing.status_code == 404
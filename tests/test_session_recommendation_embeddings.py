@@ -0,0 +1,23 @@
+import uuid
+import numpy as np
+from session_recommendation_embeddings import (
+    HashingEncoder, changed_rows, encoder_identity, write_embeddings
+)
+
+def test_unchanged_assets_are_skipped_after_write_back(godot_conn):
+    ids = [str(uuid.uuid4()) for _ in range(3)]
+    godot_conn.executemany(
+        "INSERT INTO assets (id, display_name, slug, scene_text) VALUES (?, ?, ?, ?)",
+        [(asset, f"asset {n}", f"slug-{n}", "Node2D") for n, asset in enumerate(ids)]
+    )
+    name = encoder_identity('hashing', 384, {})
+    _, changed, texts, hashes = next(changed_rows(godot_conn, 'text_embedding', name))
+    assert sorted(changed) == sorted(ids)
+
+    write_embeddings(godot_conn, 'text_embedding', changed, HashingEncoder(384).encode(texts), hashes)
+    godot_conn.execute("UPDATE assets SET display_name = 'renamed' WHERE id = $id", parameters={'id': ids[0]})
+
+    scanned, changed, _, _ = next(changed_rows(godot_conn, 'text_embedding', name))
+    assert scanned == 3 and changed == [ids[0]]
+    stored = godot_conn.execute("SELECT text_embedding FROM assets WHERE id = $id", parameters={'id': ids[1]}).fetchone()[0]
+    assert np.isclose(np.linalg.norm(stored), 1.0)
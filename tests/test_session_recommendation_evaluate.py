@@ -0,0 +1,56 @@
+import numpy as np
+from session_recommendation_ann import ExactIndex, MultiModalIndex
+from session_recommendation_evaluate import GraphAdapter, HybridAdapter, TransformerAdapter
+from session_recommendation_graph import CSRGraph
+from session_recommendation_hybrid import HybridSessionScorer
+from session_recommendation_live import ItemVectors
+from session_recommendation_transformer import SessionTransformer, random_weights
+
+def _graph(n, seed=0):
+    rng = np.random.default_rng(seed)
+    sources, targets, weights = rng.integers(0, n, 400), rng.integers(0, n, 400), rng.random(400).astype(np.float32)
+    order = np.lexsort((-weights, sources))
+    indptr = np.concatenate([[0], np.cumsum(np.bincount(sources, minlength=n))])
+    return CSRGraph([f"item-{code}" for code in range(n)], indptr, targets[order].astype(np.int32), weights[order])
+
+def _histories(n, seed=0):
+    # Every prefix of a few sessions, as the pair exporter emits them
+    rng = np.random.default_rng(seed)
+    sessions = [[f"item-{code}" for code in rng.integers(0, n, length)] for length in (6, 4, 9)]
+    return [session[:end] for session in sessions for end in range(1, len(session))]
+
+def test_transformer_reads_every_prefix_from_one_pass():
+    model = SessionTransformer(random_weights(50))
+    adapter = TransformerAdapter(model)
+    histories = _histories(50) + [['unknown']]
+    known, rows = adapter.queries(histories)
+
+    assert known == list(range(len(histories) - 1))
+    for n in known:
+        codes = [model.item_index[item] for item in histories[n]]
+        assert np.allclose(rows[n], model.encode(codes)[0], atol=1e-4)
+    assert adapter.recommend(histories, 5)[-1] == []
+
+def test_graph_neighbours_match_the_per_history_lookup():
+    graph = _graph(50)
+    histories = _histories(50)
+    expected = []
+    for history in histories:
+        targets, _ = graph.neighbours([graph.item_index[history[-1]]])
+        expected.append([graph.item_ids[t] for t in targets if graph.item_ids[t] not in history][:5])
+    assert GraphAdapter(graph).recommend(histories, 5) == expected
+    assert all(len(ranking) <= 5 for ranking in GraphAdapter(graph, walks=True).recommend(histories, 5))
+
+def test_hybrid_batch_matches_single_sessions():
+    rng = np.random.default_rng(0)
+    ids = [f"item-{code}" for code in range(50)]
+    layout = {'text_embedding': 8, 'image_embedding': 4}
+    blocks = [rng.normal(size=(50, dim)).astype(np.float32) for dim in layout.values()]
+    blocks = [block / np.linalg.norm(block, axis=1, keepdims=True) for block in blocks]
+    items = ItemVectors(ids, np.hstack(blocks), layout)
+    index = MultiModalIndex({modality: ExactIndex(dim, ids, block) for (modality, dim), block in zip(layout.items(), blocks)})
+    scorer = HybridSessionScorer(items, index, _graph(50), ann_candidates=10)
+    histories = _histories(50)
+
+    ranked = HybridAdapter(scorer).recommend(histories, 5)
+    assert ranked == [[item for item, _ in scorer.recommend(history, 5)] for history in histories]
@@ -0,0 +1,33 @@
+import datetime
+import uuid
+from session_recommendation_features import FeatureSnapshots
+
+def test_child_snapshot_adds_assets_attached_to_earlier_sessions(godot_conn, tmp_path):
+    user, session = str(uuid.uuid4()), str(uuid.uuid4())
+    assets = [str(uuid.uuid4()) for _ in range(2)]
+    start = datetime.datetime(2025, 3, 1, 12, 0)
+    godot_conn.execute("INSERT INTO users (id) VALUES (?)", [user])
+    godot_conn.executemany(
+        "INSERT INTO assets (id, display_name, slug, scene_text) VALUES (?, 'a', 'a', '')", [[asset] for asset in assets]
+    )
+    godot_conn.execute("INSERT INTO sessions (id, user_id, start_time) VALUES (?, ?, ?)", [session, user, start])
+    godot_conn.execute(
+        "INSERT INTO session_assets (session_id, asset_id, usage_count, added_at) VALUES (?, ?, 1, ?)",
+        [session, assets[0], start]
+    )
+    snapshots = FeatureSnapshots(str(tmp_path))
+    first = snapshots.create(godot_conn, as_of=start + datetime.timedelta(hours=1))
+    # Added to the same session after the first snapshot
+    godot_conn.execute(
+        "INSERT INTO session_assets (session_id, asset_id, usage_count, added_at) VALUES (?, ?, 2, ?)",
+        [session, assets[1], start + datetime.timedelta(hours=2)]
+    )
+    second = snapshots.create(godot_conn, as_of=start + datetime.timedelta(hours=3))
+
+    assert (first['rows'], second['rows'], second['added_rows']) == (1, 2, 1)
+    assert second['parent'] == first['id'] and first['id'] != second['id']
+    rows = godot_conn.execute(f"""
+        SELECT asset_id::VARCHAR, hours_since_use FROM {snapshots.relation(second['id'])} ORDER BY usage_count
+    """).fetchall()
+    assert rows == [(assets[0], 3), (assets[1], 3)]
+    assert [manifest['id'] for manifest in snapshots.list()] == [first['id'], second['id']]
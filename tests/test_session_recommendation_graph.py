@@ -0,0 +1,22 @@
+import uuid
+import numpy as np
+from session_recommendation_graph import CSRGraph
+
+def test_csr_graph_builds_from_item_graph(godot_conn, tmp_path):
+    items = [str(uuid.uuid4()) for _ in range(4)]
+    a, b, c, d = items
+    godot_conn.executemany(
+        "INSERT INTO item_graph VALUES (?, ?, ?, ?)",
+        [(a, b, 3.0, 'session'), (a, b, 1.0, 'user'), (a, c, 2.0, 'session'), (c, d, 1.0, 'session')]
+    )
+    graph = CSRGraph.from_database(godot_conn, items, top_k=1)
+
+    # Both directions, summed over types, strongest top_k per source
+    targets = [[graph.item_ids[t] for t in graph.indices[graph.indptr[n]:graph.indptr[n + 1]]] for n in range(4)]
+    assert targets == [[b], [a], [a], [c]]
+    assert graph.weights[graph.indptr[0]] == 4.0
+
+    graph.save(str(tmp_path))
+    loaded = CSRGraph.load(str(tmp_path))
+    assert loaded.item_ids == items and np.array_equal(loaded.indices, graph.indices)
+    assert [item for item, _ in loaded.recommend([a], k=2, num_walks=200)] == [b]
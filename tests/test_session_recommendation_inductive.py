@@ -0,0 +1,37 @@
+import uuid
+import numpy as np
+from session_recommendation_ann import build_index
+from session_recommendation_graph import CSRGraph
+from session_recommendation_inductive import (
+    InductiveEmbedder, PinSageAggregator, ingest_items, load_features, train_aggregator
+)
+
+def test_trained_aggregator_embeds_new_assets_into_the_index(godot_conn, tmp_path):
+    rng = np.random.default_rng(0)
+    centres = rng.normal(size=(2, 64))
+    clusters = [[str(uuid.uuid4()) for _ in range(6)] for _ in range(2)]
+    new_asset = str(uuid.uuid4())
+    rows = [(item, centres[c] + 0.1 * rng.normal(size=64)) for c, items in enumerate(clusters) for item in items]
+    rows.append((new_asset, centres[0] + 0.1 * rng.normal(size=64)))
+    godot_conn.executemany(
+        "INSERT INTO assets (id, display_name, slug, scene_text, structural_embedding) VALUES (?, 'a', 'a', '', ?)",
+        [(item, vector.tolist()) for item, vector in rows]
+    )
+    edges = [(a, b, 1.0, 'session') for items in clusters for n, a in enumerate(items) for b in items[n + 1:]]
+    edges += [(new_asset, clusters[0][0], 1.0, 'session')]
+    godot_conn.executemany("INSERT INTO item_graph VALUES (?, ?, ?, ?)", edges)
+
+    item_ids = clusters[0] + clusters[1]
+    graph = CSRGraph.from_database(godot_conn, item_ids)
+    features = load_features(godot_conn, item_ids)
+    aggregator, history = train_aggregator(graph, features, dim=16, epochs=20, batch_size=16)
+    assert len(history) == 20
+
+    aggregator.save(str(tmp_path / 'aggregator.npz'))
+    embedder = InductiveEmbedder(PinSageAggregator.load(str(tmp_path / 'aggregator.npz')), graph, features)
+    index = build_index(aggregator.dim, item_ids, embedder.embed_graph())
+    report = ingest_items(godot_conn, embedder, [new_asset, item_ids[0]], index=index)
+
+    assert report['embedded'] == report['with_graph_neighbours'] == 1
+    (found, _), = index.search(index.rows.vectors[index.rows.rows([new_asset])], k=4, exclude=[[new_asset]])
+    assert set(found.tolist()) <= set(clusters[0])
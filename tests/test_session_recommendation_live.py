@@ -0,0 +1,35 @@
+import uuid
+import numpy as np
+from session_recommendation_live import ItemVectors, LiveSessionStore
+
+def _store(items, **options):
+    return LiveSessionStore(ItemVectors(items, np.eye(len(items), dtype=np.float32), {'text_embedding': len(items)}),
+                            context=3, slots=2, **options)
+
+def test_continuing_session_keeps_event_order(godot_conn):
+    items = [str(uuid.uuid4()) for _ in range(4)]
+    session = str(uuid.uuid4())
+    store = _store(items)
+    for now, item in enumerate(items[:3]):
+        store.record(session, item, now=now, conn=godot_conn)
+    store.flush(godot_conn)
+
+    # A restarted store picks the session up where it left off
+    restarted = _store(items)
+    assert restarted.record(session, items[3], now=10, conn=godot_conn) == 3
+    assert restarted.context_ids(session) == items[1:]
+    restarted.flush(godot_conn)
+    orders = godot_conn.execute("SELECT event_order FROM session_items ORDER BY event_order").fetchall()
+    assert [order for order, in orders] == [0, 1, 2, 3]
+
+def test_idle_sessions_are_flushed_before_eviction(godot_conn):
+    items = [str(uuid.uuid4()) for _ in range(2)]
+    session = str(uuid.uuid4())
+    store = _store(items, ttl_seconds=10)
+    store.record(session, items[0], now=0, conn=godot_conn)
+
+    # Unflushed events keep the session; with a connection they are written
+    # first and the session goes
+    assert store.evict_idle(now=100) == 0
+    assert store.evict_idle(now=100, conn=godot_conn) == 1
+    assert store.record(session, items[1], now=101, conn=godot_conn) == 1
@@ -0,0 +1,55 @@
+import datetime
+import uuid
+import duckdb
+import pandas as pd
+from session_recommendation_partitions import PartitionedStore
+
+def sessions_frame(starts):
+    return pd.DataFrame({
+        'id': [str(uuid.uuid4()) for _ in starts],
+        'user_id': [str(uuid.uuid4()) for _ in starts],
+        'start_time': starts,
+        'duration': [pd.Timedelta(minutes=5)] * len(starts),
+        'modified_assets': [[] for _ in starts]
+    })
+
+def register(conn, name, frame, casts):
+    conn.register(f"{name}_frame", frame)
+    conn.execute(f"CREATE OR REPLACE TEMP VIEW {name} AS SELECT * REPLACE ({casts}) FROM {name}_frame")
+
+def test_appends_partition_assets_by_their_sessions_start_day(tmp_path):
+    store = PartitionedStore(str(tmp_path))
+    conn = duckdb.connect()
+    session_casts = "id::UUID AS id, user_id::UUID AS user_id, modified_assets::UUID[] AS modified_assets"
+    asset_casts = "session_id::UUID AS session_id, asset_id::UUID AS asset_id"
+    old = datetime.datetime.now() - datetime.timedelta(days=30)
+    recent = datetime.datetime.now() - datetime.timedelta(hours=1)
+
+    first = sessions_frame([old, recent])
+    register(conn, 'batch_sessions', first, session_casts)
+    store.append_sessions(conn, 'batch_sessions')
+    # Assets added later to both earlier sessions, plus one unknown session
+    assets = pd.DataFrame({
+        'session_id': first['id'].tolist() + [str(uuid.uuid4())],
+        'asset_id': [str(uuid.uuid4()) for _ in range(3)],
+        'usage_count': [1, 2, 3],
+        'node_paths': [['/root'] for _ in range(3)],
+        'added_at': [recent] * 3
+    })
+    register(conn, 'batch_sessions', sessions_frame([]).astype({'start_time': 'datetime64[us]'}), session_casts)
+    register(conn, 'batch_assets', assets, asset_casts)
+    store.append_sessions(conn, 'batch_sessions', 'batch_assets')
+    store.append_sessions(conn, 'batch_sessions', 'batch_assets')
+
+    days = dict(conn.execute(f"""
+        SELECT session_id::VARCHAR, ANY_VALUE(day) FROM {store.scan('session_assets')} GROUP BY 1
+    """).fetchall())
+    assert days[first['id'][0]] == old.strftime('%Y-%m-%d')
+    assert days[first['id'][1]] == recent.strftime('%Y-%m-%d')
+    assert days[assets['session_id'][2]] == datetime.date.today().strftime('%Y-%m-%d')
+
+    # Every day partition holds one file per append
+    assert store.compact(conn, 'session_assets', min_files=2) == len(set(days.values()))
+    manifest = store.manifest('session_assets')
+    assert sum(entry['rows'] for entry in manifest.values()) == 6
+    assert all(len(entry['files']) == 1 for entry in manifest.values())
@@ -0,0 +1,56 @@
+import random
+import time
+import types
+import uuid
+import duckdb
+import session_recommendation_07 as service
+from session_recommendation_retrain import ModelStore
+
+def add_interactions(conn, users, items, count, start, rng):
+    conn.executemany(
+        "INSERT INTO interactions (interactionid, userid, itemid, rating, timestamp) VALUES (?, ?, ?, ?, ?)",
+        [(str(uuid.uuid4()), rng.choice(users), rng.choice(items), rng.randint(1, 5), start + n) for n in range(count)]
+    )
+
+def test_incremental_refresh_rebuilds_from_the_saved_model(tmp_path, monkeypatch):
+    path = str(tmp_path / 'recommendations.db')
+    service.initialize_database(path)
+    rng = random.Random(0)
+    users = [str(uuid.uuid4()) for _ in range(30)]
+    items = [str(uuid.uuid4()) for _ in range(40)]
+    store = ModelStore(str(tmp_path / 'models'))
+    with duckdb.connect(path) as conn:
+        conn.executemany("INSERT INTO items (itemid, title, genre) VALUES (?, 'title', 'drama')", [[item] for item in items])
+        add_interactions(conn, users, items, 400, 1000, rng)
+        # Rows from before ingest_seq was assigned
+        conn.execute("UPDATE interactions SET ingest_seq = NULL WHERE ingest_seq <= 20")
+
+        _, full = store.refresh(conn)
+        new_users = [str(uuid.uuid4()) for _ in range(5)]
+        add_interactions(conn, users + new_users, items, 200, 5000, rng)
+        model, incremental = store.train_incremental(conn, full)
+
+    # Every row but the 20 newest, held out, including those without ingest_seq;
+    # the held-out rows (ingest_seq 381-400) stay past the watermark
+    assert full['kind'] == 'full' and full['trained_rows'] == 380
+    assert full['watermark'] == 380
+    # Fine-tuned on the previous holdout and the new rows, less its own holdout
+    assert incremental['kind'] == 'incremental' and incremental['parent'] == full['version']
+    assert 200 < incremental['trained_rows'] < 220
+    assert 380 < incremental['watermark'] < 600
+    assert store.current()['version'] == (incremental['version'] if incremental['accepted'] else full['version'])
+    assert set(new_users) & set(str(user) for user in model.data_info.user2id)
+    loaded = store.load(incremental['version'])
+    assert len(loaded.recommend_user(user=users[0], n_rec=5)[users[0]]) == 5
+
+    # The service serves CURRENT ahead of fresh snapshot embeddings, and never trains
+    snapshot_model = object()
+    monkeypatch.setattr(service, 'ROLE', 'single')
+    monkeypatch.setattr(service, 'MODEL_STORE', store.root)
+    monkeypatch.setattr(service, 'stored_model', None)
+    monkeypatch.setattr(service, 'warm_state', types.SimpleNamespace(model=snapshot_model, model_fitted_at=time.time()))
+    with duckdb.connect(path) as conn:
+        served = service.RecommendationSystem(conn, models={}).prepare_model(users[0])
+    assert served is not snapshot_model
+    assert service.stored_model[0] == store.current()['version']
+    assert len(served.predict(users[0], n=5)) == 5
@@ -0,0 +1,21 @@
+import uuid
+from session_recommendation_sequences import iter_pair_batches, write_pair_shards
+
+def test_pairs_stream_and_shard_identically(godot_conn, tmp_path):
+    sessions = {str(uuid.uuid4()): [str(uuid.uuid4()) for _ in range(length)] for length in (5, 3, 2)}
+    godot_conn.executemany(
+        "INSERT INTO session_items (session_id, item_id, event_order) VALUES (?, ?, ?)",
+        [(session, item, order) for session, items in sessions.items() for order, item in enumerate(items)]
+    )
+
+    streamed = {}
+    for batch in iter_pair_batches(godot_conn, context=2):
+        for row in batch.to_pylist():
+            streamed[(str(row['session_id']), row['position'])] = ([str(i) for i in row['history']], str(row['next_item']))
+    stats = write_pair_shards(godot_conn, str(tmp_path / 'pairs'), context=2)
+
+    # The 2-item session is too short; every later item is a target
+    assert stats['pairs'] == len(streamed) == 4 + 2
+    for session, items in sessions.items():
+        for position in range(1, len(items) if len(items) >= 3 else 0):
+            assert streamed[(session, position)] == (items[max(0, position - 2):position], items[position])
@@ -0,0 +1,27 @@
+import os
+import shutil
+import numpy as np
+from session_recommendation_shared import EmbeddingModel, Snapshot, StatePublisher, export_model_embeddings
+
+def test_publish_skips_versions_left_by_an_interrupted_publish(tmp_path):
+    publisher = StatePublisher(str(tmp_path))
+    assert publisher.publish(arrays={'x': np.arange(3)}) == 1
+    # Died after renaming v2 into place, before replacing CURRENT
+    shutil.copytree(tmp_path / 'v00000001', tmp_path / 'v00000002')
+
+    assert publisher.publish(arrays={'x': np.arange(4)}) == 3
+    assert publisher.current_version() == 3
+    assert Snapshot(str(tmp_path), 3).array('x').tolist() == [0, 1, 2, 3]
+
+def test_served_embeddings_export_and_reload(tmp_path):
+    model = EmbeddingModel(
+        np.array(['u1', 'u2']), np.array(['i1', 'i2', 'i3']),
+        np.eye(2, 3, dtype=np.float32), np.eye(3, dtype=np.float32)
+    )
+    model.add_items(['i4'], np.ones((1, 3), dtype=np.float32))
+    publisher = StatePublisher(str(tmp_path))
+    version = publisher.publish(arrays=export_model_embeddings(model))
+
+    restored = EmbeddingModel.from_snapshot(Snapshot(str(tmp_path), version))
+    assert restored.predict('u2', n=4) == model.predict('u2', n=4)
+    assert os.path.exists(tmp_path / 'v00000001' / 'item_embeddings.npy')